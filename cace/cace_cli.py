@@ -17,6 +17,7 @@ import json
 import time
 import signal
 import logging
+import sqlite3
 import argparse
 from fnmatch import fnmatch
 from datetime import timedelta
@@ -51,6 +52,13 @@ from .logging import (
 )
 
 from .parameter.parameter import ResultType
+from .common.result_cache import (
+    ResultCache,
+    DEFAULT_CACHE_SIZE,
+    get_default_cache_dir,
+)
+from .common.results_db import ResultsDatabase, DEFAULT_DB_NAME
+from .common.common import parse_memory
 
 
 def start_parameter(param, progress, task_ids, steps):
@@ -85,6 +93,160 @@ def end_parameter(param, progress, task_ids, task_id):
         warn('Cannot remove non existing parameter.')
 
 
+def add_cache_arguments(parser):
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        help=f'location of the result cache, by default "{get_default_cache_dir()}"',
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help='size limit of the result cache in MB, the least recently used results are evicted',
+    )
+
+
+def parse_timeout(value):
+    """Parse a timeout in the form [TOOL=]SECONDS"""
+
+    tool = None
+    if '=' in value:
+        tool, value = value.split('=', 1)
+
+    seconds = float(value)
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f'invalid timeout: {value}')
+
+    return (tool, seconds)
+
+
+def parse_memory_argument(value):
+    try:
+        return parse_memory(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def cache_cli(argv):
+    """
+    Inspect or clean up the result cache
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='cace cache',
+        description="""Inspect or clean up the result cache of
+        simulation runs.""",
+    )
+
+    parser.add_argument(
+        'command',
+        choices=['stats', 'gc'],
+        help="""stats: print the number of entries and the size of the cache,
+        gc: evict the least recently used entries until the cache fits into its size limit""",
+    )
+    add_cache_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    result_cache = ResultCache(args.cache_dir, args.cache_size)
+
+    if args.command == 'stats':
+        num_entries, size = result_cache.stats()
+        info(f'Result cache: {result_cache.cache_dir}')
+        info(f'Entries: {num_entries}')
+        info(f'Size: {size / 1024 / 1024:.1f} MB of {args.cache_size} MB')
+    elif args.command == 'gc':
+        evicted, freed = result_cache.gc()
+        info(
+            f'Evicted {evicted} entries ({freed / 1024 / 1024:.1f} MB) from the result cache.'
+        )
+
+
+def history_cli(argv):
+    """
+    Print the recorded runs or the results of a parameter across runs
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='cace history',
+        description="""Print the runs recorded in the results database,
+        or the results of a parameter across all recorded runs.""",
+    )
+
+    parser.add_argument(
+        '--results-db',
+        type=str,
+        default=os.path.join('runs', DEFAULT_DB_NAME),
+        help='location of the results database, by default "%(default)s"',
+    )
+    parser.add_argument(
+        '-p',
+        '--parameter',
+        type=str,
+        help='print the results of this parameter',
+    )
+    parser.add_argument(
+        '-r',
+        '--result',
+        type=str,
+        help='only print this result of the parameter',
+    )
+    parser.add_argument(
+        '-n',
+        '--limit',
+        type=int,
+        default=20,
+        help='the maximum number of runs or results to print',
+    )
+
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.results_db):
+        err(f'Results database {args.results_db} does not exist.')
+        sys.exit(1)
+
+    def format_time(timestamp):
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+    with ResultsDatabase(args.results_db) as results_db:
+        if args.parameter:
+            rows = [
+                '| Run | Started | Source | Result | Entry | Value | Status |',
+                '| :-- | :-- | :-- | :-- | :-- | --: | :-- |',
+            ]
+
+            for result in results_db.get_results(
+                args.parameter, args.result, limit=args.limit
+            ):
+                rows.append(
+                    f'| {result["run_id"]} | {format_time(result["started"])} | {result["netlist_source"]} | {result["result"]} | {result["entry"]} | {result["value"]} | {result["status"]} |'
+                )
+        else:
+            rows = [
+                '| Run | Started | Datasheet | Source | Parameters | Wall Time |',
+                '| :-- | :-- | :-- | :-- | :-- | --: |',
+            ]
+
+            for run in results_db.get_runs(limit=args.limit):
+                result_types = {}
+                for parameter in results_db.get_parameters(run['id']):
+                    result_types[parameter['result_type']] = (
+                        result_types.get(parameter['result_type'], 0) + 1
+                    )
+
+                rows.append(
+                    f'| {run["id"]} | {format_time(run["started"])} | {run["datasheet"]} | {run["netlist_source"]} | '
+                    + ', '.join(
+                        f'{count} {result_type.lower()}'
+                        for result_type, count in result_types.items()
+                    )
+                    + f' | {str(timedelta(seconds=run["wall_time"])).split(".")[0]} |'
+                )
+
+    console.print(Markdown('\n'.join(rows)))
+
+
 def cli():
     """
     Read a text file in CACE (ASCII) format 4.0, run
@@ -93,6 +255,16 @@ def cli():
     file with simulation and analysis results.
     """
 
+    # Subcommand to manage the result cache
+    if len(sys.argv) > 1 and sys.argv[1] == 'cache':
+        cache_cli(sys.argv[2:])
+        return
+
+    # Subcommand to query the results database
+    if len(sys.argv) > 1 and sys.argv[1] == 'history':
+        history_cli(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         prog='cace',
         description="""This program parses the CACE characterization 
@@ -148,6 +320,12 @@ def cli():
         default=None,
         help='list parameters that should be skipped. Has support for wildcards (*) to match parts of parameters.',
     )
+    parser.add_argument(
+        '--max-memory',
+        type=parse_memory_argument,
+        metavar='SIZE',
+        help='only start jobs while the sum of their expected peak memory fits into SIZE, e.g. 64G, the peak memory is learned from earlier simulations',
+    )
     parser.add_argument(
         '--parallel-parameters',
         type=int,
@@ -170,6 +348,22 @@ def cli():
         type=str,
         help='override the default "runs/" directory',
     )
+    parser.add_argument(
+        '--resume',
+        type=str,
+        metavar='RUN_DIR',
+        help='continue an interrupted run in the given run directory, only the simulations that did not complete are run',
+    )
+    parser.add_argument(
+        '--scratch-dir',
+        type=str,
+        help='create and simulate the runs in this directory, e.g. /dev/shm, only the summaries, plots, results and the runs that failed are kept in the run directory',
+    )
+    parser.add_argument(
+        '--pack-runs',
+        action='store_true',
+        help='pack the directories of completed simulation runs into a single "runs.zip" per parameter',
+    )
     parser.add_argument(
         '--no-plot', action='store_true', help='do not generate any graphs'
     )
@@ -186,6 +380,36 @@ def cli():
         action='store_true',
         help='runs simulations sequentially',
     )
+    parser.add_argument(
+        '--persistent-ngspice',
+        action='store_true',
+        help='keep a pool of ngspice processes in pipe mode and feed them the netlists, instead of starting ngspice for every simulation',
+    )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='restore the results of simulation runs from the result cache if their inputs did not change, and store new results in it',
+    )
+    add_cache_arguments(parser)
+    parser.add_argument(
+        '--results-db',
+        type=str,
+        help=f'record the run in this results database, by default "{DEFAULT_DB_NAME}" in the runs directory',
+    )
+    parser.add_argument(
+        '--timeout',
+        type=parse_timeout,
+        action='append',
+        default=[],
+        metavar='[TOOL=]SECONDS',
+        help='kill a tool, e.g. ngspice or magic, if it runs longer than this, without a tool the timeout applies to all tools, can be given multiple times',
+    )
+    parser.add_argument(
+        '--watchdog',
+        type=float,
+        metavar='FACTOR',
+        help='kill a simulation if it runs FACTOR times longer than the same simulation in the recorded runs, e.g. 10, by default the watchdog is disabled',
+    )
     parser.add_argument(
         '--no-progress-bar',
         action='store_true',
@@ -204,9 +428,28 @@ def cli():
     if args.log_level:
         set_log_level(args.log_level)
 
+    if args.resume and not os.path.isdir(args.resume):
+        err(f'Run directory {args.resume} does not exist.')
+        sys.exit(1)
+
+    if args.scratch_dir:
+        if not os.path.isdir(args.scratch_dir):
+            err(f'Scratch directory {args.scratch_dir} does not exist.')
+            sys.exit(1)
+
+        # The working directory changes to the root of the datasheet
+        args.scratch_dir = os.path.abspath(args.scratch_dir)
+
+    if args.results_db:
+        args.results_db = os.path.abspath(args.results_db)
+
     # Create the ParameterManager
     parameter_manager = ParameterManager(
-        max_runs=args.max_runs, run_path=args.run_path, max_jobs=args.jobs
+        max_runs=args.max_runs,
+        run_path=args.run_path,
+        max_jobs=args.jobs,
+        resume_dir=args.resume,
+        max_memory=args.max_memory,
     )
 
     # Load the datasheet
@@ -239,11 +482,30 @@ def cli():
     handlers.append(handler)
     register_additional_handler(handler)
 
+    # The watchdog learns from the runs in the results database
+    results_db_path = args.results_db
+    if not results_db_path:
+        results_db_path = os.path.join(
+            os.path.dirname(parameter_manager.run_dir), DEFAULT_DB_NAME
+        )
+
     # Set runtime options
     parameter_manager.set_runtime_options('force', args.force)
     parameter_manager.set_runtime_options('noplot', args.no_plot)
     parameter_manager.set_runtime_options('nosim', False)
     parameter_manager.set_runtime_options('sequential', args.sequential)
+    parameter_manager.set_runtime_options('resume', bool(args.resume))
+    parameter_manager.set_runtime_options('scratch_dir', args.scratch_dir)
+    parameter_manager.set_runtime_options('pack_runs', args.pack_runs)
+    parameter_manager.set_runtime_options('timeouts', dict(args.timeout))
+    parameter_manager.set_runtime_options('watchdog', args.watchdog)
+    parameter_manager.set_runtime_options('results_db', results_db_path)
+    parameter_manager.set_runtime_options(
+        'persistent_ngspice', args.persistent_ngspice
+    )
+    parameter_manager.set_runtime_options('cache', args.cache)
+    parameter_manager.set_runtime_options('cache_dir', args.cache_dir)
+    parameter_manager.set_runtime_options('cache_size', args.cache_size)
     parameter_manager.set_runtime_options('netlist_source', args.source)
     parameter_manager.set_runtime_options(
         'parallel_parameters', args.parallel_parameters
@@ -373,9 +635,22 @@ def cli():
     progress.stop()
 
     # Get the runtime and print it
-    delta = str(timedelta(seconds=time.time() - timestamp_start)).split('.')[0]
+    wall_time = time.time() - timestamp_start
+    delta = str(timedelta(seconds=wall_time)).split('.')[0]
     info(f'Done with CACE simulations and evaluations in {delta}.')
 
+    # Keep the result cache within its size limit
+    if args.cache:
+        ResultCache(args.cache_dir, args.cache_size).gc()
+
+    # Record the run in the results database
+    try:
+        parameter_manager.record_results(
+            results_db_path, timestamp_start, wall_time
+        )
+    except sqlite3.Error as error:
+        warn(f'Could not record the run in {results_db_path}: {error}')
+
     # Print the summary to the console
     summary = parameter_manager.summarize_datasheet()
     console.print(Markdown(summary))
@@ -404,6 +679,9 @@ def cli():
         # Parameter was cancelled
         elif result_type == ResultType.CANCELED:
             returncode = 4
+        # A tool was killed after its timeout
+        elif result_type == ResultType.TIMEOUT:
+            returncode = 5
 
     # Create the documentation
     if returncode == 0 or args.nofail:
@@ -329,6 +329,8 @@ def markdown_summary(datasheet, runtime_options, results, result_types):
                         status = ResultType.UNKNOWN
                     elif result_types[param['name']] == ResultType.CANCELED:
                         status = ResultType.CANCELED
+                    elif result_types[param['name']] == ResultType.TIMEOUT:
+                        status = ResultType.TIMEOUT
 
             # Get the tool
             tool = param['tool']
@@ -13,8 +13,12 @@
 # limitations under the License.
 
 import os
+import re
+import sys
+import threading
 import subprocess
 
+from .ring_buffer import RingBuffer
 from ..logging import (
     dbg,
     verbose,
@@ -682,6 +686,228 @@ def get_condition_names_used(template):
     return (condlist, default_cond)
 
 
+# Number of lines of each output stream kept for the error report
+OUTPUT_TAIL_LINES = 50
+
+# A simulation is never killed by the watchdog
+# before this many seconds have passed
+WATCHDOG_MIN_TIME = 60
+
+# Number of recorded runs the watchdog learns from
+WATCHDOG_HISTORY = 10
+
+# Unit of the maximum resident set size in the rusage
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+MEMORY_UNITS = {
+    '': 1,
+    'K': 1024,
+    'M': 1024**2,
+    'G': 1024**3,
+    'T': 1024**4,
+}
+
+
+def parse_memory(value):
+    """Parse a size like 512M or 4G into bytes"""
+
+    match = re.fullmatch(
+        r'\s*([0-9.]+)\s*([KMGT]?)(?:i?B)?\s*', str(value), re.IGNORECASE
+    )
+
+    if not match:
+        raise ValueError(f'invalid memory size: {value}')
+
+    return int(float(match.group(1)) * MEMORY_UNITS[match.group(2).upper()])
+
+
+def format_memory(size):
+    """Format a size in bytes for the log"""
+
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+
+    return f'{size:.1f} TB'
+
+
+def get_peak_memory(pid):
+    """
+    Returns the peak resident set size in bytes of a running
+    process, if the operating system provides it, else None
+    """
+
+    try:
+        with open(f'/proc/{pid}/status', 'r') as ifile:
+            for line in ifile:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return None
+
+
+def wait_process(process):
+    """
+    Wait for a subprocess. Returns its return code and its
+    peak resident set size in bytes, or None if not available.
+    """
+
+    if not hasattr(os, 'wait4'):
+        return (process.wait(), None)
+
+    try:
+        pid, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # The process was already reaped, e.g. when it was killed
+        return (process.wait(), None)
+
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    return (process.returncode, rusage.ru_maxrss * RSS_UNIT)
+
+
+class OutputCapture:
+    """
+    Writes the lines of an output stream of a subprocess to a file and
+    keeps only the last lines in memory for the error report. The file
+    is only created once there is any output.
+    """
+
+    def __init__(self, path=None, tail_lines=OUTPUT_TAIL_LINES):
+        self.path = path
+        self.file = None
+        self.tail = RingBuffer(str, tail_lines)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, line):
+        if self.file == None and self.path:
+            self.file = open(self.path, 'w')
+
+        if self.file:
+            self.file.write(line + '\n')
+
+        self.tail.push(line)
+        dbg(line)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class Watchdog:
+    """
+    Calls kill once the timeout in seconds has expired,
+    unless the watchdog is left before. A timeout of
+    None disables the watchdog.
+    """
+
+    def __init__(self, timeout, kill):
+        self.timeout = timeout
+        self.kill = kill
+        self.expired = False
+        self.timer = None
+
+    def __enter__(self):
+        if self.timeout:
+            self.timer = threading.Timer(self.timeout, self.expire)
+            self.timer.daemon = True
+            self.timer.start()
+
+        return self
+
+    def __exit__(self, *args):
+        if self.timer:
+            self.timer.cancel()
+
+    def expire(self):
+        self.expired = True
+        self.kill()
+
+
+def capture_stream(stream, capture):
+    """Read the lines of a text stream until it is closed"""
+
+    with capture:
+        for line in stream:
+            capture.write(line.rstrip('\n'))
+
+
+def write_input(stream, input):
+    """Write the input of a subprocess and close its stdin"""
+
+    # The subprocess may exit without reading all of its input
+    try:
+        stream.write(input)
+    except BrokenPipeError:
+        pass
+
+    try:
+        stream.close()
+    except BrokenPipeError:
+        pass
+
+
+def communicate(process, proc, input=None, cwd=None, write_file=True):
+    """
+    Wait for a subprocess that was started with text pipes. In contrast
+    to process.communicate(), stdout and stderr are streamed to
+    "<proc>_stdout.out" and "<proc>_stderr.out" in cwd, so that the
+    memory does not grow with the output. Returns the return code
+    and the peak memory of the subprocess in bytes or None.
+    """
+
+    outputs = {}
+    for name in ['stdout', 'stderr']:
+        path = None
+        if write_file:
+            path = f'{os.path.join(cwd or os.getcwd(), proc)}_{name}.out'
+        outputs[name] = OutputCapture(path)
+
+    threads = [
+        threading.Thread(
+            target=capture_stream, args=(process.stderr, outputs['stderr'])
+        )
+    ]
+
+    if process.stdin:
+        threads.append(
+            threading.Thread(target=write_input, args=(process.stdin, input))
+        )
+
+    for thread in threads:
+        thread.start()
+
+    capture_stream(process.stdout, outputs['stdout'])
+
+    for thread in threads:
+        thread.join()
+
+    returncode, peak_memory = wait_process(process)
+
+    if returncode != 0:
+        err(f'Subprocess exited with error code {returncode}')
+
+        # Some tools, like ngspice, report their errors on stdout
+        name = 'stderr' if len(outputs['stderr'].tail) else 'stdout'
+        tail = outputs[name].tail
+
+        if len(tail):
+            err(f'Last lines of {name} generated by subprocess:')
+            for line in tail:
+                err(line)
+
+    return (returncode, peak_memory)
+
+
 def run_subprocess(
     proc, args=[], env=None, input=None, cwd=None, write_file=True
 ):
@@ -705,40 +931,8 @@ def run_subprocess(
 
         if input != None:
             dbg(f'input: {input}')
-        stdout, stderr = process.communicate(input)
-        returncode = process.returncode
-
-        if returncode != 0:
-            err(f'Subprocess exited with error code {returncode}')
-
-        # Print stderr
-        if stderr and returncode != 0:
-            err('Error output generated by subprocess:')
-            for line in stderr.splitlines():
-                err(line.rstrip('\n'))
-        else:
-            dbg('Error output generated by subprocess:')
-            for line in stderr.splitlines():
-                dbg(line.rstrip('\n'))
-
-        # Write stderr to file
-        if stderr and write_file:
-            with open(
-                f'{os.path.join(cwd, proc)}_stderr.out', 'w'
-            ) as stderr_file:
-                stderr_file.write(stderr)
-
-        # Print stdout
-        if stdout:
-            dbg(f'Output from subprocess {proc}:')
-            for line in stdout.splitlines():
-                dbg(line.rstrip())
-
-        # Write stdout to file
-        if stdout and write_file:
-            with open(
-                f'{os.path.join(cwd, proc)}_stdout.out', 'w'
-            ) as stdout_file:
-                stdout_file.write(stdout)
+        returncode, peak_memory = communicate(
+            process, proc, input, cwd, write_file
+        )
 
     return returncode
@@ -5,13 +5,17 @@ from copy import copy
 
 
 class CustomSemaphore:
-    def __init__(self, value: int = 1):
+    def __init__(self, value: int = 1, memory: int = None):
         if value < 0:
             raise ValueError('Initial value must be >= 0')
 
         # initialize counter
         self._counter = value
 
+        # memory budget in bytes, None for no limit
+        self.memory = memory
+        self._memory_used = 0
+
         # initialize lock
         self._condition = Condition()
 
@@ -21,21 +25,39 @@ class CustomSemaphore:
     def __exit__(self, type, value, traceback):
         self.release()
 
-    def acquire(self, count: int = 1) -> None:
-        """Acquire count permits atomically, or wait until they are available."""
+    def _fits(self, memory: int) -> bool:
+        """Return True if memory bytes fit into the memory budget."""
+
+        if self.memory == None or memory == 0:
+            return True
+
+        # A job that exceeds the budget by itself runs alone
+        return (
+            self._memory_used + memory <= self.memory or self._memory_used == 0
+        )
+
+    def acquire(self, count: int = 1, memory: int = 0) -> None:
+        """
+        Acquire count permits and memory bytes of the memory budget
+        atomically, or wait until they are available.
+        """
 
         with self._condition:
-            self._condition.wait_for(lambda: self._counter >= count)
+            self._condition.wait_for(
+                lambda: self._counter >= count and self._fits(memory)
+            )
             self._counter -= count
+            self._memory_used += memory
 
-    def locked(self, count: int = 1) -> bool:
-        """Return True if acquire(count) would not return immediately."""
+    def locked(self, count: int = 1, memory: int = 0) -> bool:
+        """Return True if acquire(count, memory) would not return immediately."""
 
-        return self._counter < count
+        return self._counter < count or not self._fits(memory)
 
-    def release(self, count: int = 1) -> None:
-        """Release count permits."""
+    def release(self, count: int = 1, memory: int = 0) -> None:
+        """Release count permits and memory bytes of the memory budget."""
 
         with self._condition:
             self._counter += count
+            self._memory_used -= memory
             self._condition.notify_all()
@@ -0,0 +1,43 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""executor.py: The process-wide executor for simulation jobs."""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    """
+    Get the executor that all parameters submit their simulation jobs to.
+    It is created on the first call with max_workers threads, which should
+    be the size of the jobs semaphore: every running job holds at least one
+    slot of the semaphore, so more threads would only wait for it.
+    Tasks must never wait for other tasks of the executor.
+    """
+
+    global _executor
+
+    with _executor_lock:
+        if _executor == None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max_workers or os.cpu_count(),
+                thread_name_prefix='cace_job',
+            )
+
+    return _executor
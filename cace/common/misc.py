@@ -13,6 +13,7 @@
 # limitations under the License.
 import os
 import re
+import shutil
 import typing
 import pathlib
 import unicodedata
@@ -132,3 +133,31 @@ def mkdirp(path: typing.Union[str, os.PathLike]):
     :param path: A filesystem path for the directory
     """
     return pathlib.Path(path).mkdir(parents=True, exist_ok=True)
+
+
+def link_file(source: str, destination: str):
+    """
+    Makes a file available under another path without copying it.
+
+    Tries a hardlink first, then a symlink and copies
+    the file only if neither is supported.
+
+    :param source: The path of the existing file
+    :param destination: The new path of the file, which is replaced
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+
+    try:
+        os.link(source, destination)
+        return
+    except OSError:
+        pass
+
+    try:
+        os.symlink(os.path.abspath(source), destination)
+        return
+    except OSError:
+        pass
+
+    shutil.copyfile(source, destination)
@@ -0,0 +1,395 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""ngspice_pool.py: A pool of long-lived ngspice processes in pipe mode."""
+
+import os
+import re
+import pty
+import queue
+import threading
+import subprocess
+
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+# Matches "quit" or "exit" as a control command
+quitrex = re.compile(r'^\s*(quit|exit)\b', re.IGNORECASE)
+
+# Control commands that change the state of the interpreter
+setrex = re.compile(r'^\s*(set|setcs|unset)\s+(.*)$', re.IGNORECASE)
+aliasrex = re.compile(r'^\s*(alias|define)\s+([^\s(]+)', re.IGNORECASE)
+cdrex = re.compile(r'^\s*cd\s+"?([^"]*?)"?\s*$', re.IGNORECASE)
+sourcerex = re.compile(r'^\s*source\s+"?([^"]*?)"?\s*$', re.IGNORECASE)
+
+# A variable of a set command: name, name=value or name = ( list )
+varrex = re.compile(
+    r'([^\s=()]+)(\s*=\s*(\([^)]*\)|"[^"]*"|\'[^\']*\'|[^\s()]+))?'
+)
+
+# Lines of the output of ngspice that report a failed analysis or
+# netlist, a job with such a line fails like it does in batch mode
+failrex = re.compile(
+    r'^\s*(doAnalyses:|.*simulation\(s\) aborted|.*circuit not parsed)',
+    re.IGNORECASE,
+)
+
+# Other errors, e.g. of a measurement, are only reported
+errorrex = re.compile(r'^\s*error\b', re.IGNORECASE)
+
+
+def remove_quit(netlist_path):
+    """
+    Comment out "quit" and "exit" commands inside of the
+    .control sections of a netlist, so that sourcing it
+    does not terminate a running ngspice process.
+    """
+
+    with open(netlist_path, 'r') as ifile:
+        lines = ifile.read().splitlines()
+
+    in_control = False
+    changed = False
+
+    for index, line in enumerate(lines):
+        keyword = line.strip().lower()
+
+        if keyword.startswith('.control'):
+            in_control = True
+        elif keyword.startswith('.endc'):
+            in_control = False
+        elif in_control and quitrex.match(line):
+            lines[index] = '* ' + line
+            changed = True
+
+    if changed:
+        dbg(f'Removing quit from {netlist_path}.')
+        with open(netlist_path, 'w') as ofile:
+            for line in lines:
+                ofile.write(f'{line}\n')
+
+
+def get_control_lines(netlist_path):
+    """Returns the lines of the .control sections of a netlist"""
+
+    try:
+        with open(netlist_path, 'r') as ifile:
+            lines = ifile.read().splitlines()
+    except OSError:
+        return []
+
+    control_lines = []
+    in_control = False
+
+    for line in lines:
+        keyword = line.strip().lower()
+
+        if keyword.startswith('.control'):
+            in_control = True
+        elif keyword.startswith('.endc'):
+            in_control = False
+        elif in_control:
+            control_lines.append(line)
+
+    return control_lines
+
+
+def get_variables(line):
+    """
+    Returns the variables of a set or unset command
+    by their name, together with their assignment
+    """
+
+    match = setrex.match(line)
+    if not match:
+        return {}
+
+    return {
+        variable.group(1): variable.group(0)
+        for variable in varrex.finditer(match.group(2))
+    }
+
+
+def get_state_changes(netlist_path, depth=0):
+    """
+    Returns the names of the variables and of the aliases and
+    functions that the .control sections of a netlist, and the
+    netlists it sources, change in the interpreter
+    """
+
+    variables = set()
+    definitions = set()
+
+    cwd = os.path.dirname(netlist_path)
+
+    for line in get_control_lines(netlist_path):
+        variables.update(get_variables(line))
+
+        match = aliasrex.match(line)
+        if match:
+            definitions.add((match.group(1).lower(), match.group(2)))
+
+        match = cdrex.match(line)
+        if match:
+            cwd = os.path.join(cwd, match.group(1))
+
+        match = sourcerex.match(line)
+        if match and depth < 10:
+            sourced = get_state_changes(
+                os.path.join(cwd, match.group(1)), depth + 1
+            )
+            variables.update(sourced[0])
+            definitions.update(sourced[1])
+
+    return (variables, definitions)
+
+
+class NgspiceWorker:
+    """
+    A single ngspice process that runs in pipe mode (ngspice -p)
+    and sources netlists one after another
+    """
+
+    def __init__(self, cwd):
+        self.cwd = cwd
+        self.num_jobs = 0
+
+        # Use a pseudo terminal for the output, so that
+        # ngspice flushes its output after every line
+        master, slave = pty.openpty()
+
+        dbg(f'Starting ngspice worker at {cwd}.')
+
+        self.process = subprocess.Popen(
+            ['ngspice', '-p'],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=slave,
+            stderr=slave,
+            text=True,
+        )
+        os.close(slave)
+
+        self.output = open(master, 'r', errors='replace')
+
+        # The variables set by the .spiceinit, they are
+        # restored to these values after every job
+        self.initial_variables = {}
+
+        try:
+            with open(os.path.join(cwd, '.spiceinit'), 'r') as ifile:
+                for line in ifile:
+                    match = setrex.match(line)
+                    if match and match.group(1).lower() != 'unset':
+                        self.initial_variables.update(get_variables(line))
+        except OSError:
+            pass
+
+    def alive(self):
+        return self.process.poll() == None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+
+    def close(self):
+        """Close stdin so that ngspice exits on its own"""
+
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+        self.output.close()
+
+    def readline(self):
+        """Returns the next line of output or None if ngspice exited"""
+
+        try:
+            line = self.output.readline()
+        except OSError:
+            # The pty raises EIO when the process is gone
+            return None
+
+        if line == '':
+            return None
+
+        return line.rstrip('\r\n')
+
+    def read_until(self, marker, output):
+        """
+        Pass the lines of output to output until the marker.
+        Returns False if ngspice exited before.
+        """
+
+        while True:
+            line = self.readline()
+
+            # ngspice exited during the job
+            if line == None:
+                return False
+
+            if line.endswith(marker):
+                return True
+
+            output(line)
+
+    def get_reset_commands(self, netlist_path):
+        """
+        The commands that undo the changes of a netlist to the
+        interpreter, so that they do not leak into the next job
+        """
+
+        variables, definitions = get_state_changes(netlist_path)
+
+        commands = [
+            # Remove the circuit and all vectors
+            'remcirc',
+            'destroy all',
+        ]
+
+        for name in sorted(variables):
+            if name in self.initial_variables:
+                commands.append(f'set {self.initial_variables[name]}')
+            else:
+                commands.append(f'unset {name}')
+
+        for kind, name in sorted(definitions):
+            commands.append(f'un{kind} {name}')
+
+        return commands
+
+    def run(self, outpath, simfile, output):
+        """
+        Source the netlist in outpath, then reset the circuit state
+        and the interpreter. Each line of the output of ngspice is
+        passed to output. Returns the return code, which is 1 if
+        an analysis failed or the netlist could not be parsed.
+        """
+
+        job_marker = f'cace_job_done_{self.num_jobs}'
+        reset_marker = f'cace_job_reset_{self.num_jobs}'
+        self.num_jobs += 1
+
+        netlist_path = os.path.join(outpath, simfile)
+        remove_quit(netlist_path)
+
+        commands = [
+            f'cd "{outpath}"',
+            f'source {simfile}',
+            f'echo {job_marker}',
+            *self.get_reset_commands(netlist_path),
+            f'echo {reset_marker}',
+        ]
+
+        try:
+            self.process.stdin.write('\n'.join(commands) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            return self.process.wait()
+
+        failures = []
+
+        def scan(line):
+            if failrex.match(line):
+                failures.append(line)
+            elif errorrex.match(line):
+                warn(f'ngspice: {line.strip()}')
+            output(line)
+
+        if not self.read_until(job_marker, scan):
+            return self.process.wait()
+
+        # The output of the reset is not part of the job
+        if not self.read_until(reset_marker, dbg):
+            return self.process.wait()
+
+        if failures:
+            return 1
+
+        return 0
+
+
+class NgspicePool:
+    """
+    Keeps idle ngspice workers around, so that a simulation job
+    does not pay for the startup of ngspice (spiceinit, code models).
+    The number of workers is implicitly limited by the jobs semaphore,
+    since every job holds its slots while it uses a worker.
+    """
+
+    def __init__(self):
+        self.idle_workers = queue.LifoQueue()
+        self.workers = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def acquire(self, cwd):
+        """Get an idle worker or start a new one in cwd"""
+
+        while True:
+            try:
+                worker = self.idle_workers.get_nowait()
+            except queue.Empty:
+                break
+
+            if worker.alive():
+                return worker
+
+            self.remove(worker)
+
+        worker = NgspiceWorker(cwd)
+
+        with self.lock:
+            self.workers.append(worker)
+
+        return worker
+
+    def release(self, worker):
+        """Return a worker to the pool"""
+
+        if worker.alive() and not self.closed:
+            self.idle_workers.put(worker)
+        else:
+            self.remove(worker)
+
+    def remove(self, worker):
+        """Close a worker and forget it"""
+
+        worker.close()
+
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+
+    def close(self):
+        """Terminate all workers"""
+
+        self.closed = True
+
+        with self.lock:
+            for worker in self.workers:
+                worker.close()
+            self.workers = []
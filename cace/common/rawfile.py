@@ -0,0 +1,218 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""rawfile.py: Reader for ngspice binary rawfiles using memory maps."""
+
+import os
+import numpy as np
+
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+
+class RawPlot:
+    """
+    A single plot (analysis) inside of a rawfile.
+    The vectors are read lazily from a memory map of the file.
+    """
+
+    def __init__(self, path, title, plotname, flags, names, points, offset):
+        self.path = path
+        self.title = title
+        self.plotname = plotname
+        self.flags = flags
+        self.names = names
+        self.points = points
+        self.offset = offset
+
+        # Each point stores all vectors as doubles,
+        # or as pairs of doubles for complex plots
+        self.dtype = np.complex128 if 'complex' in flags else np.float64
+
+        self.data = None
+
+    def get_data(self):
+        """Map the data of the plot, one row per point"""
+
+        if self.data is None:
+            if self.points == 0:
+                self.data = np.zeros((0, len(self.names)), dtype=self.dtype)
+            else:
+                self.data = np.memmap(
+                    self.path,
+                    dtype=self.dtype,
+                    mode='r',
+                    offset=self.offset,
+                    shape=(self.points, len(self.names)),
+                )
+
+        return self.data
+
+    def has_vector(self, name):
+        return name.lower() in self.names
+
+    def get_vector(self, name):
+        """Returns the vector of the given name as numpy array"""
+
+        return self.get_data()[:, self.names.index(name.lower())]
+
+
+class RawFile:
+    """
+    An ngspice rawfile, written by the "write" command or with "-r".
+    Only the headers are parsed when the file is opened, the data
+    of the plots is memory-mapped once a vector is requested.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.plots = []
+
+        self.parse()
+
+    def parse(self):
+        filesize = os.path.getsize(self.path)
+
+        with open(self.path, 'rb') as ifile:
+            while ifile.tell() < filesize:
+                plot = self.parse_plot(ifile, filesize)
+
+                if not plot:
+                    break
+
+                self.plots.append(plot)
+
+                dbg(
+                    f'Rawfile plot "{plot.plotname}" with {len(plot.names)} vectors and {plot.points} points.'
+                )
+
+                # Skip the data to get to the next plot
+                ifile.seek(
+                    plot.offset
+                    + plot.points
+                    * len(plot.names)
+                    * np.dtype(plot.dtype).itemsize
+                )
+
+    def parse_plot(self, ifile, filesize):
+        """Parse the header of a plot and return it"""
+
+        title = ''
+        plotname = ''
+        flags = ''
+        num_variables = 0
+        points = 0
+        names = []
+
+        while True:
+            line = ifile.readline()
+
+            # End of file
+            if not line:
+                return None
+
+            line = line.decode('utf-8', errors='replace').strip()
+
+            if not line:
+                continue
+
+            key, _, value = line.partition(':')
+            key = key.lower()
+            value = value.strip()
+
+            if key == 'title':
+                title = value
+            elif key == 'plotname':
+                plotname = value
+            elif key == 'flags':
+                flags = value.lower()
+            elif key == 'no. variables':
+                num_variables = int(value)
+            elif key == 'no. points':
+                points = int(value)
+            elif key == 'variables':
+                # One vector per line: index, name and type
+                if value:
+                    names.append(value.split()[1].lower())
+                while len(names) < num_variables:
+                    entry = ifile.readline().decode('utf-8', errors='replace')
+                    names.append(entry.split()[1].lower())
+            elif key == 'values':
+                err(
+                    f'Rawfile {self.path} is in ASCII format, only binary rawfiles are supported.'
+                )
+                return None
+            elif key == 'binary':
+                break
+
+        offset = ifile.tell()
+
+        # The number of points may be wrong if ngspice
+        # was interrupted, only use complete points
+        itemsize = np.dtype(
+            np.complex128 if 'complex' in flags else np.float64
+        ).itemsize
+        available = (filesize - offset) // (itemsize * max(len(names), 1))
+
+        if available < points:
+            warn(
+                f'Rawfile {self.path} is truncated, reading {available} of {points} points.'
+            )
+            points = available
+
+        return RawPlot(
+            self.path, title, plotname, flags, names, points, offset
+        )
+
+    def get_vector(self, name):
+        """
+        Returns the vector of the given name from the
+        first plot that contains it, or None
+        """
+
+        for plot in self.plots:
+            if plot.has_vector(name):
+                return plot.get_vector(name)
+
+        return None
+
+
+def read_rawfile(path, names):
+    """
+    Read the vectors with the given names from a binary rawfile.
+    Returns a dictionary of numpy arrays, or None if a vector is missing.
+    """
+
+    rawfile = RawFile(path)
+
+    vectors = {}
+
+    for name in names:
+        vector = rawfile.get_vector(name)
+
+        if vector is None:
+            err(f'Could not find vector "{name}" in rawfile {path}.')
+            return None
+
+        vectors[name] = vector
+
+    return vectors
@@ -0,0 +1,384 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+result_cache.py: A persistent, content-addressed cache for the
+result files of simulation runs.
+
+The key of a run is the hash of its substituted testbench netlist,
+its .spiceinit, all files referenced by them (DUT netlist, model
+libraries, OSDI models) and the ngspice version. Every entry is a
+directory with the files that the simulation created. Entries are
+evicted in least recently used order once the cache exceeds its size.
+"""
+
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+
+from .misc import mkdirp
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+# Bump to invalidate all existing entries
+CACHE_VERSION = 1
+
+# Default size limit of the cache in MB
+DEFAULT_CACHE_SIZE = 1024
+
+# .include <file> or .inc <file>
+includerex = re.compile(
+    r'^\s*\.(?:include|inc)\s+(["\']?)([^"\'\s]+)\1', re.IGNORECASE
+)
+
+# .lib <file> <section>, but not the start of a section
+librex = re.compile(r'^\s*\.lib\s+(["\']?)([^"\'\s]+)\1\s+\S+', re.IGNORECASE)
+
+# pre_osdi <file> or osdi <file> in control sections and spiceinit
+osdirex = re.compile(
+    r'^\s*(?:pre_)?osdi\s+(["\']?)([^"\'\s]+)\1', re.IGNORECASE
+)
+
+# Digests of referenced files, keyed by path and
+# only valid while mtime and size do not change
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+_ngspice_version = None
+_ngspice_version_lock = threading.Lock()
+
+
+def get_default_cache_dir():
+    """Returns the default location of the cache"""
+
+    cache_home = os.environ.get('XDG_CACHE_HOME', '~/.cache')
+    return os.path.join(os.path.expanduser(cache_home), 'cace')
+
+
+def get_ngspice_version():
+    """Returns the version string of ngspice or None"""
+
+    global _ngspice_version
+
+    with _ngspice_version_lock:
+        if _ngspice_version == None:
+            try:
+                _ngspice_version = subprocess.run(
+                    ['ngspice', '--version'],
+                    stdin=subprocess.DEVNULL,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+            except OSError:
+                _ngspice_version = ''
+
+    return _ngspice_version if _ngspice_version else None
+
+
+def get_referenced_files(text, directory):
+    """
+    Get all files that are included by a netlist or
+    loaded by a spiceinit. Relative paths are
+    resolved against the directory of the file.
+    """
+
+    paths = []
+
+    for line in text.splitlines():
+        match = (
+            includerex.match(line) or librex.match(line) or osdirex.match(line)
+        )
+
+        if not match:
+            continue
+
+        path = os.path.expanduser(match.group(2))
+        if not os.path.isabs(path):
+            path = os.path.join(directory, path)
+
+        paths.append(os.path.normpath(path))
+
+    return paths
+
+
+def get_file_digest(path):
+    """
+    Get the digest of a file together with the files it references.
+    Returns a list of (path, digest) tuples for the file and all
+    files it references recursively.
+    """
+
+    digests = []
+    visited = set()
+    stack = [path]
+
+    while stack:
+        path = stack.pop()
+
+        if path in visited:
+            continue
+        visited.add(path)
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            digests.append((path, 'missing'))
+            continue
+
+        with _file_digests_lock:
+            entry = _file_digests.get(path)
+
+        if not entry or entry[0] != (stat.st_mtime_ns, stat.st_size):
+            with open(path, 'rb') as ifile:
+                content = ifile.read()
+
+            referenced = get_referenced_files(
+                content.decode('utf-8', errors='replace'),
+                os.path.dirname(path),
+            )
+
+            entry = (
+                (stat.st_mtime_ns, stat.st_size),
+                hashlib.sha256(content).hexdigest(),
+                referenced,
+            )
+
+            with _file_digests_lock:
+                _file_digests[path] = entry
+
+        digests.append((path, entry[1]))
+        stack.extend(entry[2])
+
+    return digests
+
+
+def list_files(directory):
+    """Returns the relative paths of all files in a directory"""
+
+    files = set()
+
+    for root, dirs, filenames in os.walk(directory):
+        for filename in filenames:
+            files.add(os.path.relpath(os.path.join(root, filename), directory))
+
+    return files
+
+
+class ResultCache:
+    """
+    Stores the result files of simulation runs under
+    the hash of everything that affects the simulation
+    """
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_CACHE_SIZE):
+        self.cache_dir = os.path.abspath(
+            cache_dir if cache_dir else get_default_cache_dir()
+        )
+        self.max_size = max_size * 1024 * 1024
+
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_key(self, outpath, simfile, extra_files=[]):
+        """
+        Get the key for the run in outpath. The path of the run
+        is removed from the netlist, since it differs between runs.
+        Returns None if the run cannot be cached.
+        """
+
+        version = get_ngspice_version()
+
+        if not version:
+            return None
+
+        netlist_path = os.path.join(outpath, simfile)
+
+        try:
+            with open(netlist_path, 'r') as ifile:
+                netlist = ifile.read()
+        except OSError:
+            return None
+
+        key = hashlib.sha256()
+        key.update(f'cace result cache {CACHE_VERSION}\n'.encode())
+        key.update(version.encode())
+        key.update(netlist.replace(os.path.abspath(outpath), '').encode())
+
+        # The spiceinit, files referenced by the netlist and extra files
+        paths = [os.path.join(outpath, '.spiceinit')]
+        paths += get_referenced_files(netlist, outpath)
+        paths += extra_files
+
+        digests = set()
+        for path in paths:
+            for path, digest in get_file_digest(path):
+                # Files inside the run directory are part of the run
+                if path.startswith(os.path.abspath(outpath) + os.sep):
+                    path = os.path.relpath(path, outpath)
+                digests.add((path, digest))
+
+        for path, digest in sorted(digests):
+            key.update(f'{path} {digest}\n'.encode())
+
+        return key.hexdigest()
+
+    def get_entry_dir(self, key):
+        return os.path.join(self.objects_dir, key[0:2], key)
+
+    def restore(self, key, outpath):
+        """
+        Copy the result files of the entry into outpath.
+        Returns True on a hit.
+        """
+
+        entry_dir = self.get_entry_dir(key)
+
+        if not os.path.isdir(entry_dir):
+            with self.lock:
+                self.misses += 1
+            return False
+
+        try:
+            for path in list_files(entry_dir):
+                mkdirp(os.path.dirname(os.path.join(outpath, path)))
+                shutil.copyfile(
+                    os.path.join(entry_dir, path), os.path.join(outpath, path)
+                )
+
+            # Mark the entry as recently used
+            os.utime(entry_dir)
+        except OSError as error:
+            warn(f'Could not restore {key} from the result cache: {error}')
+            with self.lock:
+                self.misses += 1
+            return False
+
+        dbg(f'Restored {os.path.relpath(outpath)} from the result cache.')
+
+        with self.lock:
+            self.hits += 1
+
+        return True
+
+    def store(self, key, outpath, files):
+        """Store the given files of outpath under the key"""
+
+        entry_dir = self.get_entry_dir(key)
+
+        if os.path.isdir(entry_dir):
+            return
+
+        try:
+            mkdirp(os.path.dirname(entry_dir))
+
+            # Copy to a temporary directory first, so that
+            # an entry is either complete or not present
+            tmp_dir = tempfile.mkdtemp(
+                prefix='tmp_', dir=os.path.dirname(entry_dir)
+            )
+
+            for path in files:
+                mkdirp(os.path.dirname(os.path.join(tmp_dir, path)))
+                shutil.copyfile(
+                    os.path.join(outpath, path), os.path.join(tmp_dir, path)
+                )
+
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Stored by someone else in the meantime
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except OSError as error:
+            warn(f'Could not store {key} in the result cache: {error}')
+
+    def get_entries(self):
+        """
+        Returns a list of (mtime, size, path) tuples for all
+        entries, the least recently used entry comes first
+        """
+
+        entries = []
+
+        if not os.path.isdir(self.objects_dir):
+            return entries
+
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+
+                # Skip incomplete entries
+                if key.startswith('tmp_'):
+                    continue
+
+                size = sum(
+                    os.path.getsize(os.path.join(entry_dir, path))
+                    for path in list_files(entry_dir)
+                )
+                entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+
+        entries.sort()
+
+        return entries
+
+    def stats(self):
+        """Returns the number of entries and their total size in bytes"""
+
+        entries = self.get_entries()
+
+        return (len(entries), sum(size for _, size, _ in entries))
+
+    def gc(self):
+        """
+        Evict the least recently used entries until the cache
+        fits into its size limit. Returns the number of evicted
+        entries and the number of freed bytes.
+        """
+
+        entries = self.get_entries()
+        total_size = sum(size for _, size, _ in entries)
+
+        evicted = 0
+        freed = 0
+
+        for mtime, size, entry_dir in entries:
+            if total_size <= self.max_size:
+                break
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+            total_size -= size
+            freed += size
+            evicted += 1
+
+        if evicted:
+            dbg(f'Evicted {evicted} entries from the result cache.')
+
+        return (evicted, freed)
@@ -0,0 +1,260 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+result_store.py: Columnar on-disk store for the results of a parameter.
+
+While simulating, the values of each condition set are appended to
+a raw file per variable. Once all condition sets are done, every
+variable is written as a .npy file in the order of the condition
+sets, together with "index.json", which maps each run and its
+conditions to a slice of the columns. The columns are memory-mapped
+when they are read, so that all values are available at full
+precision without holding them in memory.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+
+from .misc import mkdirp
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+INDEX_FILE = 'index.json'
+STORE_VERSION = 1
+
+# Column types by the kind of the values
+DTYPES = {
+    'i': np.int64,
+    'u': np.int64,
+    'f': np.float64,
+    'c': np.complex128,
+}
+
+
+class ResultStore:
+    """
+    The columns of all variables of a parameter, with
+    one slice per condition set in each column
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        # Variables and their columns, created on the first append
+        self.columns = {}
+
+        # Offset and length of each condition set in the raw files
+        self.entries = {}
+
+        # Written by finalize() or read from the index
+        self.index = None
+
+        # Memory-mapped columns by variable
+        self.mapped = {}
+
+    def clear(self):
+        """Remove the files of a previous run"""
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_raw_path(self, column):
+        return os.path.join(self.directory, f'{column["name"]}.raw')
+
+    def append(self, index, values):
+        """
+        Append the values of the variables of a condition set.
+        Values that are not numeric are not stored. Returns the
+        stored vectors as views of the memory-mapped raw files.
+        """
+
+        entry = {}
+        views = {}
+
+        for variable, value in values.items():
+            try:
+                array = np.asarray(value)
+            except ValueError:
+                continue
+
+            if not array.dtype.kind in DTYPES:
+                continue
+
+            if not variable in self.columns:
+                mkdirp(self.directory)
+                self.columns[variable] = {
+                    'name': f'column_{len(self.columns)}',
+                    'dtype': np.dtype(DTYPES[array.dtype.kind]),
+                    'length': 0,
+                }
+
+            column = self.columns[variable]
+
+            # Integers fit into real columns, but not the other way round
+            if not np.can_cast(array.dtype, column['dtype'], 'same_kind'):
+                dbg(f'Not storing {variable} of condition set {index}.')
+                continue
+
+            array = np.ravel(array).astype(column['dtype'], copy=False)
+
+            with open(self.get_raw_path(column), 'ab') as ofile:
+                ofile.write(array.tobytes())
+
+            entry[variable] = (column['length'], len(array))
+            column['length'] += len(array)
+
+            if len(array) > 0:
+                views[variable] = np.memmap(
+                    self.get_raw_path(column),
+                    dtype=column['dtype'],
+                    mode='r',
+                    offset=entry[variable][0] * column['dtype'].itemsize,
+                    shape=(len(array),),
+                )
+
+        self.entries[index] = entry
+
+        return views
+
+    def finalize(self, condition_sets):
+        """
+        Write every column in the order of the condition
+        sets and the index that maps the runs to its slices
+        """
+
+        max_digits = len(str(len(condition_sets)))
+
+        variables = {}
+
+        for variable, column in self.columns.items():
+            path = os.path.join(self.directory, f'{column["name"]}.npy')
+
+            variables[variable] = {
+                'file': os.path.basename(path),
+                'dtype': column['dtype'].name,
+            }
+
+            # An empty file cannot be memory-mapped
+            if column['length'] == 0:
+                np.save(path, np.empty(0, column['dtype']))
+
+                for index in self.entries:
+                    if variable in self.entries[index]:
+                        self.entries[index][variable] = (0, 0)
+
+                os.remove(self.get_raw_path(column))
+                continue
+
+            raw = np.memmap(
+                self.get_raw_path(column), dtype=column['dtype'], mode='r'
+            )
+
+            output = np.lib.format.open_memmap(
+                path, mode='w+', dtype=column['dtype'], shape=(len(raw),)
+            )
+
+            position = 0
+            for index in sorted(self.entries):
+                if not variable in self.entries[index]:
+                    continue
+
+                offset, length = self.entries[index][variable]
+                output[position : position + length] = raw[
+                    offset : offset + length
+                ]
+                self.entries[index][variable] = (position, length)
+                position += length
+
+            output.flush()
+            del output
+            del raw
+
+            os.remove(self.get_raw_path(column))
+
+        runs = []
+
+        for index, condition_set in enumerate(condition_sets):
+            runs.append(
+                {
+                    'run': f'run_{index:0{max_digits}d}',
+                    'conditions': condition_set,
+                    'slices': {
+                        variable: [position, position + length]
+                        for variable, (position, length) in self.entries.get(
+                            index, {}
+                        ).items()
+                    },
+                }
+            )
+
+        self.index = {
+            'version': STORE_VERSION,
+            'variables': variables,
+            'runs': runs,
+        }
+
+        if not variables:
+            return
+
+        # The index is only present if the store is complete
+        path = os.path.join(self.directory, INDEX_FILE)
+
+        with open(path + '.tmp', 'w') as ofile:
+            json.dump(self.index, ofile, default=list)
+
+        os.replace(path + '.tmp', path)
+
+    def read_index(self):
+        """Read the index of a finalized store"""
+
+        if self.index == None:
+            with open(os.path.join(self.directory, INDEX_FILE), 'r') as ifile:
+                self.index = json.load(ifile)
+
+        return self.index
+
+    def get_column(self, variable):
+        """Returns the memory-mapped column of a variable"""
+
+        if not variable in self.mapped:
+            entry = self.read_index()['variables'][variable]
+
+            self.mapped[variable] = np.load(
+                os.path.join(self.directory, entry['file']), mmap_mode='r'
+            )
+
+        return self.mapped[variable]
+
+    def get_values(self, index):
+        """
+        Returns the values of all variables of a condition
+        set as slices of the memory-mapped columns
+        """
+
+        slices = self.read_index()['runs'][index]['slices']
+
+        return {
+            variable: self.get_column(variable)[start:stop]
+            for variable, (start, stop) in slices.items()
+        }
@@ -0,0 +1,339 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+result_values.py: Compact storage and streaming statistics
+for the values of a result.
+
+The values are kept in a growable numpy array instead of a list
+of Python objects. While values are added, the count, minimum,
+maximum, mean and variance are accumulated, and a quantile sketch
+is updated. The sketch is exact until it holds more values than
+its capacity, after that it compacts its values with a relative
+rank error in the order of 1 / capacity. Thus the calculations of
+a spec can be evaluated without keeping every value.
+"""
+
+import math
+import numpy as np
+from collections.abc import Sequence
+
+# Number of values the quantile sketch holds per level
+DEFAULT_SKETCH_SIZE = 65536
+
+# Initial capacity of the array
+MIN_CAPACITY = 16
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of a stream of values. The values
+    of level i have a weight of 2**i. A full level is sorted
+    and every second value is moved to the next level.
+    """
+
+    def __init__(self, capacity=DEFAULT_SKETCH_SIZE):
+        self.capacity = capacity
+        self.levels = [np.empty(0)]
+        # Alternate the values that are kept per level
+        self.offsets = [0]
+
+    def is_exact(self):
+        """No values have been compacted yet"""
+
+        return len(self.levels) == 1
+
+    def update(self, values):
+        self.levels[0] = np.concatenate((self.levels[0], values))
+
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.capacity:
+                self.compact(level)
+            level += 1
+
+    def compact(self, level):
+        values = np.sort(self.levels[level])
+
+        # Keep the last value of an odd number of values on this level
+        remainder = values[len(values) - len(values) % 2 :]
+        values = values[: len(values) - len(values) % 2]
+
+        if level + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+            self.offsets.append(0)
+
+        offset = self.offsets[level]
+        self.offsets[level] = 1 - offset
+
+        self.levels[level] = remainder
+        self.levels[level + 1] = np.concatenate(
+            (self.levels[level + 1], values[offset::2])
+        )
+
+    def quantile(self, q):
+        """Returns the q-quantile with 0 <= q <= 1"""
+
+        if self.is_exact():
+            return np.quantile(self.levels[0], q)
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [
+                np.full(len(values), 2**level)
+                for level, values in enumerate(self.levels)
+            ]
+        )
+
+        order = np.argsort(values, kind='stable')
+        ranks = np.cumsum(weights[order])
+
+        position = np.searchsorted(ranks, q * ranks[-1], side='left')
+        return values[order[min(position, len(values) - 1)]]
+
+
+class ResultValues(Sequence):
+    """
+    The values of a result in a growable typed array,
+    together with streaming statistics. If keep is False,
+    only the statistics are kept and accessing the values
+    raises an IndexError.
+    """
+
+    def __init__(self, values=[], keep=True, sketch_size=DEFAULT_SKETCH_SIZE):
+        self.keep = keep
+
+        self.data = None
+        self.length = 0
+
+        # Streaming statistics
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Exact sum of integer values
+        self.total = 0
+        self.sketch = QuantileSketch(sketch_size)
+
+        # Values of other types are kept in a list without statistics
+        self.objects = None
+
+        self.extend(values)
+
+    def __repr__(self):
+        if self.objects == None and not self.keep:
+            if not self.count:
+                return f'<{len(self)} values not kept>'
+            return f'<{len(self)} values not kept, min {self.get_minimum()}, max {self.get_maximum()}>'
+        return repr(list(self))
+
+    def __len__(self):
+        if self.objects != None:
+            return len(self.objects)
+        return self.length
+
+    def __getitem__(self, index):
+        if self.objects != None:
+            return self.objects[index]
+        self.check_kept()
+        if isinstance(index, slice):
+            return self.array[index].tolist()
+        if index < -self.length or index >= self.length:
+            raise IndexError('Result value index out of range')
+        return self.array[index].item()
+
+    def __iter__(self):
+        if self.objects != None:
+            return iter(self.objects)
+        self.check_kept()
+        return iter(self.array.tolist())
+
+    def check_kept(self):
+        if not self.keep:
+            raise IndexError('The values of this result are not kept')
+
+    @property
+    def array(self):
+        """The kept values as numpy array"""
+
+        if self.data is None:
+            return np.empty(0)
+        return self.data[: self.length]
+
+    def append(self, value):
+        self.extend([value])
+
+    def extend(self, values):
+        if self.objects != None:
+            self.objects.extend(values)
+            return
+
+        try:
+            values = np.ravel(np.asarray(values))
+        except ValueError:
+            values = np.asarray(list(values), dtype=object)
+
+        if len(values) == 0:
+            return
+
+        # Booleans and integers are kept as integers
+        kind = values.dtype.kind
+        if kind == 'b':
+            values = values.astype(np.int64)
+        elif not kind in 'iufc':
+            self.objects = self.array.tolist() + values.tolist()
+            return
+
+        dtype = (
+            values.dtype
+            if self.data is None
+            else np.result_type(self.data.dtype, values.dtype)
+        )
+
+        if self.keep:
+            self.store(values.astype(dtype, copy=False))
+        else:
+            if self.data is None or self.data.dtype != dtype:
+                self.data = np.empty(0, dtype=dtype)
+            self.length += len(values)
+
+        if dtype.kind != 'c':
+            self.accumulate(values)
+
+    def store(self, values):
+        """Append the values to the array, which grows by doubling"""
+
+        length = self.length + len(values)
+
+        if (
+            self.data is None
+            or self.data.dtype != values.dtype
+            or len(self.data) < length
+        ):
+            capacity = max(MIN_CAPACITY, len(values))
+            if self.data is not None:
+                capacity = max(capacity, len(self.data))
+            while capacity < length:
+                capacity *= 2
+
+            data = np.empty(capacity, dtype=values.dtype)
+            data[: self.length] = self.array
+            self.data = data
+
+        self.data[self.length : length] = values
+        self.length = length
+
+    def accumulate(self, values):
+        """Merge the statistics of the values into the accumulators"""
+
+        count = len(values)
+        minimum = values.min()
+        maximum = values.max()
+
+        if values.dtype.kind in 'iu':
+            self.total += int(values.sum())
+
+        mean = values.mean(dtype=np.float64)
+        m2 = float(np.sum((values - mean) ** 2))
+
+        total = self.count + count
+        delta = mean - self.mean
+
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+        self.minimum = (
+            minimum if self.minimum is None else min(self.minimum, minimum)
+        )
+        self.maximum = (
+            maximum if self.maximum is None else max(self.maximum, maximum)
+        )
+
+        self.sketch.update(values.astype(np.float64, copy=False))
+
+    def has_statistics(self):
+        return self.count > 0 and self.count == len(self)
+
+    def is_integer(self):
+        return self.data is not None and self.data.dtype.kind in 'iu'
+
+    def get_minimum(self):
+        return self.minimum.item()
+
+    def get_maximum(self):
+        return self.maximum.item()
+
+    def get_average(self):
+        # The mean of integers stays an integer if it is one
+        if self.is_integer() and self.total % self.count == 0:
+            return self.total // self.count
+        return self.mean
+
+    def get_std(self):
+        """Sample standard deviation"""
+
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def get_median(self):
+        if self.keep:
+            values = self.array
+            middle = len(values) // 2
+
+            # The middle value itself for an odd number of values
+            if len(values) % 2:
+                return np.partition(values, middle)[middle].item()
+
+            values = np.partition(values, [middle - 1, middle])
+            return (values[middle - 1].item() + values[middle].item()) / 2
+
+        median = self.get_percentile(50)
+
+        # Until the sketch compacts, the median of an odd number of values is one of them
+        if self.is_integer() and self.count % 2 and self.sketch.is_exact():
+            return int(median)
+
+        return median
+
+    def get_percentile(self, percentile):
+        if self.keep:
+            return np.percentile(self.array, percentile).item()
+
+        return float(self.sketch.quantile(percentile / 100))
+
+    def get_cpk(self, lower=None, upper=None):
+        """
+        Process capability index for the lower and/or upper
+        spec limit. Returns None if there is no limit.
+        """
+
+        std = self.get_std()
+
+        capabilities = []
+        if lower != None:
+            capabilities.append(self.mean - lower)
+        if upper != None:
+            capabilities.append(upper - self.mean)
+
+        if not capabilities:
+            return None
+
+        capability = min(capabilities)
+
+        if std == 0:
+            return math.inf if capability >= 0 else -math.inf
+        return capability / (3 * std)
@@ -0,0 +1,454 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+results_db.py: A local SQLite database with the results of all runs.
+
+Every run of CACE is recorded with the hash of its datasheet, the
+netlist source, the wall time and the versions of the tools. For
+each parameter, the result type, the peak memory of its tools, the
+results of its specs and the values and the runtime of every
+condition set are recorded. Vectors are recorded by their length,
+minimum and maximum, the full values are in the result store of
+the run.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import subprocess
+import numpy as np
+
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+# Bump when the schema changes
+DB_VERSION = 3
+
+# Default name of the database in the runs directory
+DEFAULT_DB_NAME = 'results.db'
+
+# Arguments that print the version of a tool
+TOOL_VERSION_ARGS = {
+    'ngspice': ['ngspice', '--version'],
+    'xschem': ['xschem', '-v'],
+    'magic': ['magic', '--version'],
+    'klayout': ['klayout', '-v'],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_dir TEXT,
+    datasheet TEXT,
+    datasheet_hash TEXT,
+    netlist_source TEXT,
+    started REAL,
+    wall_time REAL,
+    cace_version TEXT,
+    tool_versions TEXT
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    run_id INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    parameter TEXT,
+    tool TEXT,
+    result_type TEXT,
+    wall_time REAL,
+    peak_memory INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    parameter TEXT,
+    result TEXT,
+    entry TEXT,
+    value REAL,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS condition_sets (
+    run_id INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    parameter TEXT,
+    idx INTEGER,
+    conditions TEXT,
+    vals TEXT,
+    runtime REAL
+);
+CREATE INDEX IF NOT EXISTS results_by_name ON results (parameter, result);
+CREATE INDEX IF NOT EXISTS condition_sets_by_run ON condition_sets (run_id, parameter);
+"""
+
+_tool_versions = {}
+_tool_versions_lock = threading.Lock()
+
+
+def get_tool_version(tool):
+    """Returns the first line of the version of a tool or None"""
+
+    if not tool in TOOL_VERSION_ARGS:
+        return None
+
+    with _tool_versions_lock:
+        if not tool in _tool_versions:
+            try:
+                output = subprocess.run(
+                    TOOL_VERSION_ARGS[tool],
+                    stdin=subprocess.DEVNULL,
+                    capture_output=True,
+                    text=True,
+                    timeout=10,
+                )
+                lines = (output.stdout + output.stderr).strip().splitlines()
+                _tool_versions[tool] = (
+                    lines[0].strip()
+                    if output.returncode == 0 and lines
+                    else None
+                )
+            except (OSError, subprocess.TimeoutExpired):
+                _tool_versions[tool] = None
+
+    return _tool_versions[tool]
+
+
+def get_file_hash(path):
+    """Returns the sha256 of a file or None"""
+
+    try:
+        with open(path, 'rb') as ifile:
+            return hashlib.sha256(ifile.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def summarize_value(value):
+    """
+    Single values are recorded as they are, vectors by
+    their length, minimum and maximum
+    """
+
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+
+    try:
+        array = np.ravel(np.asarray(value))
+    except ValueError:
+        return str(value)
+
+    if array.dtype.kind not in 'biuf':
+        return str(value)
+
+    if len(array) == 1:
+        return array[0].item()
+
+    return {
+        'length': len(array),
+        'minimum': array.min().item() if len(array) else None,
+        'maximum': array.max().item() if len(array) else None,
+    }
+
+
+class ResultsDatabase:
+    """
+    Records runs and their results and provides
+    queries across all recorded runs
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+
+        if version > DB_VERSION:
+            warn(
+                f'Results database {self.path} has a newer version ({version}).'
+            )
+
+        self.connection.executescript(SCHEMA)
+
+        # Columns that were added in later versions
+        self.add_column('condition_sets', 'runtime', 'REAL')
+        self.add_column('parameters', 'peak_memory', 'INTEGER')
+        self.connection.execute(f'PRAGMA user_version = {DB_VERSION}')
+        self.connection.commit()
+
+    def add_column(self, table, column, type):
+        """Add a column to a table of an older database"""
+
+        columns = [
+            row['name']
+            for row in self.connection.execute(f'PRAGMA table_info({table})')
+        ]
+
+        if not column in columns:
+            self.connection.execute(
+                f'ALTER TABLE {table} ADD COLUMN {column} {type}'
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record_run(
+        self,
+        run_dir,
+        datasheet,
+        datasheet_hash,
+        netlist_source,
+        started,
+        wall_time,
+        cace_version,
+        tool_versions,
+        parameters,
+    ):
+        """
+        Record a run. parameters is a list of dicts with the keys
+        name, tool, result_type, wall_time, peak_memory (in bytes or
+        None), results (the Result objects by name) and condition_sets
+        (a list of tuples of the conditions, the values summarized by
+        summarize_value() and the runtime in seconds of the longest
+        simulation or None). Returns the id of the run.
+        """
+
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (run_dir, datasheet, datasheet_hash, netlist_source,'
+                ' started, wall_time, cace_version, tool_versions)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    run_dir,
+                    datasheet,
+                    datasheet_hash,
+                    netlist_source,
+                    started,
+                    wall_time,
+                    cace_version,
+                    json.dumps(tool_versions),
+                ),
+            )
+            run_id = cursor.lastrowid
+
+            for parameter in parameters:
+                self.connection.execute(
+                    'INSERT INTO parameters VALUES (?, ?, ?, ?, ?, ?)',
+                    (
+                        run_id,
+                        parameter['name'],
+                        parameter['tool'],
+                        parameter['result_type'],
+                        parameter['wall_time'],
+                        parameter['peak_memory'],
+                    ),
+                )
+
+                for name, result in parameter['results'].items():
+                    for entry in ['minimum', 'typical', 'maximum']:
+                        if result.status[entry] == None:
+                            continue
+
+                        self.connection.execute(
+                            'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)',
+                            (
+                                run_id,
+                                parameter['name'],
+                                name,
+                                entry,
+                                self.get_scalar(result.result[entry]),
+                                result.status[entry],
+                            ),
+                        )
+
+                self.connection.executemany(
+                    'INSERT INTO condition_sets VALUES (?, ?, ?, ?, ?, ?)',
+                    (
+                        (
+                            run_id,
+                            parameter['name'],
+                            index,
+                            json.dumps(conditions, default=list),
+                            json.dumps(summaries),
+                            runtime,
+                        )
+                        for index, (
+                            conditions,
+                            summaries,
+                            runtime,
+                        ) in enumerate(parameter['condition_sets'])
+                    ),
+                )
+
+        dbg(f'Recorded run {run_id} in {self.path}.')
+
+        return run_id
+
+    def get_scalar(self, value):
+        """The results of specs are single values"""
+
+        value = summarize_value(value)
+        return None if isinstance(value, dict) else value
+
+    def get_runs(self, datasheet=None, limit=None):
+        """Returns the runs, the latest run comes first"""
+
+        query = 'SELECT * FROM runs'
+        arguments = []
+
+        if datasheet:
+            query += ' WHERE datasheet = ?'
+            arguments.append(datasheet)
+
+        query += ' ORDER BY id DESC'
+
+        if limit:
+            query += ' LIMIT ?'
+            arguments.append(limit)
+
+        runs = []
+        for row in self.connection.execute(query, arguments):
+            run = dict(row)
+            run['tool_versions'] = json.loads(run['tool_versions'])
+            runs.append(run)
+
+        return runs
+
+    def get_parameters(self, run_id):
+        """Returns the parameters of a run"""
+
+        return [
+            dict(row)
+            for row in self.connection.execute(
+                'SELECT * FROM parameters WHERE run_id = ? ORDER BY rowid',
+                (run_id,),
+            )
+        ]
+
+    def get_results(
+        self, parameter=None, result=None, datasheet=None, limit=None
+    ):
+        """
+        Returns the results of the specs across runs together with
+        the time and netlist source of the run, the latest run first
+        """
+
+        query = (
+            'SELECT results.*, runs.started, runs.datasheet, runs.netlist_source'
+            ' FROM results JOIN runs ON results.run_id = runs.id'
+        )
+        conditions = []
+        arguments = []
+
+        if parameter:
+            conditions.append('results.parameter = ?')
+            arguments.append(parameter)
+        if result:
+            conditions.append('results.result = ?')
+            arguments.append(result)
+        if datasheet:
+            conditions.append('runs.datasheet = ?')
+            arguments.append(datasheet)
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        query += ' ORDER BY runs.id DESC, results.rowid'
+
+        if limit:
+            query += ' LIMIT ?'
+            arguments.append(limit)
+
+        return [dict(row) for row in self.connection.execute(query, arguments)]
+
+    def get_condition_sets(self, run_id, parameter):
+        """Returns the conditions and values of each condition set"""
+
+        return [
+            (json.loads(row['conditions']), json.loads(row['vals']))
+            for row in self.connection.execute(
+                'SELECT conditions, vals FROM condition_sets'
+                ' WHERE run_id = ? AND parameter = ? ORDER BY idx',
+                (run_id, parameter),
+            )
+        ]
+
+    def get_runtimes(self, datasheet, parameter, netlist_source, limit=None):
+        """
+        Returns the conditions and the runtime of the condition sets
+        of a parameter in the latest runs with the same netlist source
+        """
+
+        query = (
+            'SELECT condition_sets.conditions, condition_sets.runtime'
+            ' FROM condition_sets JOIN runs ON condition_sets.run_id = runs.id'
+            ' WHERE runs.datasheet = ? AND runs.netlist_source = ?'
+            ' AND condition_sets.parameter = ?'
+            ' AND condition_sets.runtime IS NOT NULL'
+        )
+        arguments = [datasheet, netlist_source, parameter]
+
+        if limit:
+            query += (
+                ' AND runs.id IN (SELECT id FROM runs WHERE datasheet = ?'
+                ' AND netlist_source = ? ORDER BY id DESC LIMIT ?)'
+            )
+            arguments += [datasheet, netlist_source, limit]
+
+        return [
+            (json.loads(row['conditions']), row['runtime'])
+            for row in self.connection.execute(query, arguments)
+        ]
+
+    def get_peak_memory(
+        self, datasheet, parameter, netlist_source, limit=None
+    ):
+        """
+        Returns the largest peak memory in bytes of a parameter in the
+        latest runs with the same netlist source or None
+        """
+
+        query = (
+            'SELECT MAX(parameters.peak_memory)'
+            ' FROM parameters JOIN runs ON parameters.run_id = runs.id'
+            ' WHERE runs.datasheet = ? AND runs.netlist_source = ?'
+            ' AND parameters.parameter = ?'
+        )
+        arguments = [datasheet, netlist_source, parameter]
+
+        if limit:
+            query += (
+                ' AND runs.id IN (SELECT id FROM runs WHERE datasheet = ?'
+                ' AND netlist_source = ? ORDER BY id DESC LIMIT ?)'
+            )
+            arguments += [datasheet, netlist_source, limit]
+
+        return self.connection.execute(query, arguments).fetchone()[0]
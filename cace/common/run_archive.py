@@ -0,0 +1,202 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+run_archive.py: Packed storage for the directories of simulation runs.
+
+Instead of keeping a directory with a handful of small files for
+every run, the completed runs of a parameter are appended to a
+single compressed zip archive. The members of a run are stored
+under its relative path, e.g. "run_03/run_07/". Files that are
+shared by all runs, like the .spiceinit, are stored only once
+at the top level of the archive.
+"""
+
+import os
+import shutil
+import zipfile
+
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+# Default name of the archive in the directory of a parameter
+ARCHIVE_NAME = 'runs.zip'
+
+
+class RunArchive:
+    """
+    A zip archive of run directories, which can be
+    appended to and looked up by the name of a run
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.archive = None
+
+        # Files that are linked into every run by (device, inode)
+        self.shared = set()
+
+    def close(self):
+        if self.archive != None:
+            self.archive.close()
+            self.archive = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_archive(self, mode):
+        """Open the archive for reading ('r') or appending ('a')"""
+
+        if self.archive != None and self.archive.mode != mode:
+            self.close()
+
+        if self.archive == None:
+            self.archive = zipfile.ZipFile(
+                self.path, mode, compression=zipfile.ZIP_DEFLATED
+            )
+
+        return self.archive
+
+    def add_shared(self, path):
+        """
+        Store a file that is linked into every run once at the
+        top level, it is left out of the runs that contain it
+        """
+
+        if path == None or not os.path.isfile(path):
+            return
+
+        stat = os.stat(path)
+        self.shared.add((stat.st_dev, stat.st_ino))
+
+        self.get_archive('a').write(path, os.path.basename(path))
+
+    def is_shared(self, path):
+        stat = os.stat(path)
+        return (stat.st_dev, stat.st_ino) in self.shared
+
+    def add_run(self, directory, name):
+        """Append all files of a run directory under the given name"""
+
+        archive = self.get_archive('a')
+
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+
+                if self.is_shared(path):
+                    continue
+
+                archive.write(
+                    path,
+                    os.path.join(name, os.path.relpath(path, directory)),
+                )
+
+        dbg(f'Packed {directory} into {self.path}.')
+
+    def get_runs(self):
+        """Returns the names of all runs, i.e. the directories with files"""
+
+        return sorted(
+            {
+                os.path.dirname(member)
+                for member in self.get_archive('r').namelist()
+                if os.path.dirname(member)
+            }
+        )
+
+    def get_files(self, run):
+        """Returns the names of the files of a run"""
+
+        prefix = run.rstrip('/') + '/'
+
+        return [
+            member[len(prefix) :]
+            for member in self.get_archive('r').namelist()
+            if member.startswith(prefix) and not '/' in member[len(prefix) :]
+        ]
+
+    def get_member(self, run, filename):
+        """The member of a file of a run or of a shared file"""
+
+        archive = self.get_archive('r')
+
+        for member in [os.path.join(run, filename), filename]:
+            try:
+                return archive.getinfo(member)
+            except KeyError:
+                pass
+
+        raise KeyError(f'No file {filename} for run {run} in {self.path}')
+
+    def read(self, run, filename):
+        """Returns the content of a file of a run as bytes"""
+
+        return self.get_archive('r').read(self.get_member(run, filename))
+
+    def open(self, run, filename):
+        """Open a file of a run for reading in binary mode"""
+
+        return self.get_archive('r').open(self.get_member(run, filename))
+
+    def extract(self, run, destination):
+        """
+        Extract the files of a run, together with the shared
+        files, to destination. Returns the run directory.
+        """
+
+        archive = self.get_archive('r')
+        outpath = os.path.join(destination, run)
+
+        for member in archive.namelist():
+            if os.path.dirname(member) == '':
+                filename = member
+            elif member.startswith(run.rstrip('/') + '/'):
+                filename = os.path.relpath(member, run)
+            else:
+                continue
+
+            path = os.path.join(outpath, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with archive.open(member) as ifile, open(path, 'wb') as ofile:
+                shutil.copyfileobj(ifile, ofile)
+
+        return outpath
+
+    def extract_runs(self, destination):
+        """Extract the files of all runs to destination, without the shared files"""
+
+        archive = self.get_archive('r')
+
+        archive.extractall(
+            destination,
+            [
+                member
+                for member in archive.namelist()
+                if os.path.dirname(member)
+            ],
+        )
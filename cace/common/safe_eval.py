@@ -5,68 +5,87 @@
 #
 # The implementation is taken from https://stackoverflow.com/
 # questions/15197673/using-pythons-eval-vs-ast-literal-eval
+#
+# The expression can be parsed once with "parse_expression" and
+# evaluated many times with "eval_expression". Names in the expression
+# are looked up in the names given to "eval_expression".
 
 import ast, operator, math
 
+math_functions = set(x for x in dir(math) if not '__' in x)
 
-def safe_eval(s):
-    def checkmath(x, *args):
-        if x not in [x for x in dir(math) if not '__' in x]:
-            raise SyntaxError(f'Unknown func {x}()')
-        fun = getattr(math, x)
-        return fun(*args)
-
-    binOps = {
-        ast.Add: operator.add,
-        ast.Sub: operator.sub,
-        ast.Mult: operator.mul,
-        ast.Div: operator.truediv,
-        ast.Mod: operator.mod,
-        ast.Pow: operator.pow,
-        ast.Call: checkmath,
-        ast.BinOp: ast.BinOp,
-    }
-
-    unOps = {
-        ast.USub: operator.neg,
-        ast.UAdd: operator.pos,
-        ast.UnaryOp: ast.UnaryOp,
-    }
-
-    ops = tuple(binOps) + tuple(unOps)
-
-    tree = ast.parse(s, mode='eval')
-
-    def _eval(node):
-        if isinstance(node, ast.Expression):
-            return _eval(node.body)
-        elif isinstance(node, ast.Str):
-            return node.s
-        elif isinstance(node, ast.Num):
-            return node.value
-        elif isinstance(node, ast.Constant):
-            return node.value
-        elif isinstance(node, ast.BinOp):
-            if isinstance(node.left, ops):
-                left = _eval(node.left)
-            else:
-                left = node.left.value
-            if isinstance(node.right, ops):
-                right = _eval(node.right)
-            else:
-                right = node.right.value
-            return binOps[type(node.op)](left, right)
-        elif isinstance(node, ast.UnaryOp):
-            if isinstance(node.operand, ops):
-                operand = _eval(node.operand)
-            else:
-                operand = node.operand.value
-            return unOps[type(node.op)](operand)
-        elif isinstance(node, ast.Call):
-            args = [_eval(x) for x in node.args]
-            r = checkmath(node.func.id, *args)
-            return r
+
+def checkmath(x, *args):
+    if x not in math_functions:
+        raise SyntaxError(f'Unknown func {x}()')
+    fun = getattr(math, x)
+    return fun(*args)
+
+
+binOps = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.Call: checkmath,
+    ast.BinOp: ast.BinOp,
+}
+
+unOps = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.UnaryOp: ast.UnaryOp,
+}
+
+ops = tuple(binOps) + tuple(unOps) + (ast.Name,)
+
+
+def _eval(node, names={}):
+    if isinstance(node, ast.Expression):
+        return _eval(node.body, names)
+    elif isinstance(node, ast.Name):
+        if node.id not in names:
+            raise SyntaxError(f'Unknown name {node.id}')
+        return names[node.id]
+    elif isinstance(node, ast.Str):
+        return node.s
+    elif isinstance(node, ast.Num):
+        return node.value
+    elif isinstance(node, ast.Constant):
+        return node.value
+    elif isinstance(node, ast.BinOp):
+        if isinstance(node.left, ops):
+            left = _eval(node.left, names)
         else:
-            raise SyntaxError(f'Bad syntax, {type(node)}')
+            left = node.left.value
+        if isinstance(node.right, ops):
+            right = _eval(node.right, names)
+        else:
+            right = node.right.value
+        return binOps[type(node.op)](left, right)
+    elif isinstance(node, ast.UnaryOp):
+        if isinstance(node.operand, ops):
+            operand = _eval(node.operand, names)
+        else:
+            operand = node.operand.value
+        return unOps[type(node.op)](operand)
+    elif isinstance(node, ast.Call):
+        args = [_eval(x, names) for x in node.args]
+        r = checkmath(node.func.id, *args)
+        return r
+    else:
+        raise SyntaxError(f'Bad syntax, {type(node)}')
+
+
+def parse_expression(s):
+    return ast.parse(s, mode='eval')
 
-    return _eval(tree)
+
+def eval_expression(tree, names={}):
+    return _eval(tree, names)
+
+
+def safe_eval(s):
+    return eval_expression(parse_expression(s))
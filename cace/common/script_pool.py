@@ -0,0 +1,119 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+script_pool.py: The process-wide pool for user-defined scripts.
+
+Postprocessing scripts are usually numpy-heavy and would hold the
+GIL of the parameter threads, so they are run in worker processes.
+Each worker loads a script once and keeps it for all further calls.
+The output of a script is captured and returned to the caller,
+instead of redirecting the stdout of the whole process.
+"""
+
+import io
+import os
+import threading
+import traceback
+import contextlib
+import multiprocessing
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Scripts loaded in this process by path and their modification time
+_scripts = {}
+
+
+def get_script_pool(max_workers=None):
+    """
+    Get the process pool that all parameters submit their scripts to.
+    It is created on the first call with max_workers processes. The
+    processes are spawned, so that they do not inherit the threads
+    of the parent.
+    """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool == None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count(),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+
+    return _pool
+
+
+def load_script(path):
+    """Load the script at path, or return it if it is already loaded"""
+
+    mtime = os.stat(path).st_mtime_ns
+
+    if not path in _scripts or _scripts[path][0] != mtime:
+        spec = importlib.util.spec_from_file_location('user_script', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        _scripts[path] = (mtime, module)
+
+    return _scripts[path][1]
+
+
+def capture(function, *args):
+    """
+    Call the function with the given arguments and capture its output.
+    Returns the return value, the output and the traceback of an
+    exception, which is None on success.
+    """
+
+    output = io.StringIO()
+
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(
+            output
+        ):
+            result = function(*args)
+    except Exception:
+        return (None, output.getvalue(), traceback.format_exc())
+
+    return (result, output.getvalue(), None)
+
+
+def list_functions(path):
+    module = load_script(path)
+
+    return [
+        name
+        for name in dir(module)
+        if not name.startswith('_') and callable(getattr(module, name))
+    ]
+
+
+def call_function(path, function, *args):
+    return getattr(load_script(path), function)(*args)
+
+
+def get_script_functions(path):
+    """Load the script and return the names of its functions"""
+
+    return capture(list_functions, path)
+
+
+def run_script(path, function, *args):
+    """Call a function of the script with the given arguments"""
+
+    return capture(call_function, path, function, *args)
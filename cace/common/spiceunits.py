@@ -15,6 +15,8 @@
 """spice_units.py: Converts tuple of (unit, value) into standard unit numeric value."""
 
 import re
+import operator
+import functools
 
 from ..logging import (
     dbg,
@@ -126,165 +128,183 @@ def numeric(s):
 # Define how to convert SI units to spice values
 #
 # NOTE: spice_unit_unconvert can act on a tuple of (units, value) where
-# value is either a single value or a list of values.  spice_unit_convert
-# only acts on a tuple with a single value.  This is because the only large
-# vectors are produced by ngspice, and these values need unconverting back
-# into the units specified by the datasheet.  Values being converted to
-# ngspice units are from the datasheet and are only computed a few at a
-# time, so handling vectors is not particularly efficient.
+# value is either a single value, a list of values or a numpy array.
+# spice_unit_convert only acts on a tuple with a single value.  This is
+# because the only large vectors are produced by ngspice, and these
+# values need unconverting back into the units specified by the datasheet.
+#
+# The units are parsed only once into a plan, which holds the scale
+# factor of the units.  Plans are memoized by units and restriction,
+# so converting a value does not need any regular expressions.
+
+# Kinds of plans
+IDENTITY = 0  # the value is already in standard units
+PREFIX = 1  # scale by the factor of a metric prefix
+PERCENT = 2  # "%" in front of any units
+INVALID = 3  # the units cannot be parsed as the restricted type
+DIVIDE = 4  # units/units
+MULTIPLY = 5  # units⋅units or units²
+
+
+@functools.lru_cache(maxsize=None)
+def get_unit_regexes():
+    """Compile the regular expressions for all units once"""
+
+    unitrexes = [
+        (re.compile('^' + unitrec + '$'), unittypes[unitrec])
+        for unitrec in unittypes
+    ]
+
+    prefixrexes = [
+        (
+            re.compile('^' + prerec + unitrec + '$'),
+            prefixtypes[prerec],
+            unittypes[unitrec],
+        )
+        for prerec in prefixtypes
+        for unitrec in unittypes
+    ]
 
+    return (unitrexes, prefixrexes)
 
-def spice_unit_convert(valuet, restrict=[]):
-    """Convert SI units into spice values"""
-    # valuet is a tuple of (unit, value), where "value" is numeric
-    # and "unit" is a string.  "restrict" may be used to require that
-    # the value be of a specific class like "time" or "resistance".
+
+@functools.lru_cache(maxsize=None)
+def get_unit_plan(units, restrict=None):
+    """
+    Parse units into a plan for the conversion of values.
+    "restrict" may be used to require that the value be of
+    a specific class like "time" or "resistance".
+    """
 
     # Recursive handling of '/' and multiplicatioon dot in expressions
-    if '/' in valuet[0]:
-        parts = valuet[0].split('/', 1)
-        result = numeric(spice_unit_convert([parts[0], valuet[1]], restrict))
-        result /= numeric(spice_unit_convert([parts[1], '1.0'], restrict))
-        return str(result)
-
-    if '\u22c5' in valuet[0]:  	# multiplication dot
-        parts = valuet[0].split('\u22c5')
-        result = numeric(spice_unit_convert([parts[0], valuet[1]], restrict))
-        result *= numeric(spice_unit_convert([parts[1], '1.0'], restrict))
-        return str(result)
-
-    if '\u00b2' in valuet[0]:  	# squared
-        part = valuet[0].split('\u00b2')[0]
-        result = numeric(spice_unit_convert([part, valuet[1]], restrict))
-        result *= numeric(spice_unit_convert([part, '1.0'], restrict))
-        return str(result)
-
-    if valuet[0] == '':  # null case, no units
-        return valuet[1]
-
-    for unitrec in unittypes:  	# case of no prefix
-        if re.match('^' + unitrec + '$', valuet[0]):
-            if restrict:
-                if unittypes[unitrec] == restrict.lower():
-                    return valuet[1]
-            else:
-                return valuet[1]
-
-    for prerec in prefixtypes:
-        for unitrec in unittypes:
-            if re.match('^' + prerec + unitrec + '$', valuet[0]):
-                if restrict:
-                    if unittypes[unitrec] == restrict.lower():
-                        newvalue = numeric(valuet[1]) * prefixtypes[prerec]
-                        return str(newvalue)
-                else:
-                    newvalue = numeric(valuet[1]) * prefixtypes[prerec]
-                    return str(newvalue)
+    if '/' in units:
+        parts = units.split('/', 1)
+        return get_compound_plan(DIVIDE, parts[0], parts[1], restrict)
+
+    if '\u22c5' in units:  	# multiplication dot
+        parts = units.split('\u22c5')
+        return get_compound_plan(MULTIPLY, parts[0], parts[1], restrict)
+
+    if '\u00b2' in units:  	# squared
+        part = units.split('\u00b2')[0]
+        return get_compound_plan(MULTIPLY, part, part, restrict)
+
+    if units == '':  # null case, no units
+        return (IDENTITY,)
+
+    (unitrexes, prefixrexes) = get_unit_regexes()
+
+    for unitrex, unittype in unitrexes:  	# case of no prefix
+        if unitrex.match(units):
+            if not restrict or unittype == restrict:
+                return (IDENTITY,)
+
+    for prefixrex, factor, unittype in prefixrexes:
+        if prefixrex.match(units):
+            if not restrict or unittype == restrict:
+                return (PREFIX, factor)
 
     # Check for "%", which can apply to anything.
-    if valuet[0][0] == '%':
-        newvalue = numeric(valuet[1]) * 0.01
-        return str(newvalue)
+    if units[0] == '%':
+        return (PERCENT,)
 
     if restrict:
-        raise ValueError(
-            'units ' + valuet[0] + ' cannot be parsed as ' + restrict.lower()
-        )
+        return (INVALID, 'units ' + units + ' cannot be parsed as ' + restrict)
     else:
-        # raise ValueError('units ' + valuet[0] + ' cannot be parsed')
         # (Assume value is not in SI units and will be passed back as-is)
-        return valuet[1]
+        return (IDENTITY,)
 
 
-# Define how to convert spice values back into SI units
+def get_compound_plan(kind, first, second, restrict):
+    """
+    Plan for units that are combined from two units. The factor
+    of the second units is calculated once for both directions.
+    """
 
+    plan = get_unit_plan(first, restrict)
+    if plan[0] == INVALID:
+        return plan
 
-def spice_unit_unconvert(valuet, restrict=[]):
-    """Convert spice values back into SI units"""
+    try:
+        second_plan = get_unit_plan(second, restrict)
+        convert_factor = numeric(convert_value(second_plan, '1.0'))
+        unconvert_factor = unconvert_value(second_plan, 1.0)
+    except ValueError as error:
+        return (INVALID, str(error))
+
+    return (kind, plan, convert_factor, unconvert_factor)
+
+
+def convert_value(plan, value):
+    """Convert a value according to a plan"""
+
+    kind = plan[0]
+
+    if kind == IDENTITY:
+        return value
+    elif kind == PREFIX:
+        return str(numeric(value) * plan[1])
+    elif kind == PERCENT:
+        return str(numeric(value) * 0.01)
+    elif kind == INVALID:
+        raise ValueError(plan[1])
+    elif kind == DIVIDE:
+        return str(numeric(convert_value(plan[1], value)) / plan[2])
+    else:
+        return str(numeric(convert_value(plan[1], value)) * plan[2])
+
+
+def unconvert_value(plan, value):
+    """
+    Convert a value back according to a plan. Numpy
+    arrays are converted in a single operation.
+    """
+
+    kind = plan[0]
+
+    if kind == IDENTITY:
+        return value
+    elif kind == INVALID:
+        raise ValueError(plan[1])
+
+    if kind == PREFIX:
+        operation = operator.truediv
+        factor = plan[1]
+    elif kind == PERCENT:
+        operation = operator.mul
+        factor = 100
+    else:
+        value = unconvert_value(plan[1], value)
+        operation = operator.truediv if kind == DIVIDE else operator.mul
+        factor = plan[3]
+
+    if isinstance(value, list):
+        return list(operation(item, factor) for item in value)
+    else:
+        return operation(value, factor)
+
+
+def spice_unit_convert(valuet, restrict=[]):
+    """Convert SI units into spice values"""
     # valuet is a tuple of (unit, value), where "value" is numeric
     # and "unit" is a string.  "restrict" may be used to require that
     # the value be of a specific class like "time" or "resistance".
 
-    # Recursive handling of '/' and multiplicatioon dot in expressions
-    if '/' in valuet[0]:
-        parts = valuet[0].split('/', 1)
-        result = spice_unit_unconvert([parts[0], valuet[1]], restrict)
-        if isinstance(result, list):
-            result = list(
-                item / spice_unit_unconvert([parts[1], 1.0], restrict)
-                for item in result
-            )
-        else:
-            result /= spice_unit_unconvert([parts[1], 1.0], restrict)
-        return result
-
-    if '\u22c5' in valuet[0]:  	# multiplication dot
-        parts = valuet[0].split('\u22c5')
-        result = spice_unit_unconvert([parts[0], valuet[1]], restrict)
-        if isinstance(result, list):
-            result = list(
-                item * spice_unit_unconvert([parts[1], 1.0], restrict)
-                for item in result
-            )
-        else:
-            result *= spice_unit_unconvert([parts[1], 1.0], restrict)
-        return result
-
-    if '\u00b2' in valuet[0]:  	# squared
-        part = valuet[0].split('\u00b2')[0]
-        result = spice_unit_unconvert([part, valuet[1]], restrict)
-        if isinstance(result, list):
-            result = list(
-                item * spice_unit_unconvert([part, 1.0], restrict)
-                for item in result
-            )
-        else:
-            result *= spice_unit_unconvert([part, 1.0], restrict)
-        return result
-
-    if valuet[0] == '':  # null case, no units
-        return valuet[1]
-
-    for unitrec in unittypes:  	# case of no prefix
-        if re.match('^' + unitrec + '$', valuet[0]):
-            if restrict:
-                if unittypes[unitrec] == restrict.lower():
-                    return valuet[1]
-            else:
-                return valuet[1]
-
-    for prerec in prefixtypes:
-        for unitrec in unittypes:
-            if re.match('^' + prerec + unitrec + '$', valuet[0]):
-                if restrict:
-                    if unittypes[unitrec] == restrict.lower():
-                        if isinstance(valuet[1], list):
-                            return list(
-                                item / prefixtypes[prerec]
-                                for item in valuet[1]
-                            )
-                        else:
-                            return valuet[1] / prefixtypes[prerec]
-                else:
-                    if isinstance(valuet[1], list):
-                        return list(
-                            item / prefixtypes[prerec] for item in valuet[1]
-                        )
-                    else:
-                        return valuet[1] / prefixtypes[prerec]
+    plan = get_unit_plan(valuet[0], restrict.lower() if restrict else None)
 
-    # Check for "%", which can apply to anything.
-    if valuet[0][0] == '%':
-        if isinstance(valuet[1], list):
-            return list(item * 100 for item in valuet[1])
-        else:
-            return valuet[1] * 100
+    return convert_value(plan, valuet[1])
 
-    if restrict:
-        raise ValueError(
-            'units ' + valuet[0] + ' cannot be parsed as ' + restrict.lower()
-        )
-    else:
-        # raise ValueError('units ' + valuet[0] + ' cannot be parsed')
-        # (Assume value is not in SI units and will be passed back as-is)
-        return valuet[1]
+
+# Define how to convert spice values back into SI units
+
+
+def spice_unit_unconvert(valuet, restrict=[]):
+    """Convert spice values back into SI units"""
+    # valuet is a tuple of (unit, value), where "value" is numeric,
+    # a list of numeric values or a numpy array, and "unit" is a string.
+    # "restrict" may be used to require that the value be of a
+    # specific class like "time" or "resistance".
+
+    plan = get_unit_plan(valuet[0], restrict.lower() if restrict else None)
+
+    return unconvert_value(plan, valuet[1])
@@ -0,0 +1,447 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+template.py: Compiler for simulation templates.
+
+A template is parsed once into a list of segments: literal text,
+conditions {name}, sweeps {name|type} and expressions [...].
+Rendering a template for a condition set only joins the segments.
+Compiled templates are cached by their content, so that the copies
+of a template in the directories of the parameters share it.
+"""
+
+import re
+import ast
+import functools
+
+from .safe_eval import parse_expression, eval_expression
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+# Segment types
+LITERAL = 0
+CONDITION = 1
+SWEEP = 2
+EXPRESSION = 3
+
+# Placeholders stand in for a condition or sweep while
+# searching for expressions, each is a private use character
+PLACEHOLDER_BASE = 0xF0000
+placeholderrex = re.compile('([\U000F0000-\U000FFFFD])')
+
+# Bit slices name[3] or name[3:0]
+vectrex = re.compile(r'([^\[]+)\[([0-9:]+)\]')
+
+# Number of compiled templates that are kept
+TEMPLATE_CACHE_SIZE = 64
+
+# Names that stand in for the conditions in a compiled expression
+NAME_PREFIX = '_cace_'
+
+# Values of conditions that are used as numbers in compiled expressions
+numberrex = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$')
+
+
+def get_regexes(escape, legacy):
+    """
+    Returns the regular expressions for condition names,
+    conditions, sweeps and expressions. Schematics escape
+    the braces, legacy templates (cace_format <= 5.0)
+    have no CACE prefix.
+    """
+
+    # namerex:		condition name {name}
+    # varex:		variable name {name}
+    # sweepex:		name in {cond|value} format
+    # brackrex:		expressions in [expression] format
+
+    if escape:
+        if legacy:
+            namerex = re.compile(r'\\\{([^ \}\t]+)\\\}')
+            varex = re.compile(r'\\\{([^\\\}]+)\\\}')
+            sweepex = re.compile(r'\\\{([^\\\}]+)\|([^ \\\}]+)\\\}')
+            brackrex = re.compile(r'\[([^\]]+)\]')
+        else:
+            namerex = re.compile(r'CACE\\\{([^ \}\t]+)\\\}')
+            varex = re.compile(r'CACE\\\{([^\\\}]+)\\\}')
+            sweepex = re.compile(r'CACE\\\{([^\\\}]+)\|([^ \\\}]+)\\\}')
+            brackrex = re.compile(r'CACE\[([^\]]+)\]')
+    else:
+        if legacy:
+            namerex = re.compile(r'\{([^ \}\t]+)\}')
+            varex = re.compile(r'\{([^\}]+)\}')
+            sweepex = re.compile(r'\{([^\}]+)\|([^ \}]+)\}')
+            brackrex = re.compile(r'\[([^\]]+)\]')
+        else:
+            namerex = re.compile(r'CACE\{([^ \}\t]+)\}')
+            varex = re.compile(r'CACE\{([^\}]+)\}')
+            sweepex = re.compile(r'CACE\{([^\}]+)\|([^ \}]+)\}')
+            brackrex = re.compile(r'CACE\[([^\]]+)\]')
+
+    return (namerex, varex, sweepex, brackrex)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_cached(expression):
+    """
+    Parse an expression, the same expressions
+    repeat for many condition sets
+    """
+
+    return parse_expression(expression)
+
+
+def is_index(expression):
+    """Simple array indexes like "v[0]" are not expressions"""
+
+    try:
+        int(expression)
+        return True
+    except ValueError:
+        return False
+
+
+def to_number(value):
+    """Returns the value of a condition as number or None"""
+
+    if not numberrex.match(value):
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def evaluate(expression):
+    """Returns the value of the expression as string or None"""
+
+    try:
+        return str(eval_expression(parse_cached(expression)))
+    except Exception:
+        err(f'Invalid expression: {expression}.')
+        return None
+
+
+class CompiledTemplate:
+    """
+    A template that has been parsed into segments.
+    Each segment is a tuple of the segment type and its data.
+    """
+
+    def __init__(self, text, escape=False, legacy=False):
+        (self.namerex, self.varex, self.sweepex, self.brackrex) = get_regexes(
+            escape, legacy
+        )
+
+        # Condition names in the order of their first use
+        # and the default value of their last use
+        self.names = {}
+
+        for line in text.splitlines():
+            for match in self.namerex.finditer(line):
+                self.add_name(match.group(1))
+
+        self.segments = []
+
+        # Concatenate any continuation lines
+        for line in text.replace('\n+', ' ').splitlines():
+            self.segments += self.compile_line(line)
+            self.segments.append((LITERAL, '\n'))
+
+        self.segments = self.merge_literals(self.segments)
+
+    def compile_line(self, line):
+        placeholders = []
+
+        def add_placeholder(segment):
+            placeholders.append(segment)
+            return chr(PLACEHOLDER_BASE + len(placeholders) - 1)
+
+        # Sweeps {name|maximum}, then conditions {name}
+        line = self.sweepex.sub(
+            lambda match: add_placeholder(self.compile_sweep(match)), line
+        )
+        line = self.varex.sub(
+            lambda match: add_placeholder(self.compile_condition(match)),
+            line,
+        )
+
+        # Expressions [2 + 2], which may contain placeholders
+        segments = []
+        position = 0
+        for match in self.brackrex.finditer(line):
+            segments += self.split(
+                line[position : match.start()], placeholders
+            )
+            segments += self.compile_expression(match, placeholders)
+            position = match.end()
+
+        segments += self.split(line[position:], placeholders)
+
+        return segments
+
+    def split(self, text, placeholders):
+        """Split text into literals and the segments of its placeholders"""
+
+        segments = []
+
+        for index, part in enumerate(placeholderrex.split(text)):
+            # Every second part is a placeholder
+            if index % 2:
+                segments.append(placeholders[ord(part) - PLACEHOLDER_BASE])
+            elif part:
+                segments.append((LITERAL, part))
+
+        return segments
+
+    def compile_sweep(self, match):
+        cond_name = match.group(1)
+        cond_type = match.group(2)
+
+        return (SWEEP, cond_name, cond_type)
+
+    def compile_condition(self, match):
+        cond_name = match.group(1)
+
+        # For condition names in the form {cond=value}, use only the name
+        if '=' in cond_name:
+            cond_name = cond_name.split('=', 1)[0]
+
+        # Check for bit slices
+        indices = None
+        pmatch = vectrex.match(cond_name)
+        if pmatch:
+            cond_name = pmatch.group(1)
+            indices = pmatch.group(2).split(':')
+
+        return (CONDITION, cond_name, indices, match.group(0))
+
+    def compile_expression(self, match, placeholders):
+        prefix = match.group(0)[: match.start(1) - match.start(0)]
+        inner = self.split(match.group(1), placeholders)
+
+        # Constant expressions are evaluated right away
+        if all(segment[0] == LITERAL for segment in inner):
+            expression = match.group(1)
+
+            if is_index(expression):
+                return [(LITERAL, match.group(0))]
+
+            value = evaluate(expression)
+
+            if value == None:
+                return [(LITERAL, match.group(0))]
+
+            return [(LITERAL, value)]
+
+        inner = self.merge_literals(inner)
+
+        # Parse the expression once, with a name for each condition
+        # separated by spaces from the text around it
+        text = ''
+        names = []
+        for segment in inner:
+            if segment[0] == LITERAL:
+                text += segment[1]
+            else:
+                # A leading space is not a valid expression
+                if text:
+                    text += ' '
+                text += f'{NAME_PREFIX}{len(names)} '
+                names.append(segment)
+
+        try:
+            tree = parse_expression(text)
+        except SyntaxError:
+            tree = None
+
+        # A single condition may be an index, like "v[CACE{N}]"
+        if tree != None and isinstance(tree.body, ast.Name):
+            tree = None
+
+        return [(EXPRESSION, prefix, inner, tree, names)]
+
+    def add_name(self, pattern):
+        """Record the name of a condition used in the template"""
+
+        default = None
+
+        # For condition names in the form {cond=value}, use only the name
+        if '=' in pattern:
+            (pattern, default) = pattern.split('=', 1)
+
+        # For condition names in the form {cond|value}, use only the name
+        if '|' in pattern:
+            pattern = pattern.split('|')[0]
+
+        # Remove any bit slices
+        pmatch = vectrex.match(pattern)
+        if pmatch:
+            pattern = pmatch.group(1)
+
+        self.names[pattern] = default
+
+    def merge_literals(self, segments):
+        merged = []
+
+        for segment in segments:
+            if segment[0] == LITERAL and merged and merged[-1][0] == LITERAL:
+                merged[-1] = (LITERAL, merged[-1][1] + segment[1])
+            else:
+                merged.append(segment)
+
+        return merged
+
+    def render(self, conditions_set, conditions):
+        """Returns the text of the template for a condition set"""
+
+        return ''.join(
+            self.render_segments(self.segments, conditions_set, conditions)
+        )
+
+    def render_segments(self, segments, conditions_set, conditions):
+        parts = []
+
+        for segment in segments:
+            kind = segment[0]
+
+            if kind == LITERAL:
+                parts.append(segment[1])
+            elif kind == CONDITION:
+                parts.append(self.render_condition(segment, conditions_set))
+            elif kind == SWEEP:
+                parts.append(self.render_sweep(segment, conditions))
+            else:
+                parts.append(
+                    self.render_expression(segment, conditions_set, conditions)
+                )
+
+        return parts
+
+    def render_expression(self, segment, conditions_set, conditions):
+        (kind, prefix, inner, tree, names) = segment
+
+        # Evaluate the parsed expression if all conditions are numbers
+        if tree != None:
+            values = {}
+
+            for index, value in enumerate(
+                self.render_segments(names, conditions_set, conditions)
+            ):
+                values[f'{NAME_PREFIX}{index}'] = to_number(value)
+
+            if not None in values.values():
+                try:
+                    return str(eval_expression(tree, values))
+                except Exception:
+                    pass
+
+        # Otherwise substitute the conditions and parse the text
+        expression = ''.join(
+            self.render_segments(inner, conditions_set, conditions)
+        )
+
+        value = None
+        if not is_index(expression):
+            value = evaluate(expression)
+
+        if value == None:
+            value = f'{prefix}{expression}]'
+
+        return value
+
+    def render_condition(self, segment, conditions_set):
+        (kind, cond_name, indices, original) = segment
+
+        # Check whether the condition is in the set
+        if not cond_name in conditions_set:
+            err(f'Could not find {cond_name} in condition set.')
+            return original
+
+        # Condition not defined
+        if conditions_set[cond_name] == None:
+            return original
+
+        # Simply replace with the full value
+        if not indices:
+            return str(conditions_set[cond_name])
+
+        # Extract certain bits
+        try:
+            # Single bit
+            if len(indices) == 1:
+                # Convert number into binary first
+                length = int(indices[0]) + 1
+                binary = format(int(conditions_set[cond_name]), f'0{length}b')
+                end = len(binary)
+                return binary[end - 1 - int(indices[0])]
+            # Bit slice
+            elif len(indices) == 2:
+                # Convert number into binary first
+                length = max(int(indices[0]) + 1, int(indices[1]) + 1)
+                binary = format(int(conditions_set[cond_name]), f'0{length}b')
+                end = len(binary)
+                return binary[
+                    end - 1 - int(indices[0]) : end - int(indices[1])
+                ]
+            else:
+                err(f'This bit slice is not supported: {original}')
+                return ''
+        except:
+            err(f"Can't extract bit from: {conditions_set[cond_name]}")
+            return ''
+
+    def render_sweep(self, segment, conditions):
+        (kind, cond_name, cond_type) = segment
+
+        if cond_name in conditions:
+            if cond_type in conditions[cond_name].spec:
+                return str(conditions[cond_name].spec[cond_type])
+            else:
+                err(
+                    f'Could not find {cond_type} in {cond_name} in conditions.'
+                )
+        else:
+            err(f'Could not find {cond_name} in conditions.')
+
+        return ''
+
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text, escape=False, legacy=False):
+    """Returns the compiled template for the text of a template"""
+
+    dbg('Compiling template.')
+
+    return CompiledTemplate(text, escape, legacy)
+
+
+def get_template(path, escape=False, legacy=False):
+    """
+    Returns the compiled template for the file at path. The template
+    is only compiled again if its content changed.
+    """
+
+    with open(path, 'r') as ifile:
+        return compile_template(ifile.read(), escape, legacy)
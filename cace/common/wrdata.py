@@ -0,0 +1,107 @@
+# Copyright 2024 Efabless Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""wrdata.py: Bulk reader for ASCII result files written by wrdata or echo."""
+
+import csv
+import warnings
+import numpy as np
+
+from ..logging import (
+    dbg,
+    verbose,
+    info,
+    subproc,
+    rule,
+    success,
+    warn,
+    err,
+)
+
+
+def read_wrdata(path, variables):
+    """
+    Read a space separated result file into one numpy column per named
+    variable. The entries of a row are assigned to the variables by
+    their position, None in variables ignores a column. Such files
+    are written by wrdata, which puts the scale in front of each
+    vector, or by echo, and usually end each row with a space.
+
+    Returns a dictionary of numpy arrays, or None on failure.
+    """
+
+    # Read all rows at once, this fails for irregular files
+    try:
+        with warnings.catch_warnings():
+            # Raised for an empty file
+            warnings.simplefilter('ignore', UserWarning)
+            values = np.loadtxt(path, dtype=np.float64, comments=None, ndmin=2)
+    except ValueError:
+        values = None
+
+    if values is not None:
+        columns = {}
+
+        # Variables without a column stay empty
+        for variable in variables:
+            if variable != None:
+                columns[variable] = np.empty(0)
+
+        # No rows at all
+        if values.size == 0:
+            return columns
+
+        if values.shape[1] > len(variables):
+            err(
+                f'Result file {path} has {values.shape[1]} columns, but only {len(variables)} variables are given.'
+            )
+            return None
+
+        for column in range(values.shape[1]):
+            variable = variables[column]
+            if variable != None:
+                columns[variable] = values[:, column]
+
+        return columns
+
+    # Irregular file, read row by row
+    dbg(f'Reading result file {path} row by row.')
+
+    collated_values = {}
+
+    for variable in variables:
+        if variable != None:
+            collated_values[variable] = []
+
+    try:
+        with open(path, newline='') as csvfile:
+            reader = csv.reader(csvfile, delimiter=' ', skipinitialspace=True)
+            for row in reader:
+                for _index, entry in enumerate(row):
+                    # Ignore empty entries (often the last element)
+                    if entry != '':
+                        # Check if there is a named variable at this index
+                        if variables[_index] != None:
+                            # If so, append the entry
+                            collated_values[variables[_index]].append(
+                                float(entry)
+                            )
+    except (ValueError, IndexError) as error:
+        err(f'Could not read result file {path}: {error}')
+        return None
+
+    return {
+        variable: np.array(values, dtype=np.float64)
+        for variable, values in collated_values.items()
+    }
@@ -15,13 +15,18 @@
 import os
 import re
 import sys
+import csv
 import copy
+import math
+import time
 import traceback
 import subprocess
-from statistics import median, mean
+import numpy as np
 from enum import Enum
+from array import array
+from collections.abc import Sequence
 from abc import abstractmethod, ABC
-from threading import Thread
+from threading import Thread, Lock
 from multiprocessing import cpu_count
 from multiprocessing.pool import ThreadPool
 from matplotlib.figure import Figure
@@ -29,8 +34,10 @@ from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-from ..common.safe_eval import safe_eval
+from ..common.template import get_template
 from ..common.misc import mkdirp
+from ..common.common import communicate, Watchdog
+from ..common.result_values import ResultValues
 from ..common.spiceunits import spice_unit_convert
 from ..common.common import linseq, logseq
 from ..logging import (
@@ -52,6 +59,7 @@ class ResultType(Enum):
     FAILURE = 3
     SKIPPED = 4
     CANCELED = 5
+    TIMEOUT = 6
 
     def __str__(self):
         if self.value == ResultType.UNKNOWN.value:
@@ -66,6 +74,8 @@ class ResultType(Enum):
             return 'Skip 🟧'
         elif self.value == ResultType.CANCELED.value:
             return 'Cancel 🟧'
+        elif self.value == ResultType.TIMEOUT.value:
+            return 'Timeout ⏱️'
         else:
             return '???'
 
@@ -76,8 +86,9 @@ class Result:
     For example "lvs_errors"
     """
 
-    def __init__(self, name):
+    def __init__(self, name, keep_values=True):
         self.name = name
+        self.keep_values = keep_values
         self.values = []
         # Maximum/minimum/median of the values
         self.result = {
@@ -98,6 +109,15 @@ class Result:
     def __str__(self):
         return f'{self.name} with values {self.values}'
 
+    @property
+    def values(self):
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        # Keep the values compact and accumulate their statistics
+        self._values = ResultValues(values, keep=self.keep_values)
+
 
 class Argument:
     """
@@ -126,7 +146,34 @@ class Condition:
         return f'{self.name} {self.description} {self.display} {self.unit} {self.spec} {self.values}'
 
     def generate_values(self):
-        self.values = [val for val in self.condition_gen()]
+        # Values enumerated from a file are read on demand
+        if self.is_enumerated_from_file() and not any(
+            key in self.spec
+            for key in ['step', 'minimum', 'typical', 'maximum']
+        ):
+            self.values = self.get_enumerate_file()
+        else:
+            self.values = [val for val in self.condition_gen()]
+
+    def is_enumerated_from_file(self):
+        return isinstance(self.spec.get('enumerate'), dict)
+
+    def get_enumerate_file(self):
+        """The column of the CSV file to enumerate the values from"""
+
+        if not 'file' in self.spec['enumerate']:
+            err(f'No file given to enumerate the values from: {self}')
+            return []
+
+        column = CsvColumn(
+            self.spec['enumerate']['file'],
+            self.spec['enumerate'].get('column'),
+        )
+
+        # Fail early if the column does not exist
+        column.index_lines()
+
+        return column
 
     def condition_gen(self):
         """
@@ -134,8 +181,11 @@ class Condition:
         """
 
         if 'enumerate' in self.spec:
-            for i in self.spec['enumerate']:
-                yield i
+            if self.is_enumerated_from_file():
+                yield from self.get_enumerate_file()
+            else:
+                for i in self.spec['enumerate']:
+                    yield i
 
         if 'step' in self.spec:
             if not 'minimum' in self.spec or not 'maximum' in self.spec:
@@ -183,6 +233,148 @@ class Condition:
                 yield self.spec['maximum']
 
 
+class CsvColumn(Sequence):
+    """
+    A column of a CSV file with a header row, one value per line.
+    Only the offsets of the lines are kept in memory, the values
+    are read from the file when they are accessed.
+    """
+
+    def __init__(self, path, column=None):
+        self.path = path
+        self.column = column
+
+        self.offsets = None
+        self.column_index = 0
+
+    def __repr__(self):
+        return f'CsvColumn({self.path}, {self.column})'
+
+    def parse_line(self, line):
+        return next(csv.reader([line.decode('utf-8')]))
+
+    def index_lines(self):
+        """Find the column and the offsets of all lines"""
+
+        if self.offsets != None:
+            return
+
+        offsets = array('q')
+
+        try:
+            with open(self.path, 'rb') as ifile:
+                header = [
+                    entry.strip()
+                    for entry in self.parse_line(ifile.readline())
+                ]
+                offset = ifile.tell()
+
+                for line in ifile:
+                    if line.strip():
+                        offsets.append(offset)
+                    offset += len(line)
+        except OSError as error:
+            err(f'Could not read the values from {self.path}: {error}')
+            header = []
+
+        if self.column != None:
+            if self.column in header:
+                self.column_index = header.index(self.column)
+            else:
+                raise ValueError(
+                    f'Column {self.column} not found in {self.path}'
+                )
+
+        self.offsets = offsets
+
+    def __len__(self):
+        self.index_lines()
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        self.index_lines()
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        with open(self.path, 'rb') as ifile:
+            ifile.seek(self.offsets[index])
+            return self.parse_line(ifile.readline())[self.column_index].strip()
+
+    def __iter__(self):
+        # Stream the values instead of seeking to each line
+        self.index_lines()
+
+        with open(self.path, 'rb') as ifile:
+            ifile.readline()
+            for line in ifile:
+                if line.strip():
+                    yield self.parse_line(line)[self.column_index].strip()
+
+
+class ConditionSpace(Sequence):
+    """
+    The condition sets of a parameter, which are the unique combinations
+    of the values of all conditions. A condition set is only created when
+    it is accessed, the values of the first condition change the fastest.
+    The fixed entries are added to every condition set.
+    """
+
+    def __init__(self, conditions, fixed={}, reserved=None):
+        self.names = list(conditions)
+        self.values = [conditions[cond].values for cond in conditions]
+        self.units = [conditions[cond].unit for cond in conditions]
+        self.sizes = [max(len(values), 1) for values in self.values]
+        self.fixed = dict(fixed)
+
+        # Returns the reserved variables of a condition set by its
+        # index, they replace the conditions of the same name
+        self.reserved = reserved
+
+        self.length = math.prod(self.sizes)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+
+        if index < 0:
+            index += self.length
+
+        if index < 0 or index >= self.length:
+            raise IndexError('condition set index out of range')
+
+        condition_set = {}
+        remainder = index
+
+        for name, values, unit, size in zip(
+            self.names, self.values, self.units, self.sizes
+        ):
+            remainder, value_index = divmod(remainder, size)
+
+            if values:
+                if unit:
+                    condition_set[name] = spice_unit_convert(
+                        (str(unit), str(values[value_index]))
+                    )
+                else:
+                    condition_set[name] = str(values[value_index])
+            else:
+                condition_set[name] = None
+
+        if self.reserved != None:
+            reserved = self.reserved(index)
+            for cond in condition_set:
+                if cond in reserved:
+                    condition_set[cond] = reserved[cond]
+
+        condition_set.update(self.fixed)
+
+        return condition_set
+
+
 class Parameter(ABC, Thread):
     """
     Base class for all parameters.
@@ -223,11 +415,15 @@ class Parameter(ABC, Thread):
         self.cancel_cb = cancel_cb
         self.step_cb = step_cb
 
+        # Called by the thread when it exits, set by the parameter manager
+        self.done_cb = None
+
         self.started = False
 
         self.harvested = False
 
-        self.subproc_handle = None
+        # Handles of the running subprocesses
+        self.subproc_handles = []
 
         self.param_dir = os.path.abspath(
             os.path.join(self.run_dir, 'parameters', pname)
@@ -247,9 +443,20 @@ class Parameter(ABC, Thread):
         self.plots_dict = {}
         self.result_type = ResultType.UNKNOWN
 
+        # Conditions and result values of each condition set
+        self.condition_set_results = []
+        self.wall_time = None
+
         self.canceled = False
         self.done = False
 
+        # A subprocess was killed after its timeout
+        self.timed_out = False
+
+        # Largest peak memory of the subprocesses in bytes
+        self.peak_memory = None
+        self.peak_memory_lock = Lock()
+
         super().__init__(*args, **kwargs)
 
     def add_argument(self, arg: Argument):
@@ -282,8 +489,8 @@ class Parameter(ABC, Thread):
         info(f'Parameter {self.pname}: Canceled.')
         self.canceled = True
 
-        if self.subproc_handle:
-            self.subproc_handle.kill()
+        for subproc_handle in list(self.subproc_handles):
+            subproc_handle.kill()
 
         if no_cb:
             self.cancel_cb = None
@@ -302,44 +509,57 @@ class Parameter(ABC, Thread):
 
     def run(self):
 
-        self.started = True
-        rule(f'Started {self.param["display"]}')
-
-        # Create new parameter dir
-        dbg(f"Creating directory: '{os.path.relpath(self.param_dir)}'.")
-        mkdirp(self.param_dir)
+        timestamp_start = time.time()
 
         try:
-            self.cancel_point()
+            self.started = True
+            rule(f'Started {self.param["display"]}')
 
-            self.pre_start()
+            # Create new parameter dir
+            dbg(f"Creating directory: '{os.path.relpath(self.param_dir)}'.")
+            mkdirp(self.param_dir)
 
-            if self.start_cb:
-                self.start_cb(self.param, self.get_num_steps())
+            try:
+                self.cancel_point()
 
-            self.cancel_point()
+                self.pre_start()
 
-            # Run the implementation
-            if self.is_runnable():
-                self.implementation()
+                if self.start_cb:
+                    self.start_cb(self.param, self.get_num_steps())
 
-            self.cancel_point()
+                self.cancel_point()
 
-        except Exception:
-            traceback.print_exc()
-            self.result_type = ResultType.ERROR
-            self.canceled = True
+                # Run the implementation
+                if self.is_runnable():
+                    self.implementation()
+
+                self.cancel_point()
+
+            except Exception:
+                traceback.print_exc()
+                self.result_type = ResultType.ERROR
+                self.canceled = True
+
+            # A tool that was killed did not fail by itself
+            if self.timed_out and self.result_type != ResultType.CANCELED:
+                self.result_type = ResultType.TIMEOUT
 
-        if self.result_type == ResultType.SUCCESS:
-            self.evaluate_result()
+            if self.result_type == ResultType.SUCCESS:
+                self.evaluate_result()
 
-        # Set done before calling end cb
-        self.done = True
+            self.wall_time = time.time() - timestamp_start
 
-        if self.end_cb:
-            self.end_cb(self.param)
+            # Set done before calling end cb
+            self.done = True
 
-        rule(f'Completed {self.param["display"]}: {self.result_type}')
+            if self.end_cb:
+                self.end_cb(self.param)
+
+            rule(f'Completed {self.param["display"]}: {self.result_type}')
+        finally:
+            # Notify the parameter manager, also when canceled
+            if self.done_cb:
+                self.done_cb(self)
 
     @abstractmethod
     def implementation(self):
@@ -351,6 +571,22 @@ class Parameter(ABC, Thread):
     def get_num_steps(self):
         return 1
 
+    def get_timeout(self, proc):
+        """The timeout of a tool in seconds or None"""
+
+        timeouts = self.runtime_options['timeouts']
+        return timeouts.get(proc, timeouts.get(None))
+
+    def add_peak_memory(self, memory):
+        """Keep the largest peak memory of the subprocesses"""
+
+        if memory == None:
+            return
+
+        with self.peak_memory_lock:
+            if self.peak_memory == None or memory > self.peak_memory:
+                self.peak_memory = memory
+
     def run_subprocess(self, proc, args=[], env=None, input=None, cwd=None):
 
         dbg(
@@ -367,47 +603,28 @@ class Parameter(ABC, Thread):
             text=True,
         ) as process:
 
-            self.subproc_handle = process
+            self.subproc_handles.append(process)
 
-            if input != None:
-                dbg(f'input: {input}')
-            stdout, stderr = process.communicate(input)
-            returncode = process.returncode
+            try:
+                if input != None:
+                    dbg(f'input: {input}')
+
+                with Watchdog(
+                    self.get_timeout(proc), process.kill
+                ) as watchdog:
+                    returncode, peak_memory = communicate(
+                        process, proc, input, cwd
+                    )
 
-            if returncode != 0:
-                err(f'Subprocess exited with error code {returncode}')
+                self.add_peak_memory(peak_memory)
 
-            # Print stderr
-            if stderr and returncode != 0:
-                err('Error output generated by subprocess:')
-                for line in stderr.splitlines():
-                    err(line.rstrip('\n'))
-            else:
-                dbg('Error output generated by subprocess:')
-                for line in stderr.splitlines():
-                    dbg(line.rstrip('\n'))
-
-            # Write stderr to file
-            if stderr:
-                with open(
-                    f'{os.path.join(cwd, proc)}_stderr.out', 'w'
-                ) as stderr_file:
-                    stderr_file.write(stderr)
-
-            # Print stdout
-            if stdout:
-                dbg(f'Output from subprocess {proc}:')
-                for line in stdout.splitlines():
-                    dbg(line.rstrip())
-
-            # Write stdout to file
-            if stdout:
-                with open(
-                    f'{os.path.join(cwd, proc)}_stdout.out', 'w'
-                ) as stdout_file:
-                    stdout_file.write(stdout)
-
-        self.subproc_handle = None
+                if watchdog.expired:
+                    err(
+                        f'Subprocess {proc} was killed after its timeout of {watchdog.timeout} s.'
+                    )
+                    self.timed_out = True
+            finally:
+                self.subproc_handles.remove(process)
 
         return returncode
 
@@ -463,19 +680,12 @@ class Parameter(ABC, Thread):
 
                     # Check if there are values for the named result
                     if self.get_result(named_result).values:
-                        values = self.get_result(named_result).values
-
-                        # Calculate a single value from a vector
-                        if calculation == 'minimum':
-                            result = min(values)
-                        elif calculation == 'maximum':
-                            result = max(values)
-                        elif calculation == 'median':
-                            result = median(values)
-                        elif calculation == 'average':
-                            result = mean(values)
-                        else:
-                            err(f'Unknown calculation type: {calculation}')
+                        result = self.calculate_result(
+                            named_result,
+                            self.get_result(named_result).values,
+                            calculation,
+                            self.param['spec'][named_result][entry],
+                        )
                     else:
                         err(f'Result "{named_result}" is empty.')
                         self.result_type = ResultType.ERROR
@@ -491,31 +701,8 @@ class Parameter(ABC, Thread):
                     # Check result against a limit
                     if value != 'any' and fail == True:
 
-                        # Prefer the local unit
-                        unit = (
-                            self.param['spec'][named_result]['unit']
-                            if 'unit' in self.param['spec'][named_result]
-                            else None
-                        )
-
-                        # Else use the global unit
-                        if not unit:
-                            unit = (
-                                self.param['unit']
-                                if 'unit' in self.param
-                                else None
-                            )
+                        value = self.scale_spec_value(named_result, value)
 
-                        # Scale value with unit
-                        if unit:
-                            dbg(f'scaling {value} with {unit}')
-                            value = spice_unit_convert(
-                                (
-                                    str(unit),
-                                    str(value),
-                                )
-                            )
-                            dbg(f'result: {value}')
                         if result != None:
                             dbg(
                                 f'Checking result {result} against value {value} with limit {limit}.'
@@ -545,6 +732,89 @@ class Parameter(ABC, Thread):
                         # If any spec fails, fail the whole parameter
                         self.result_type = ResultType.FAILURE
 
+    def scale_spec_value(self, named_result, value):
+        """Scale the value of a spec with the unit of the result"""
+
+        # Prefer the local unit
+        unit = (
+            self.param['spec'][named_result]['unit']
+            if 'unit' in self.param['spec'][named_result]
+            else None
+        )
+
+        # Else use the global unit
+        if not unit:
+            unit = self.param['unit'] if 'unit' in self.param else None
+
+        # Scale value with unit
+        if unit:
+            dbg(f'scaling {value} with {unit}')
+            value = spice_unit_convert(
+                (
+                    str(unit),
+                    str(value),
+                )
+            )
+            dbg(f'result: {value}')
+
+        return value
+
+    def get_spec_limit(self, named_result, entry):
+        """Returns the scaled limit of the minimum or maximum spec or None"""
+
+        if not entry in self.param['spec'][named_result]:
+            return None
+
+        value = self.param['spec'][named_result][entry]['value']
+
+        if value == 'any':
+            return None
+
+        return float(self.scale_spec_value(named_result, value))
+
+    def calculate_result(self, named_result, values, calculation, spec):
+        """Calculate a single value from the values of a result"""
+
+        if not values.has_statistics():
+            # Values without statistics, e.g. strings
+            if values.keep and calculation in ['minimum', 'maximum']:
+                return min(values) if calculation == 'minimum' else max(values)
+
+            err(f'Cannot calculate the {calculation} of "{named_result}".')
+            self.result_type = ResultType.ERROR
+            return None
+
+        if calculation == 'minimum':
+            return values.get_minimum()
+        elif calculation == 'maximum':
+            return values.get_maximum()
+        elif calculation == 'median':
+            return values.get_median()
+        elif calculation == 'average':
+            return values.get_average()
+        elif calculation == 'std':
+            return values.get_std()
+        elif calculation == 'percentile':
+            if not 'percentile' in spec:
+                err(f'No percentile given for "{named_result}".')
+                self.result_type = ResultType.ERROR
+                return None
+            return values.get_percentile(float(spec['percentile']))
+        elif calculation == 'cpk':
+            result = values.get_cpk(
+                self.get_spec_limit(named_result, 'minimum'),
+                self.get_spec_limit(named_result, 'maximum'),
+            )
+            if result == None:
+                err(
+                    f'The cpk of "{named_result}" needs a minimum or maximum limit.'
+                )
+                self.result_type = ResultType.ERROR
+            return result
+        else:
+            err(f'Unknown calculation type: {calculation}')
+            return None
+
     def get_default_conditions(self):
         # Get the global default conditions
         conditions_default = {}
@@ -605,54 +875,14 @@ class Parameter(ABC, Thread):
 
         return conditions_param
 
-    def generate_condition_sets(self, conditions):
-        num_sets = 1
-
-        # Get the total number of condition sets
-        for cond in conditions:
-            num_sets *= max(len(conditions[cond].values), 1)
-
-        # Get the condition sets for each simulation
-        # (the unique combinations of all conditions)
-        condition_sets = []
-        cond_index = [0] * len(conditions)
-
-        for _ in range(num_sets):
-            condition_set = {}
-            overflow = False
-
-            for index, cond in enumerate(conditions):
-                if conditions[cond].values:
-                    if conditions[cond].unit:
-                        value = conditions[cond].values[cond_index[index]]
-                        unit = conditions[cond].unit
-                        condition_set[cond] = spice_unit_convert(
-                            (str(unit), str(value))
-                        )
-                    else:
-                        condition_set[cond] = str(
-                            conditions[cond].values[cond_index[index]]
-                        )
-                else:
-                    condition_set[cond] = None
-
-                # The first condition always increments its index
-                if index == 0:
-                    cond_index[index] += 1
-                # The conditions that come after only increment
-                # if the previous condition just overflowed
-                elif overflow:
-                    cond_index[index] += 1
-                    overflow = False
-
-                # Check whether the condition reached its maximum
-                if cond_index[index] == max(len(conditions[cond].values), 1):
-                    cond_index[index] = 0
-                    overflow = True
-
-            condition_sets.append(condition_set)
+    def generate_condition_sets(self, conditions, fixed={}, reserved=None):
+        """
+        Get the condition sets for each simulation (the unique
+        combinations of all conditions). The condition sets
+        are created on demand, not all at once.
+        """
 
-        return condition_sets
+        return ConditionSpace(conditions, fixed, reserved)
 
     def get_condition_names_used(self, template, escape=False):
         """
@@ -665,50 +895,19 @@ class Parameter(ABC, Thread):
             err(f'No such template file {template}.')
             return
 
-        with open(template, 'r') as ifile:
-            simtext = ifile.read()
-
-        simlines = simtext.splitlines()
-
-        # Regular expressions
-        # varex:		variable name {name}
-        if escape:
-            if self.datasheet['cace_format'] <= 5.0:
-                varex = re.compile(r'\\\{([^ \}\t]+)\\\}')
-            else:
-                varex = re.compile(r'CACE\\\{([^ \}\t]+)\\\}')
-        else:
-            if self.datasheet['cace_format'] <= 5.0:
-                varex = re.compile(r'\{([^ \}\t]+)\}')
-            else:
-                varex = re.compile(r'CACE\{([^ \}\t]+)\}')
+        compiled_template = get_template(
+            template, escape, self.datasheet['cace_format'] <= 5.0
+        )
 
         conditions = {}
 
-        for line in simlines:
-            for patmatch in varex.finditer(line):
-                pattern = patmatch.group(1)
-                default = None
-
-                # For condition names in the form {cond=value}, use only the name
-                if '=' in pattern:
-                    (pattern, default) = pattern.split('=')
-
-                # For condition names in the form {cond|value}, use only the name
-                if '|' in pattern:
-                    (pattern, cond_type) = pattern.split('|')
-
-                # Remove any bit slices
-                pmatch = self.vectrex.match(pattern)
-                if pmatch:
-                    pattern = pmatch.group(1)
-
-                # Create new conditions
-                new_cond = Condition()
-                new_cond.name = pattern
-                if default:
-                    new_cond.spec['typical'] = default
-                conditions[pattern] = new_cond
+        for pattern, default in compiled_template.names.items():
+            # Create new conditions
+            new_cond = Condition()
+            new_cond.name = pattern
+            if default:
+                new_cond.spec['typical'] = default
+            conditions[pattern] = new_cond
 
         return conditions
 
@@ -721,171 +920,23 @@ class Parameter(ABC, Thread):
         reserved,
         escape=False,
     ):
-        # Regular expressions
-        # varex:		variable name {name}
-        # sweepex:		name in {cond|value} format
-        # brackrex:		expressions in [expression] format
-
-        if escape:
-            if self.datasheet['cace_format'] <= 5.0:
-                varex = re.compile(r'\\\{([^\\\}]+)\\\}')
-                sweepex = re.compile(r'\\\{([^\\\}]+)\|([^ \\\}]+)\\\}')
-                brackrex = re.compile(r'\[([^\]]+)\]')
-            else:
-                varex = re.compile(r'CACE\\\{([^\\\}]+)\\\}')
-                sweepex = re.compile(r'CACE\\\{([^\\\}]+)\|([^ \\\}]+)\\\}')
-                brackrex = re.compile(r'CACE\[([^\]]+)\]')
-        else:
-            if self.datasheet['cace_format'] <= 5.0:
-                varex = re.compile(r'\{([^\}]+)\}')
-                sweepex = re.compile(r'\{([^\}]+)\|([^ \}]+)\}')
-                brackrex = re.compile(r'\[([^\]]+)\]')
-            else:
-                varex = re.compile(r'CACE\{([^\}]+)\}')
-                sweepex = re.compile(r'CACE\{([^\}]+)\|([^ \}]+)\}')
-                brackrex = re.compile(r'CACE\[([^\]]+)\]')
+        """
+        Substitute the conditions in a template. The template
+        is compiled once and shared by all simulation runs.
+        """
 
         if not os.path.isfile(template_path):
             err(f'Could not find template file {template_path}.')
             self.result_type = ResultType.ERROR
             return
 
-        # Read template into a list
-        with open(template_path, 'r') as infile:
-            template_text = infile.read()
-
-        # Concatenate any continuation lines
-        template_lines = template_text.replace('\n+', ' ').splitlines()
-
-        def varex_sub(matchobj):
-            cond_name = matchobj.group(1)
-            dbg(f'Found condition: {cond_name}.')
-
-            # For condition names in the form {cond=value}, use only the name
-            if '=' in cond_name:
-                (cond_name, default) = cond_name.split('=')
-
-            # Check for bit slices
-            indices = None
-            pmatch = self.vectrex.match(cond_name)
-            if pmatch:
-                cond_name = pmatch.group(1)
-                indices = pmatch.group(2).split(':')
-
-            # Check whether the condition is in the set
-            if cond_name in conditions_set:
-
-                # Condition not defined
-                if conditions_set[cond_name] == None:
-                    return matchobj.group(0)
-
-                # Simply replace with the full value
-                if not indices:
-                    replace = str(conditions_set[cond_name])
-                # Extract certain bits
-                else:
-                    try:
-
-                        # Single bit
-                        if len(indices) == 1:
-                            # Convert number into binary first
-                            length = int(indices[0]) + 1
-                            binary = format(
-                                int(conditions_set[cond_name]), f'0{length}b'
-                            )
-                            end = len(binary)
-                            replace = binary[end - 1 - int(indices[0])]
-                        # Bit slice
-                        elif len(indices) == 1:
-                            # Convert number into binary first
-                            length = max(
-                                int(indices[0]) + 1, int(indices[1]) + 1
-                            )
-                            binary = format(
-                                int(conditions_set[cond_name]), f'0{length}b'
-                            )
-                            end = len(binary)
-                            replace = binary[
-                                end
-                                - 1
-                                - int(indices[0]) : end
-                                - int(indices[1])
-                            ]
-                        else:
-                            err(
-                                f'This bit slice is not supported: {matchobj.group(1)}'
-                            )
-                            return ''
-                    except:
-                        err(
-                            f"Can't extract bit from: {conditions_set[cond_name]}"
-                        )
-                        return ''
-
-                dbg(f'Replacing with {replace}.')
-                return replace
-            else:
-                err(f'Could not find {cond_name} in condition set.')
-
-            # Error, do not change the condition value
-            return matchobj.group(0)
-
-        def sweepex_sub(matchobj):
-            cond_name = matchobj.group(1)
-            cond_type = matchobj.group(2)
-            dbg(f'Found condition: {cond_name} with type {cond_type}.')
-
-            if cond_name in conditions:
-                if cond_type in conditions[cond_name].spec:
-                    replace = str(conditions[cond_name].spec[cond_type])
-                    dbg(f'Replacing with {replace}.')
-                    return replace
-                else:
-                    err(
-                        f'Could not find {cond_type} in {cond_name} in conditions.'
-                    )
-            else:
-                err(f'Could not find {cond_name} in conditions.')
-            return ''
-
-        def brackrex_sub(matchobj):
-            expression = matchobj.group(1)
-            dbg(f'Found expression: {expression}.')
-
-            try:
-                # Avoid catching simple array indexes like "v[0]".
-                # Other non-expressions will just throw exceptions
-                # when passed to safe_eval().
-                btest = int(expression)
-                return matchobj.group(0)
-            except:
-                pass
-
-            try:
-                return str(safe_eval(expression))
-            except:
-                err(f'Invalid expression: {expression}.')
-            return matchobj.group(0)
-
-        # Substitute values
-        substituted_lines = []
-        for template_line in template_lines:
-
-            # Substitute variable name at {name|maximum}
-            template_line = sweepex.sub(sweepex_sub, template_line)
-
-            # Substitute variable name {name}
-            template_line = varex.sub(varex_sub, template_line)
-
-            # Evaluate expressions [2 + 2]
-            template_line = brackrex.sub(brackrex_sub, template_line)
-
-            substituted_lines.append(template_line)
+        compiled_template = get_template(
+            template_path, escape, self.datasheet['cace_format'] <= 5.0
+        )
 
         # Write the output file
         with open(substituted_path, 'w') as outfile:
-            for line in substituted_lines:
-                outfile.write(f'{line}\n')
+            outfile.write(compiled_template.render(conditions_set, conditions))
 
     def makeplot(
         self,
@@ -1188,9 +1239,20 @@ class Parameter(ABC, Thread):
                         if cur_hash == this_hash:
                             # Append to results
                             for key in new_results_for_plot[index].keys():
-                                new_results_for_plot[index][key].extend(
-                                    list(results[key])
-                                )
+                                if isinstance(
+                                    new_results_for_plot[index][key],
+                                    np.ndarray,
+                                ):
+                                    new_results_for_plot[index][
+                                        key
+                                    ] = np.append(
+                                        new_results_for_plot[index][key],
+                                        results[key],
+                                    )
+                                else:
+                                    new_results_for_plot[index][key].extend(
+                                        list(results[key])
+                                    )
 
             condition_sets = new_condition_sets
             results_for_plot = new_results_for_plot
@@ -1254,7 +1316,10 @@ class Parameter(ABC, Thread):
         ):
 
             marker = None
-            if not isinstance(xvalues, list) or len(xvalues) == 1:
+            if (
+                not isinstance(xvalues, (list, np.ndarray))
+                or len(xvalues) == 1
+            ):
                 marker = 'o'
 
             for yvalue in yvalues:
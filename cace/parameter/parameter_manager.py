@@ -22,16 +22,25 @@ import shutil
 import signal
 import datetime
 import threading
+from collections import deque
 
 from ..common.custom_semaphore import CustomSemaphore
+from ..common.result_cache import DEFAULT_CACHE_SIZE
+from ..common.results_db import (
+    ResultsDatabase,
+    get_tool_version,
+    get_file_hash,
+)
 
 from ..common.misc import mkdirp
+from ..common.common import format_memory
 from ..common.cace_read import cace_read, cace_read_yaml
 from ..common.cace_write import (
     markdown_summary,
     generate_documentation,
 )
 from ..common.cace_regenerate import regenerate_netlists, regenerate_gds
+from ..__version__ import __version__
 
 from ..logging import (
     dbg,
@@ -64,30 +73,56 @@ class ParameterManager:
     """
 
     def __init__(
-        self, datasheet={}, max_runs=None, run_path=None, max_jobs=None
+        self,
+        datasheet={},
+        max_runs=None,
+        run_path=None,
+        max_jobs=None,
+        resume_dir=None,
+        max_memory=None,
     ):
         """Initialize the object with a datasheet"""
         self.datasheet = datasheet
+        self.datasheet_path = None
         self.max_runs = max_runs
         self.run_path = run_path
+        self.resume_dir = resume_dir
 
         self.worker_thread = None
 
-        self.queued_threads = []
+        self.queued_threads = deque()
         self.queued_lock = threading.Lock()
 
         self.running_threads = []
         self.running_lock = threading.Lock()
 
+        # Notified when a parameter has completed
+        # or the queue was emptied by a cancel
+        self.dispatch_condition = threading.Condition()
+        self.num_dispatched = 0
+
         self.results = {}
         self.result_types = {}
 
+        # Tool, wall time and condition sets of each parameter
+        self.parameter_runs = {}
+
         self.runtime_options = {}
 
         self.default_runtime_options = {
             'debug': False,
             'netlist_source': 'schematic',
             'sequential': False,
+            'persistent_ngspice': False,
+            'resume': False,
+            'scratch_dir': None,
+            'pack_runs': False,
+            'timeouts': {},
+            'watchdog': None,
+            'results_db': None,
+            'cache': False,
+            'cache_dir': None,
+            'cache_size': DEFAULT_CACHE_SIZE,
             'noplot': False,  # TODO test
             'parallel_parameters': 4,
             'filename': None,
@@ -109,10 +144,15 @@ class ParameterManager:
         if not self.max_jobs:
             self.max_jobs = os.cpu_count()
 
-        self.jobs_sem = CustomSemaphore(value=self.max_jobs)
+        # Jobs are only started while their expected
+        # peak memory fits into the memory budget
+        self.jobs_sem = CustomSemaphore(value=self.max_jobs, memory=max_memory)
 
         info(f'Maximum number of jobs is {self.max_jobs}.')
 
+        if max_memory:
+            info(f'Memory budget for jobs is {format_memory(max_memory)}.')
+
     ### datasheet functions ###
 
     def load_datasheet(self, datasheet_path, init_run_dir=True):
@@ -144,6 +184,7 @@ class ParameterManager:
             return 1
 
         self.runtime_options['filename'] = dsname
+        self.datasheet_path = os.path.abspath(datasheet_path)
 
         # CACE should be run from the location of the datasheet's root
         # directory.  Typically, the datasheet is in the "cace" subdirectory
@@ -529,7 +570,7 @@ class ParameterManager:
                 dbg(f'Inserting parameter {pname} into queue.')
 
                 with self.queued_lock:
-                    self.queued_threads.insert(0, new_sim_param)
+                    self.queued_threads.append(new_sim_param)
 
                 return
 
@@ -558,6 +599,12 @@ class ParameterManager:
                     warn(f'{t.pname} already in results!')
                 self.results[t.pname] = t.results_dict
                 self.result_types[t.pname] = t.result_type
+                self.parameter_runs[t.pname] = {
+                    'tool': t.toolname,
+                    'wall_time': t.wall_time,
+                    'peak_memory': t.peak_memory,
+                    'condition_sets': t.condition_set_results,
+                }
                 t.harvested = True
 
         # Remove completed threads
@@ -571,6 +618,53 @@ class ParameterManager:
     def get_results(self):
         return self.results
 
+    def record_results(self, path, started, wall_time):
+        """
+        Record the results of this run in the results
+        database at path. Returns the id of the run.
+        """
+
+        tools = set(run['tool'] for run in self.parameter_runs.values())
+
+        # xschem netlists the schematics
+        if self.runtime_options['netlist_source'] == 'schematic':
+            tools.add('xschem')
+
+        tool_versions = {}
+        for tool in sorted(tools):
+            # Tools like magic_drc are named after the program
+            version = get_tool_version(tool.split('_')[0])
+            if version:
+                tool_versions[tool] = version
+
+        parameters = [
+            {
+                'name': pname,
+                'tool': run['tool'],
+                'result_type': self.result_types[pname].name,
+                'wall_time': run['wall_time'],
+                'peak_memory': run['peak_memory'],
+                'results': self.results[pname],
+                'condition_sets': run['condition_sets'],
+            }
+            for pname, run in self.parameter_runs.items()
+        ]
+
+        with ResultsDatabase(path) as results_db:
+            return results_db.record_run(
+                os.path.abspath(self.run_dir),
+                self.datasheet['name'],
+                get_file_hash(self.datasheet_path)
+                if self.datasheet_path
+                else None,
+                self.runtime_options['netlist_source'],
+                started,
+                wall_time,
+                __version__,
+                tool_versions,
+                parameters,
+            )
+
     def get_result_types(self):
         return self.result_types
 
@@ -603,6 +697,12 @@ class ParameterManager:
 
         self.design_dir = '.'
 
+        # Continue in the directory of an interrupted run
+        if self.resume_dir:
+            self.run_dir = os.path.abspath(self.resume_dir)
+            info(f"Resuming the run in '{os.path.relpath(self.run_dir)}'.")
+            return
+
         # Create a new tag
         tag = (
             datetime.datetime.now()
@@ -673,34 +773,45 @@ class ParameterManager:
             )
             self.worker_thread.start()
 
+    def parameter_done(self, param_thread):
+        """Called by a dispatched parameter thread when it exits"""
+
+        with self.dispatch_condition:
+            self.num_dispatched -= 1
+            self.dispatch_condition.notify()
+
     def run_parameters_thread(self):
         """Called as a thread, starts the threads of queued parameters"""
 
-        while self.queued_threads:
+        while True:
+            with self.dispatch_condition:
 
-            # Check whether we can start another parameter in parallel
-            if (
-                self.num_running_parameters()
-                < self.runtime_options['parallel_parameters']
-            ):
-                param_thread = None
+                # Wait until another parameter has completed
+                self.dispatch_condition.wait_for(
+                    lambda: self.num_dispatched
+                    < self.runtime_options['parallel_parameters']
+                    or not self.queued_threads
+                )
 
                 # Holding both locks, move a parameter
                 # from queued to running
                 with self.running_lock:
                     with self.queued_lock:
                         # Could have been cancelled meanwhile
-                        if self.queued_threads:
-                            param_thread = self.queued_threads.pop()
-                            self.running_threads.append(param_thread)
+                        if not self.queued_threads:
+                            return
 
-                if param_thread and not param_thread.canceled:
-                    dbg(f'Running parameter {param_thread.pname}')
-                    param_thread.start()
+                        param_thread = self.queued_threads.popleft()
+                        self.running_threads.append(param_thread)
 
-            # Else wait until another parameter has completed
-            else:
-                time.sleep(0.1)
+                if param_thread.canceled:
+                    continue
+
+                param_thread.done_cb = self.parameter_done
+                self.num_dispatched += 1
+
+            dbg(f'Running parameter {param_thread.pname}')
+            param_thread.start()
 
     def join_parameters(self):
         """Join all running parameter threads"""
@@ -722,7 +833,7 @@ class ParameterManager:
 
         with self.queued_lock:
             while self.queued_threads:
-                param_thread = self.queued_threads.pop()
+                param_thread = self.queued_threads.popleft()
                 param_thread.run()
 
     def cancel_parameters(self, no_cb=False):
@@ -736,13 +847,17 @@ class ParameterManager:
 
         with self.queued_lock:
             while self.queued_threads:
-                param_thread = self.queued_threads.pop()
+                param_thread = self.queued_threads.popleft()
 
                 # Cancel the thread and start it
                 # so that it directly calls its callback
                 param_thread.cancel(no_cb)
                 param_thread.start()
 
+        # Wake up the dispatcher, the queue is empty
+        with self.dispatch_condition:
+            self.dispatch_condition.notify()
+
     def cancel_running_parameters(self, no_cb=False):
         """Cancel all running parameters"""
 
@@ -780,6 +895,10 @@ class ParameterManager:
                 param_thread.cancel(no_cb)
                 param_thread.start()
 
+        # Wake up the dispatcher, the queue could be empty
+        with self.dispatch_condition:
+            self.dispatch_condition.notify()
+
     def cancel_running_parameter(self, pname, no_cb=False):
         """Cancel a single running parameter"""
 
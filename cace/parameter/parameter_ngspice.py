@@ -16,19 +16,43 @@ import os
 import re
 import csv
 import sys
-import yaml
+import json
 import time
 import shutil
 import threading
+import sqlite3
+import zipfile
 import traceback
 import subprocess
-from multiprocessing.pool import ThreadPool
-from importlib.machinery import SourceFileLoader
-
-from ..common.misc import mkdirp
+import numpy as np
+from collections.abc import Sequence
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from ..common.misc import mkdirp, link_file
+from ..common.executor import get_executor
+from ..common.result_cache import ResultCache, list_files
+from ..common.result_store import ResultStore
+from ..common.results_db import ResultsDatabase, summarize_value
+from ..common.run_archive import RunArchive, ARCHIVE_NAME
+from ..common.script_pool import (
+    get_script_pool,
+    get_script_functions,
+    run_script,
+)
+from ..common.ngspice_pool import NgspicePool, remove_quit
+from ..common.rawfile import read_rawfile
+from ..common.wrdata import read_wrdata
 from ..common.spiceunits import spice_unit_convert
 from ..common.common import (
     run_subprocess,
+    communicate,
+    OutputCapture,
+    Watchdog,
+    WATCHDOG_MIN_TIME,
+    WATCHDOG_HISTORY,
+    parse_memory,
+    format_memory,
+    get_peak_memory,
     set_xschem_paths,
     get_pdk,
     get_pdk_root,
@@ -48,6 +72,13 @@ from ..logging import (
 )
 from rich.markdown import Markdown
 
+# Return code of a unit whose simulation was killed after its timeout
+TIMED_OUT = 'timed out'
+
+# Reserved variables that may differ when a run is resumed,
+# they are not part of the completion marker of a run
+VOLATILE_RESERVED = ['random', 'simpath', 'jobs']
+
 
 @register_parameter('ngspice')
 class ParameterNgspice(Parameter):
@@ -67,8 +98,10 @@ class ParameterNgspice(Parameter):
 
         # TODO implement typing for the arguments
         self.add_argument(Argument('jobs', 1, False))
+        self.add_argument(Argument('batch', 1, False))
         self.add_argument(Argument('template', None, True))
         self.add_argument(Argument('collate', None, False))
+        self.add_argument(Argument('netlist_once', False, False))
         self.add_argument(Argument('format', None, False))
         self.add_argument(Argument('suffix', None, False))
         self.add_argument(Argument('variables', [], False))
@@ -77,6 +110,9 @@ class ParameterNgspice(Parameter):
         self.add_argument(
             Argument('spiceinit_path', None, False)
         )   # Specify spiceinit other than PDK spiceinit
+        self.add_argument(
+            Argument('memory', None, False)
+        )   # Expected peak memory of a simulation, e.g. 4G
 
         # Total number of simulations
         # used for the progress bar
@@ -84,9 +120,36 @@ class ParameterNgspice(Parameter):
 
         self.queued_jobs = []
 
+        # Wakes up the parameter while it waits for simulations
+        self.cancel_future = Future()
+
+        # Cache for the result files of simulation runs
+        self.result_cache = None
+        self.dutpath = None
+
+        # Runs that completed in the run that is resumed
+        self.num_resumed = 0
+        self.resumed_lock = threading.Lock()
+
+        # Runtime of the longest simulation of each condition set
+        self.runtimes = {}
+        self.runtimes_lock = threading.Lock()
+
+        # Runtimes of the condition sets in the recorded runs
+        self.runtime_conditions = []
+        self.runtime_history = {}
+
+        # Peak memory of the simulations in bytes, declared,
+        # measured in this run or from the recorded runs
+        self.declared_memory = None
+        self.simulation_memory = None
+        self.memory_history = None
+
     def cancel(self, no_cb):
         super().cancel(no_cb)
 
+        self.cancel_future.cancel()
+
         for job in self.queued_jobs:
             job.cancel(no_cb)
 
@@ -119,7 +182,7 @@ class ParameterNgspice(Parameter):
         # Get the condition names used in the template
         # (and the default values if given)
         conditions_template = self.get_condition_names_used(
-            template_path, escape=True
+            template_path, escape=template.endswith('.sch')
         )
 
         dbg(conditions_template)
@@ -151,8 +214,13 @@ class ParameterNgspice(Parameter):
         dbg(f'conditions: {conditions}')
 
         # Generate the values for each condition
-        for cond in conditions:
-            conditions[cond].generate_values()
+        try:
+            for cond in conditions:
+                conditions[cond].generate_values()
+        except ValueError as error:
+            err(f'Parameter {self.param["name"]}: {error}.')
+            self.result_type = ResultType.ERROR
+            return
 
         # Get the total number of simulations
         self.num_sims = 1
@@ -161,21 +229,76 @@ class ParameterNgspice(Parameter):
 
     def implementation(self):
 
+        # The runs are created in the scratch directory if given. Its
+        # path only depends on the run, so that an interrupted run
+        # finds its completed runs in it again when it is resumed.
+        self.work_dir = self.param_dir
+        if self.runtime_options['scratch_dir']:
+            scratch_run_dir = os.path.join(
+                self.runtime_options['scratch_dir'],
+                f'cace_{self.datasheet["name"]}_{os.path.basename(self.run_dir)}',
+            )
+            self.work_dir = os.path.join(scratch_run_dir, self.param['name'])
+            mkdirp(self.work_dir)
+
+            info(
+                f'Parameter {self.param["name"]}: Running simulations in \'{self.work_dir}\'.'
+            )
+
+        self.run_simulations()
+
+        # Keep the scratch directory until the parameter has completed
+        if self.work_dir != self.param_dir and not self.canceled:
+            # Keep the manifest of the runs
+            manifest_path = os.path.join(self.work_dir, 'conditions.jsonl')
+            if os.path.isfile(manifest_path):
+                shutil.copy(manifest_path, self.param_dir)
+
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+            # Remove the directory of the run with its last parameter
+            try:
+                os.rmdir(scratch_run_dir)
+            except OSError:
+                pass
+
+    def persist_run(self, path):
+        """
+        Copy a run or batch directory from the scratch directory
+        to the parameter directory, e.g. to keep its logs
+        """
+
+        if self.work_dir == self.param_dir or not os.path.isdir(path):
+            return
+
+        destination = os.path.join(
+            self.param_dir, os.path.relpath(path, self.work_dir)
+        )
+
+        info(
+            f"Parameter {self.param['name']}: Keeping '[repr.filename][link=file://{destination}]{os.path.relpath(destination)}[/link][/repr.filename]'."
+        )
+
+        shutil.copytree(path, destination, dirs_exist_ok=True)
+
+    def run_simulations(self):
+
         info(f'Parameter {self.param["name"]}: Generating simulation files…')
 
         variables = self.get_argument('variables')
 
-        # Add all named results
+        # Add all named results, only the statistics of their
+        # values are kept, the values are in the result store
         for variable in variables:
             if variable != None:
-                self.add_result(Result(variable))
+                self.add_result(Result(variable, keep_values=False))
 
         script_variables = self.get_argument('script_variables')
 
         # Add all named results from the user-defined script
         for variable in script_variables:
             if variable != None:
-                self.add_result(Result(variable))
+                self.add_result(Result(variable, keep_values=False))
 
         jobs = self.get_argument('jobs')
 
@@ -190,10 +313,13 @@ class ParameterNgspice(Parameter):
         template_path = os.path.join(self.paths['templates'], template)
         run_template_path = os.path.join(self.param_dir, template)
         template_ext = os.path.splitext(template)[1]
+        simfile = os.path.splitext(template)[0] + '.spice'
 
         # A schematic is given as template, this means we need
-        # to perform the substitutions on the schematic
-        if template_ext == '.sch':
+        # to perform the substitutions on the schematic.
+        # A spice netlist is given as template, this means we
+        # perform the substitutions directly on the netlist.
+        if template_ext in ['.sch', '.spice']:
 
             if not os.path.isfile(template_path):
                 err(f'Could not find template file {template_path}.')
@@ -201,7 +327,12 @@ class ParameterNgspice(Parameter):
                 return
 
             # Copy template testbench to run dir
-            shutil.copyfile(template_path, run_template_path)
+            if template_ext == '.sch':
+                shutil.copyfile(template_path, run_template_path)
+            else:
+                # The netlist is simulated in the run directory,
+                # so its relative includes must be made absolute
+                self.resolve_includes(template_path, run_template_path)
 
             # Get global default conditions
             conditions_default = self.get_default_conditions()
@@ -212,7 +343,7 @@ class ParameterNgspice(Parameter):
             # Get the condition names used in the template
             # (and the default values if given)
             conditions_template = self.get_condition_names_used(
-                run_template_path, escape=True
+                run_template_path, escape=(template_ext == '.sch')
             )
 
             if not conditions_template:
@@ -242,8 +373,13 @@ class ParameterNgspice(Parameter):
                         conditions[cond].spec = conditions_param[cond].spec
 
             # Generate the values for each condition
-            for cond in conditions:
-                conditions[cond].generate_values()
+            try:
+                for cond in conditions:
+                    conditions[cond].generate_values()
+            except ValueError as error:
+                err(f'Parameter {self.param["name"]}: {error}.')
+                self.result_type = ResultType.ERROR
+                return
 
             # Get the total number of simulations
             self.num_sims = 1
@@ -277,526 +413,584 @@ class ParameterNgspice(Parameter):
                         f'Couldn\'t find condition "{collate_variable}" used for collating the results.'
                     )
 
-            # Generate the condition sets for each simulation
-            condition_sets = self.generate_condition_sets(conditions)
-
-            # For each condition set, substitute the
-            # testbench template with it
-            max_digits = len(str(len(condition_sets)))
-            for index, condition_set in enumerate(condition_sets):
-
-                # Inner loop for collate variable (if set)
-                collate_values = [1]
-                if self.get_argument('collate'):
-                    collate_values = collate_condition.values
-                    max_digits_collate = len(str(len(collate_values)))
+            # Generate the condition sets for each simulation,
+            # the collate condition holds all of its values
+            collate_values = [1]
+            fixed = {}
+            if self.get_argument('collate'):
+                # The values of a CSV column are read once, every
+                # condition set holds all of them
+                collate_values = list(collate_condition.values)
+                fixed[collate_variable] = collate_values
 
-                for collate_index, collate_value in enumerate(collate_values):
+            condition_sets = self.generate_condition_sets(conditions, fixed)
 
-                    self.cancel_point()
+            # The watchdog identifies a condition set by the
+            # conditions with values, not the reserved variables
+            self.runtime_conditions = [
+                cond for cond in conditions if conditions[cond].values
+            ]
+            self.load_history()
 
-                    # Create directory for this run
-                    outpath = os.path.join(
-                        self.param_dir, f'run_{index:0{max_digits}d}'
+            if self.get_argument('memory') != None:
+                try:
+                    self.declared_memory = parse_memory(
+                        self.get_argument('memory')
                     )
+                except ValueError as error:
+                    err(f'Parameter {self.param["name"]}: {error}.')
+                    self.result_type = ResultType.ERROR
+                    return
 
-                    if self.get_argument('collate'):
-                        outpath = os.path.join(
-                            outpath, f'run_{collate_index:0{max_digits}d}'
-                        )
+            # Run xschem only once on the template and perform the
+            # substitutions on the resulting netlist for each run
+            netlist_once = self.get_argument('netlist_once')
 
-                    dbg(f"Creating directory: '{os.path.relpath(outpath)}'.")
-                    mkdirp(outpath)
+            # A spice template is the netlist already
+            if template_ext == '.spice':
+                netlist_once = False
+                template_netlist_path = run_template_path
 
-                    # Get DUT netlist path
-                    source = self.runtime_options['netlist_source']
+            if netlist_once and self.datasheet['cace_format'] <= 5.0:
+                warn(
+                    'netlist_once requires the CACE{...} syntax (cace_format > 5.0), netlisting every run.'
+                )
+                netlist_once = False
+
+            # Files shared by all runs are created once and linked into
+            # the run directories: the primitive symbol of the DUT and
+            # the .spiceinit
+            self.primitive_symbol = None
+            if template_ext == '.sch':
+                self.primitive_symbol = self.write_primitive_symbol(
+                    self.work_dir
+                )
 
-                    if source == 'schematic':
-                        netlistpath = os.path.join(
-                            self.paths['netlist'], 'schematic'
-                        )
-                    elif source == 'layout':
-                        netlistpath = os.path.join(
-                            self.paths['netlist'], 'layout'
-                        )
-                    elif source == 'pex':
-                        netlistpath = os.path.join(
-                            self.paths['netlist'], 'pex'
-                        )
-                    elif source == 'rcx':
-                        netlistpath = os.path.join(
-                            self.paths['netlist'], 'rcx'
-                        )
+                if not self.primitive_symbol:
+                    self.result_type = ResultType.ERROR
+                    return
 
-                    dutpath = os.path.join(
-                        self.paths['root'],
-                        netlistpath,
-                        self.datasheet['name'] + '.spice',
-                    )
+            self.spiceinit = self.write_spiceinit(self.work_dir)
 
-                    if not os.path.isfile(dutpath):
-                        err(f'Could not find dut netlist {dutpath}.')
-
-                    reserved = {
-                        'filename': os.path.splitext(template)[0],
-                        'templates': os.path.abspath(self.paths['templates']),
-                        'root': os.path.abspath(self.paths['root']),
-                        'simpath': os.path.abspath(outpath),
-                        'DUT_name': self.datasheet['name'],
-                        'netlist_source': source,
-                        'jobs': jobs,
-                        'N': index,
-                        'DUT_path': os.path.abspath(dutpath),
-                        'PDK_ROOT': get_pdk_root(),
-                        'PDK': get_pdk(),
-                        'include_DUT': os.path.abspath(dutpath),
-                        'random': str(int(time.time() * 1000) & 0x7FFFFFFF),
-                    }
-
-                    # Set the reserved variables
-                    for cond in condition_set:
-                        if cond in reserved:
-                            # Hack until reserved variables and conditions are properly separated
-                            if (
-                                collate_index == 0
-                                and condition_set[cond] != None
-                            ):
-                                warn(
-                                    f'Condition uses name of reserved variable: {cond}'
-                                )
-                            condition_set[cond] = reserved[cond]
-
-                    # Add the collate condition
-                    if self.get_argument('collate'):
-                        condition_set[collate_variable] = collate_value
-
-                    # Check if all conditions for this run
-                    # have a value
-                    for cond in condition_set:
-                        if condition_set[cond] == None:
-                            warn(f'Condition {cond} not defined')
-
-                    # Write conditions set
-                    with open(
-                        os.path.join(outpath, 'conditions.yaml'), 'w'
-                    ) as outfile:
-                        yaml.dump(
-                            condition_set,
-                            outfile,
-                            default_flow_style=False,
-                            allow_unicode=True,
-                        )
+            # The conditions of every run are appended to the manifest
+            self.manifest_path = os.path.join(
+                self.work_dir, 'conditions.jsonl'
+            )
+            self.manifest_lock = threading.Lock()
 
-                    outfile = os.path.join(outpath, template)
-                    dbg(f'Substituting with {condition_set} in {outfile}')
+            if netlist_once:
+                primfilename = self.primitive_symbol
 
-                    # Run the substitution
-                    self.substitute(
-                        run_template_path,
-                        outfile,
-                        condition_set,
-                        conditions,
-                        reserved={},
-                        escape=True,
-                    )
+                template_netlist_path = os.path.join(self.work_dir, simfile)
 
-                    # Copy the xschem symbol
-                    # and convert to primitive!
+                returncode = self.run_xschem(
+                    run_template_path, self.work_dir, primfilename, simfile
+                )
 
-                    dname = self.datasheet['name']
-                    xschemname = dname + '.sym'
+                if returncode or not os.path.isfile(template_netlist_path):
+                    err(f'Could not netlist template {template}.')
+                    self.result_type = ResultType.ERROR
+                    return
 
-                    schempath = self.paths['schematic']
-                    symbolfilename = os.path.join(schempath, xschemname)
-                    primfilename = os.path.join(outpath, xschemname)
+            # Get DUT netlist path
+            source = self.runtime_options['netlist_source']
+
+            if source == 'schematic':
+                netlistpath = os.path.join(self.paths['netlist'], 'schematic')
+            elif source == 'layout':
+                netlistpath = os.path.join(self.paths['netlist'], 'layout')
+            elif source == 'pex':
+                netlistpath = os.path.join(self.paths['netlist'], 'pex')
+            elif source == 'rcx':
+                netlistpath = os.path.join(self.paths['netlist'], 'rcx')
+
+            dutpath = os.path.join(
+                self.paths['root'],
+                netlistpath,
+                self.datasheet['name'] + '.spice',
+            )
 
-                    if not os.path.isfile(symbolfilename):
-                        err(f'Could not find xschem symbol {symbolfilename}.')
-                        self.result_type = ResultType.ERROR
-                        return
+            if not os.path.isfile(dutpath):
+                err(f'Could not find dut netlist {dutpath}.')
 
-                    with open(symbolfilename, 'r') as ifile:
-                        symboldata = ifile.read()
-                        primdata = symboldata.replace(
-                            'type=subcircuit', 'type=primitive'
-                        )
+            self.dutpath = os.path.abspath(dutpath)
 
-                    with open(primfilename, 'w') as ofile:
-                        ofile.write(primdata)
+            # Each condition set has a run for every collate value
+            num_collate = len(collate_values)
+            num_runs = len(condition_sets) * num_collate
+            max_digits = len(str(len(condition_sets)))
 
-                    # Run xschem to convert the testbench schematic
-                    # to a spice netlist
+            def get_outpath(index, collate_index):
+                """Directory of a run"""
 
-                    # Add the path with the modififed DUT symbol to the search path.
-                    # Note that testbenches use a version of the DUT symbol that is
-                    # marked as "primitive" so that it does not get added to the netlist directly.
-                    # The netlist must be included by a ".include" statement in the testbenches.
-                    tcllist = ['append XSCHEM_LIBRARY_PATH :' + primfilename]
+                outpath = os.path.join(
+                    self.work_dir, f'run_{index:0{max_digits}d}'
+                )
 
-                    # Add the templates path to the search path
-                    # It could be that there are symbols for stimuli generation etc.
-                    tcllist.append(
-                        'append XSCHEM_LIBRARY_PATH :'
-                        + os.path.abspath(self.paths['templates'])
+                if self.get_argument('collate'):
+                    outpath = os.path.join(
+                        outpath, f'run_{collate_index:0{max_digits}d}'
                     )
 
-                    tclstr = ' ; '.join(tcllist)
-
-                    # Xschem arguments:
-                    # -n:  Generate a netlist
-                    # -s:  Netlist type is SPICE
-                    # -r:  Bypass readline (because stdin/stdout are piped)
-                    # -x:  No X11 / No GUI window
-                    # -q:  Quit after processing command line
-                    # --tcl: Tcl commands
-                    xschemargs = [
-                        '-n',
-                        '-s',
-                        '-r',
-                        '-x',
-                        '-q',
-                        '--tcl',
-                        tclstr,
-                    ]
+                return outpath
+
+            # The random value of each run is derived from a single seed,
+            # so that every access to a condition set gets the same value
+            random_seed = int(time.time() * 1000)
+
+            def get_reserved(index, collate_index=num_collate - 1):
+                """
+                The reserved variables of a run, the condition set
+                itself gets the ones of its last run
+                """
+
+                run_index = index * num_collate + collate_index
+
+                return {
+                    'filename': os.path.splitext(template)[0],
+                    'templates': os.path.abspath(self.paths['templates']),
+                    'root': os.path.abspath(self.paths['root']),
+                    'simpath': os.path.abspath(
+                        get_outpath(index, collate_index)
+                    ),
+                    'DUT_name': self.datasheet['name'],
+                    'netlist_source': source,
+                    'jobs': jobs,
+                    'N': index,
+                    'DUT_path': os.path.abspath(dutpath),
+                    'PDK_ROOT': get_pdk_root(),
+                    'PDK': get_pdk(),
+                    'include_DUT': os.path.abspath(dutpath),
+                    'random': str((random_seed + run_index) & 0x7FFFFFFF),
+                }
+
+            # Hack until reserved variables and conditions are properly separated
+            for cond in conditions:
+                if cond in get_reserved(0) and conditions[cond].values:
+                    warn(f'Condition uses name of reserved variable: {cond}')
 
-                    pdk_root = get_pdk_root()
-                    pdk = get_pdk()
+            # The condition sets passed to the scripts, the
+            # summary and the plots hold the reserved variables
+            condition_sets.reserved = get_reserved
 
-                    # Use the PDK xschemrc file for xschem startup
-                    xschemrcfile = os.path.join(
-                        pdk_root, pdk, 'libs.tech', 'xschem', 'xschemrc'
-                    )
-                    if os.path.isfile(xschemrcfile):
-                        xschemargs.extend(['--rcfile', xschemrcfile])
-                    else:
-                        err(f'No xschemrc file found in the {pdk} PDK.')
+            def get_run(run_index):
+                """
+                Get the directory and the arguments for the generation
+                of a run, the runs are only created when they are needed
+                """
 
-                    xschemargs.extend(
-                        [
-                            '-o',
-                            outpath,
-                            '-N',
-                            os.path.splitext(template)[0] + '.spice',
-                        ]
-                    )
-                    xschemargs.append(outfile)
+                index, collate_index = divmod(run_index, num_collate)
+                outpath = get_outpath(index, collate_index)
 
-                    returncode = self.run_subprocess(
-                        'xschem', xschemargs, cwd=outpath
-                    )
+                # Each run gets its own condition set,
+                # since the runs are generated in parallel
+                condition_set = condition_sets[index]
 
-                    """if returncode:
-                        self.result_type = ResultType.ERROR
-                        return"""
+                # Set the reserved variables of this run
+                reserved = get_reserved(index, collate_index)
+                for cond in condition_set:
+                    if cond in reserved:
+                        condition_set[cond] = reserved[cond]
 
-                    # Copy the .spiceinit file to the simulation directory
-                    spiceinit_path = self.get_argument('spiceinit_path')
+                # Add the collate condition
+                if self.get_argument('collate'):
+                    condition_set[collate_variable] = collate_values[
+                        collate_index
+                    ]
 
-                    # Get the spiceinit file from the PDK
-                    if spiceinit_path == None:
-                        spiceinit_path = os.path.join(
-                            pdk_root, pdk, 'libs.tech', 'ngspice', 'spiceinit'
-                        )
-                        if not os.path.isfile(spiceinit_path):
-                            spiceinit_path = os.path.join(
-                                pdk_root,
-                                pdk,
-                                'libs.tech',
-                                'ngspice',
-                                '.spiceinit',
-                            )
-                            if not os.path.isfile(spiceinit_path):
-                                spiceinit_path = os.path.join(
-                                    pdk_root,
-                                    pdk,
-                                    'libs.tech',
-                                    'ngspice',
-                                    'spinit',
-                                )
-
-                    if os.path.isfile(spiceinit_path):
-                        # Copy spiceinit file to run dir
-                        shutil.copyfile(
-                            spiceinit_path, os.path.join(outpath, '.spiceinit')
-                        )
-                    else:
-                        warn(f'No "spiceinit" file found in the {pdk} PDK.')
+                # Check if all conditions for this run
+                # have a value
+                for cond in condition_set:
+                    if condition_set[cond] == None:
+                        warn(f'Condition {cond} not defined')
+
+                return (
+                    index,
+                    outpath,
+                    (
+                        outpath,
+                        condition_set,
+                        conditions,
+                        template,
+                        run_template_path,
+                        template_netlist_path
+                        if netlist_once or template_ext == '.spice'
+                        else None,
+                    ),
+                )
 
-        # We directly got a spice netlist,
-        # perform the substitutions on it
-        elif template_ext == '.spice':
-            err('TODO: Implement substitution for spice templates!')
-            self.result_type = ResultType.ERROR
-            return
         else:
             err(f'Unsupported file extension for template: {template}')
+            self.result_type = ResultType.ERROR
+            return
+
+        # Split the runs into units of work. Each unit generates the
+        # netlists of its runs and simulates them in a single job,
+        # so that a run is simulated as soon as its netlist exists.
+        batch = max(self.get_argument('batch'), 1)
+        units = [
+            range(start, min(start + batch, num_runs))
+            for start in range(0, num_runs, batch)
+        ]
+
+        # Keep track of the runs of each condition set,
+        # its results are collected once all runs are simulated
+        pending_runs = [num_collate] * len(condition_sets)
+
+        # The collate condition is the last column of the summary
+        summary_conditions = dict(conditions)
+        if self.get_argument('collate'):
+            summary_conditions[collate_variable] = collate_condition
+
+        # Results of the user-defined script are part of the summary
+        summary_variables = variables + script_variables
+
+        conditions_in_summary = self.get_conditions_in_summary(
+            summary_conditions
+        )
+        header_entries = self.get_summary_header(
+            conditions_in_summary, summary_variables
+        )
+
+        # Start the summaries, the rows are appended
+        # while the simulations are still running
+        outpath_csv_summary = os.path.join(
+            self.param_dir, f'simulation_summary.csv'
+        )
+        outpath_sim_summary = os.path.join(
+            self.param_dir, f'simulation_summary.md'
+        )
+
+        with open(outpath_csv_summary, 'w', newline='') as csvfile:
+            csv.writer(csvfile).writerow(header_entries)
 
-        # Run all simulations
-        running_jobs = []
+        with open(outpath_sim_summary, 'w') as f:
+            f.write(self.get_summary_markdown_header(header_entries))
 
         info(f'Parameter {self.param["name"]}: Running simulations…')
 
         self.cancel_point()
 
-        # Run simulation jobs sequentially
-        if self.runtime_options['sequential']:
-            max_digits = len(str(len(condition_sets)))
-            for index, condition_set in enumerate(condition_sets):
+        # Keep long-lived ngspice processes around instead
+        # of starting a new ngspice for every simulation
+        ngspice_pool = None
+        if self.runtime_options['persistent_ngspice']:
+            ngspice_pool = NgspicePool()
 
-                # Inner loop for collate variable (if set)
-                collate_values = [1]
-                if self.get_argument('collate'):
-                    collate_values = collate_condition.values
-                    max_digits_collate = len(str(len(collate_values)))
+        if self.runtime_options['cache']:
+            self.result_cache = ResultCache(
+                self.runtime_options['cache_dir'],
+                self.runtime_options['cache_size'],
+            )
 
-                for collate_index, collate_value in enumerate(collate_values):
+        # Keep the vectors of the simulation values on disk
+        result_store = ResultStore(os.path.join(self.param_dir, 'results'))
+        result_store.clear()
+
+        # Pack the completed runs into a single archive
+        run_archive = None
+        if self.runtime_options['pack_runs']:
+            run_archive = self.open_run_archive()
+
+        result_values = [None] * len(condition_sets)
+        simulation_values = [None] * len(condition_sets)
+
+        # Summaries of the result values for the results database
+        result_summaries = [None] * len(condition_sets)
+        self.run_failed = False
+
+        # The user-defined script is run in the script pool, either
+        # for each condition set or once for all condition sets
+        script_path = None
+        script_batch = False
+        script = self.get_argument('script')
+        if script:
+            script_path = os.path.abspath(
+                os.path.join(self.datasheet['paths']['scripts'], script)
+            )
 
-                    self.cancel_point()
+            if not os.path.isfile(script_path):
+                err(f'No such user script {script_path}.')
+                self.result_type = ResultType.ERROR
+                return
 
-                    # Get directory for this run
-                    outpath = os.path.join(
-                        self.param_dir, f'run_{index:0{max_digits}d}'
-                    )
+            functions = self.get_script_functions(script_path)
 
-                    if self.get_argument('collate'):
-                        outpath = os.path.join(
-                            outpath, f'run_{collate_index:0{max_digits}d}'
-                        )
+            if functions == None:
+                self.result_type = ResultType.ERROR
+                return
 
-                    new_sim_job = SimulationJob(
-                        self.param,
-                        outpath,
-                        os.path.splitext(template)[0] + '.spice',
-                        self.jobs_sem,
-                        jobs,
-                        self.step_cb,
-                    )
-                    self.add_simulation_job(new_sim_job)
+            script_batch = 'postprocess_batch' in functions
 
-                    new_sim_job.start()
-                    new_sim_job.join()
+        # Postprocessing scripts by their future
+        pending_scripts = {}
 
-        # Run simulation jobs in parallel
-        else:
-            # Use a thread pool to get the return value
-            with ThreadPool(processes=None) as pool:
+        # Collated values for a batched script
+        batch_values = [None] * len(condition_sets)
 
-                # Schedule all simulations
-                max_digits = len(str(len(condition_sets)))
-                for index, condition_set in enumerate(condition_sets):
+        # Condition sets with a simulation that was killed after its timeout
+        timed_out = set()
 
-                    # Inner loop for collate variable (if set)
-                    collate_values = [1]
-                    if self.get_argument('collate'):
-                        collate_values = collate_condition.values
-                        max_digits_collate = len(str(len(collate_values)))
+        def complete_condition_set(index, collated_values, script_values):
+            """Store the values of a condition set and add it to the summaries"""
 
-                    for collate_index, collate_value in enumerate(
-                        collate_values
-                    ):
+            values = self.merge_script_values(collated_values, script_values)
 
-                        # Get directory for this run
-                        outpath = os.path.join(
-                            self.param_dir, f'run_{index:0{max_digits}d}'
-                        )
+            if values == None:
+                return False
 
-                        if self.get_argument('collate'):
-                            outpath = os.path.join(
-                                outpath, f'run_{collate_index:0{max_digits}d}'
-                            )
-
-                        new_sim_job = SimulationJob(
-                            self.param,
-                            outpath,
-                            os.path.splitext(template)[0] + '.spice',
-                            self.jobs_sem,
-                            jobs,
-                            self.step_cb,
-                        )
-                        self.add_simulation_job(new_sim_job)
+            result_values[index], simulation_values[index] = values
 
-                        running_jobs.append(
-                            pool.apply_async(new_sim_job.run, ())
-                        )
+            # Only the views of the stored vectors are kept in memory
+            stored_values = result_store.append(
+                index, simulation_values[index]
+            )
+            self.use_stored_vectors(simulation_values[index], stored_values)
+            self.use_stored_vectors(result_values[index], stored_values)
+
+            result_summaries[index] = {
+                variable: summarize_value(value)
+                for variable, value in result_values[index].items()
+            }
+
+            # Append the results to the summaries
+            body_entries = self.get_summary_row(
+                index,
+                max_digits,
+                condition_sets[index],
+                simulation_values[index],
+                conditions_in_summary,
+                summary_variables,
+            )
 
-                # Wait for completion
-                while 1:
-                    self.cancel_point()
+            with open(outpath_csv_summary, 'a', newline='') as csvfile:
+                csv.writer(csvfile).writerow(body_entries)
 
-                    # Check if all tasks have completed
-                    if all([job.ready() for job in running_jobs]):
-                        break
+            with open(outpath_sim_summary, 'a') as f:
+                f.write(f'| {" | ".join(body_entries)} |\n')
 
-                    time.sleep(0.1)
+            info(
+                f'Parameter {self.param["name"]}: Completed {body_entries[0]}: '
+                + ', '.join(
+                    f'{name} = {entry}'
+                    for name, entry in zip(
+                        header_entries[1:], body_entries[1:]
+                    )
+                )
+            )
 
-                # Get the results
-                for job in running_jobs:
-                    if job.get() != 0:
-                        self.result_type = ResultType.ERROR
-                        return
+            return True
 
-                self.cancel_point()
+        def complete_scripts(futures):
+            """Complete the condition sets of finished scripts"""
 
-        info(f'Parameter {self.param["name"]}: Collecting results…')
+            for future in futures:
+                index, collated_values = pending_scripts.pop(future)
 
-        # Get the result
-        max_digits = len(str(len(condition_sets)))
-        results_for_plot = []
+                script_values = self.get_script_result(future)
 
-        format = self.get_argument('format')
-        suffix = self.get_argument('suffix')
-        variables = self.get_argument('variables')
+                if script_values == None or not complete_condition_set(
+                    index, collated_values, script_values
+                ):
+                    self.run_failed = True
 
-        simulation_values = []
+        try:
+            # Collect the results of a condition set
+            # as soon as all of its runs are simulated
+            for unit, returncode in self.run_units(
+                units, get_run, simfile, jobs, ngspice_pool
+            ):
+                # The unit was skipped after an error
+                if returncode == None:
+                    continue
 
-        for index, condition_set in enumerate(condition_sets):
+                if isinstance(returncode, BaseException):
+                    raise returncode
 
-            # Inner loop for collate variable (if set)
-            collate_values = [1]
-            if self.get_argument('collate'):
-                collate_values = collate_condition.values
-                max_digits_collate = len(str(len(collate_values)))
+                # The other condition sets are still simulated
+                if returncode == TIMED_OUT:
+                    for run_index in unit:
+                        timed_out.add(run_index // num_collate)
 
-            collated_values = {}
+                elif returncode != 0:
+                    self.run_failed = True
 
-            for variable in variables:
-                if variable != None:
-                    collated_values[variable] = []
+                complete_scripts(
+                    [future for future in pending_scripts if future.done()]
+                )
 
-            for collate_index, collate_value in enumerate(collate_values):
+                if self.run_failed:
+                    continue
 
-                # Get directory for this run
-                outpath = os.path.join(
-                    self.param_dir, f'run_{index:0{max_digits}d}'
-                )
+                for run_index in unit:
+                    index = run_index // num_collate
+                    pending_runs[index] -= 1
 
-                if self.get_argument('collate'):
-                    outpath = os.path.join(
-                        outpath, f'run_{collate_index:0{max_digits}d}'
+                    if pending_runs[index] > 0 or index in timed_out:
+                        continue
+
+                    collated_values = self.collect_results(
+                        index,
+                        condition_sets[index],
+                        [
+                            get_outpath(index, collate_index)
+                            for collate_index in range(num_collate)
+                        ],
+                        template,
+                        collate_variable,
+                        collate_values
+                        if self.get_argument('collate')
+                        else None,
                     )
 
-                # Read the result file
-                if format == 'ascii':
+                    if collated_values == None:
+                        self.run_failed = True
+                        break
+
+                    # The files of the condition set are not needed anymore
+                    if run_archive:
+                        self.pack_run(
+                            run_archive,
+                            os.path.join(
+                                self.work_dir, f'run_{index:0{max_digits}d}'
+                            ),
+                        )
 
-                    result_file = os.path.join(
-                        outpath,
-                        os.path.splitext(template)[0] + f'_{index}' + suffix,
+                    if not script_path:
+                        if not complete_condition_set(
+                            index, collated_values, {}
+                        ):
+                            self.run_failed = True
+                            break
+                    elif script_batch:
+                        batch_values[index] = collated_values
+                    else:
+                        future = self.submit_script(
+                            script_path,
+                            'postprocess',
+                            self.get_script_arguments(collated_values),
+                            condition_sets[index],
+                        )
+                        pending_scripts[future] = (index, collated_values)
+
+            # Wait for the remaining scripts
+            while pending_scripts:
+                done, not_done = wait(
+                    list(pending_scripts), return_when=FIRST_COMPLETED
+                )
+                complete_scripts(done)
+
+            # Postprocess all completed condition sets at once
+            if script_batch and not self.run_failed:
+                indices = [
+                    index
+                    for index in range(len(condition_sets))
+                    if not index in timed_out
+                ]
+
+                script_values = self.get_script_result(
+                    self.submit_script(
+                        script_path,
+                        'postprocess_batch',
+                        [
+                            self.get_script_arguments(batch_values[index])
+                            for index in indices
+                        ],
+                        [condition_sets[index] for index in indices],
+                    )
+                )
+
+                if script_values == None:
+                    self.run_failed = True
+                elif len(script_values) != len(indices):
+                    err(
+                        f'postprocess_batch returned {len(script_values)} results for {len(indices)} condition sets.'
                     )
+                    self.run_failed = True
+                else:
+                    for index, values in zip(indices, script_values):
+                        if not complete_condition_set(
+                            index, batch_values[index], values
+                        ):
+                            self.run_failed = True
+                            break
 
-                    if not os.path.isfile(result_file):
-                        err(f'No such result file {result_file}.')
-                        self.result_type = ResultType.ERROR
-                        return
+                batch_values = None
 
-                    with open(result_file, newline='') as csvfile:
-                        reader = csv.reader(
-                            csvfile, delimiter=' ', skipinitialspace=True
+            if run_archive and not self.run_failed:
+                for name in sorted(os.listdir(self.work_dir)):
+                    if name.startswith('batch_'):
+                        self.pack_run(
+                            run_archive, os.path.join(self.work_dir, name)
                         )
-                        for row in reader:
-                            for _index, entry in enumerate(row):
-                                # Ignore empty entries (often the last element)
-                                if entry != '':
-                                    # Check if there is a named variable at this index
-                                    if variables[_index] != None:
-                                        # If so, append the entry
-                                        collated_values[
-                                            variables[_index]
-                                        ].append(float(entry))
-                else:
-                    err(f'Unsupported format for the simulation result.')
+        finally:
+            if ngspice_pool:
+                ngspice_pool.close()
 
-            dbg(f'collated values: {collated_values}')
+            if run_archive:
+                run_archive.close()
 
-            # Put back the collate condition for script and plotting
-            if self.get_argument('collate'):
-                condition_sets[index][collate_variable] = collate_values
+            for future in pending_scripts:
+                future.cancel()
 
-                dbg(
-                    f'collated condition: {condition_sets[index][collate_variable]}'
-                )
+        self.cancel_point()
+
+        if self.run_failed:
+            self.result_type = ResultType.ERROR
+            return
 
-            dbg(f'Extending final result…')
+        # Write the columns in the order of the condition sets
+        result_store.finalize(condition_sets)
 
-            for variable in variables:
-                if variable != None:
-                    # Extend the final result
-                    self.get_result(variable).values.extend(
-                        collated_values[variable]
+        if result_store.columns:
+            for index, values in enumerate(simulation_values):
+                if values != None:
+                    stored_values = result_store.get_values(index)
+                    self.use_stored_vectors(values, stored_values)
+                    self.use_stored_vectors(
+                        result_values[index], stored_values
                     )
 
-            # Postprocess using user-defined script
-            script = self.get_argument('script')
-            if script:
-                script_path = os.path.join(
-                    self.datasheet['paths']['scripts'], script
-                )
-
-                info(
-                    f"Running user-defined script '[repr.filename][link=file://{os.path.abspath(script_path)}]{os.path.relpath(script_path)}[/link][/repr.filename]'…"
-                )
+        dbg(f'simulation_values: {simulation_values}')
 
-                if not os.path.isfile(script_path):
-                    err(f'No such user script {script_path}.')
-                    self.result_type = ResultType.ERROR
-                    return
+        if self.runtime_options['resume']:
+            info(
+                f'Parameter {self.param["name"]}: {self.num_resumed} of {num_runs} runs were already completed.'
+            )
 
-                try:
-                    user_script = SourceFileLoader(
-                        'user_script', script_path
-                    ).load_module()
-
-                    class CustomPrint:
-                        def __enter__(self):
-                            self._stdout = sys.stdout
-                            sys.stdout = self
-                            return self
-
-                        def __exit__(self, *args):
-                            sys.stdout = self._stdout
-
-                        def write(self, text):
-                            text = text.rstrip()
-                            if len(text) == 0:
-                                return
-                            info(text)
-
-                        def flush(self):
-                            self._stdout.flush()
-
-                        def __getattr__(self, attr):
-                            return getattr(self._stdout, attr)
-
-                    with CustomPrint() as output:
-                        script_values = user_script.postprocess(
-                            collated_values, condition_set
-                        )
+        if self.result_cache:
+            info(
+                f'Parameter {self.param["name"]}: Restored {self.result_cache.hits} of {num_runs} runs from the result cache.'
+            )
 
-                        # Merge collated and script variables
-                        collated_values.update(script_values)
+        # Extend the final results in the order of the condition sets
+        for index, (condition_set, values) in enumerate(
+            zip(condition_sets, result_values)
+        ):
+            if index in timed_out:
+                continue
 
-                except Exception:
-                    err(f'Error in user script:')
-                    traceback.print_exc()
-                    self.result_type = ResultType.ERROR
-                    return
+            for variable in values:
+                self.get_result(variable).values.extend(values[variable])
 
-            for variable in script_variables:
-                if variable != None:
-                    # Check for variable in results
-                    if variable not in script_values:
-                        err(f'Variable "{variable}" not in script results.')
-                        self.result_type = ResultType.ERROR
-                        return
-
-                    # Extend the final result
-                    self.get_result(variable).values.extend(
-                        script_values[variable]
-                    )
+            self.condition_set_results.append(
+                (
+                    condition_set,
+                    result_summaries[index],
+                    self.runtimes.get(index),
+                )
+            )
 
-            simulation_values.append(collated_values)
+        # The results of the completed condition sets are
+        # summarized, but the specs are not evaluated
+        if timed_out:
+            warn(
+                f'Parameter {self.param["name"]}: {len(timed_out)} of {len(condition_sets)} condition sets timed out.'
+            )
+            self.result_type = ResultType.TIMEOUT
+        else:
             self.result_type = ResultType.SUCCESS
 
-        dbg(f'simulation_values: {simulation_values}')
         dbg(f'results_dict: {self.results_dict}')
 
         # Put back the collate_condition
@@ -804,15 +998,12 @@ class ParameterNgspice(Parameter):
         if self.get_argument('collate'):
             conditions[collate_variable] = collate_condition
 
-        # Extend simulation variables with script variables
-        variables.extend(script_variables)
-
-        # Write the CSV summary
+        # Rewrite the CSV summary in the order of the condition sets
         self.write_simulation_summary_csv(
-            os.path.join(self.param_dir, f'simulation_summary.csv'),
+            outpath_csv_summary,
             conditions,
             condition_sets,
-            variables,
+            summary_variables,
             simulation_values,
         )
 
@@ -820,15 +1011,10 @@ class ParameterNgspice(Parameter):
         simulation_summary = self.create_simulation_summary_markdown(
             conditions,
             condition_sets,
-            variables,
+            summary_variables,
             simulation_values,
         )
 
-        # Get path for the simulation summary
-        outpath_sim_summary = os.path.join(
-            self.param_dir, f'simulation_summary.md'
-        )
-
         # Save the simulation summary
         with open(outpath_sim_summary, 'w') as f:
             f.write(simulation_summary)
@@ -842,6 +1028,18 @@ class ParameterNgspice(Parameter):
 
         # Create a plot if specified
         if 'plot' in self.param:
+            # Only the completed condition sets are plotted
+            if timed_out:
+                completed = [
+                    index
+                    for index in range(len(condition_sets))
+                    if not index in timed_out
+                ]
+                condition_sets = [condition_sets[index] for index in completed]
+                simulation_values = [
+                    simulation_values[index] for index in completed
+                ]
+
             # Create the plots and save them
             for named_plot in self.param['plot']:
                 self.makeplot(
@@ -852,113 +1050,1059 @@ class ParameterNgspice(Parameter):
                     collate_variable,
                 )
 
-    def create_simulation_summary_markdown(
-        self,
-        conditions,
-        condition_sets,
-        variables,
-        simulation_values,
-    ):
+    def open_run_archive(self):
         """
-        Create a summary for all simulation runs in Markdown
+        Create the archive of the runs in the parameter directory.
+        When resuming, the runs of the existing archive are unpacked
+        first, so that the completed runs are not simulated again.
         """
 
-        summary_table = f'# Simulation Summary for {self.param["display"]}\n\n'
+        archive_path = os.path.join(self.param_dir, ARCHIVE_NAME)
 
-        # Find all conditions with more than one value,
-        # these change between simulations
-        conditions_in_summary = []
-        for condition in conditions.values():
-            if len(condition.values) > 1:
-                conditions_in_summary.append(condition.name)
+        if os.path.isfile(archive_path):
+            if self.runtime_options['resume']:
+                try:
+                    with RunArchive(archive_path) as run_archive:
+                        run_archive.extract_runs(self.work_dir)
+                except zipfile.BadZipFile:
+                    warn(
+                        f'Could not unpack {os.path.relpath(archive_path)}, simulating its runs again.'
+                    )
 
-        # Print the header
-        header_entries = []
-        header_separators = []
+            os.remove(archive_path)
 
-        # First entry is the simulation run
-        header_entries.append('run')
-        header_separators.append(':--')
+        run_archive = RunArchive(archive_path)
+        run_archive.add_shared(self.primitive_symbol)
+        run_archive.add_shared(self.spiceinit)
 
-        for cond in conditions_in_summary:
-            header_entries.append(str(cond))
-            header_separators.append('-' * max(len(str(cond)) - 1, 1) + ':')
+        return run_archive
 
-        # Get resulting variables (check for None)
-        for variable in variables:
-            if variable != None:
-                header_entries.append(str(variable))
-                header_separators.append(
-                    '-' * max(len(str(variable)) - 1, 1) + ':'
-                )
+    def pack_run(self, run_archive, path):
+        """Move a run or batch directory into the archive of the runs"""
 
-        # Add header and separators
-        summary_table += f'| {" | ".join(header_entries)} |\n'
-        summary_table += f'| {" | ".join(header_separators)} |\n'
+        if not os.path.isdir(path):
+            return
 
-        # Generate the entries
-        max_digits = len(str(len(condition_sets)))
-        max_entries_list = 3
-        for index, (condition_set, sim_values) in enumerate(
-            zip(condition_sets, simulation_values)
-        ):
-            body_entries = []
-            body_entries.append(f'run_{index:0{max_digits}d}')
-
-            for cond in conditions_in_summary:
-                if isinstance(condition_set[cond], list):
-                    if len(condition_set[cond]) == 1:
-                        body_entries.append(
-                            self.decimal2readable(condition_set[cond][0])
-                        )
-                        continue
+        run_archive.add_run(path, os.path.relpath(path, self.work_dir))
+        shutil.rmtree(path)
 
-                    values = condition_set[cond][
-                        0 : min(max_entries_list, len(condition_set[cond]))
-                    ]
-                    values = [self.decimal2readable(value) for value in values]
-                    if len(condition_set[cond]) > max_entries_list:
-                        values.append('…')
-                    body_entries.append(f'[{", ".join(values)}]')
-                else:
-                    body_entries.append(
-                        self.decimal2readable(condition_set[cond])
-                    )
+    def run_units(self, units, get_run, simfile, jobs, ngspice_pool):
+        """
+        Run the units of work and yield each unit together
+        with its return code in the order of completion
+        """
 
-            for variable in variables:
-                if variable != None:
-                    if isinstance(simulation_values[index][variable], list):
-                        if len(simulation_values[index][variable]) == 1:
-                            body_entries.append(
-                                self.decimal2readable(
-                                    simulation_values[index][variable][0]
-                                )
-                            )
-                            continue
-
-                        values = simulation_values[index][variable][
-                            0 : min(
-                                max_entries_list,
-                                len(simulation_values[index][variable]),
-                            )
-                        ]
-                        values = [
-                            self.decimal2readable(value) for value in values
-                        ]
-                        if (
-                            len(simulation_values[index][variable])
-                            > max_entries_list
-                        ):
-                            values.append('…')
-                        body_entries.append(f'[{", ".join(values)}]')
-                    else:
-                        body_entries.append(
-                            self.decimal2readable(
-                                simulation_values[index][variable]
-                            )
-                        )
+        max_digits = len(str(len(units)))
 
-            summary_table += f'| {" | ".join(body_entries)} |\n'
+        # Run the units sequentially
+        if self.runtime_options['sequential']:
+            for unit_index, unit in enumerate(units):
+                self.cancel_point()
+
+                yield (
+                    unit,
+                    self.run_unit(
+                        unit_index,
+                        max_digits,
+                        unit,
+                        get_run,
+                        simfile,
+                        jobs,
+                        ngspice_pool,
+                    ),
+                )
+            return
+
+        # Run the units in parallel on the process-wide executor
+        executor = get_executor(self.max_jobs)
+
+        # Only keep a limited number of units in the executor,
+        # so that the runs are created while simulating
+        max_pending = 2 * self.max_jobs
+        remaining_units = enumerate(units)
+
+        futures = {}
+        pending = set()
+
+        def submit_units():
+            for unit_index, unit in remaining_units:
+                future = executor.submit(
+                    self.run_unit,
+                    unit_index,
+                    max_digits,
+                    unit,
+                    get_run,
+                    simfile,
+                    jobs,
+                    ngspice_pool,
+                )
+                futures[future] = unit
+                pending.add(future)
+
+                if len(pending) >= max_pending:
+                    break
+
+        submit_units()
+
+        try:
+            while pending:
+                # Wake up once a unit has completed or on cancel
+                done, _ = wait(
+                    pending | {self.cancel_future}, return_when=FIRST_COMPLETED
+                )
+                done.discard(self.cancel_future)
+                pending -= done
+
+                self.cancel_point()
+
+                # Refill the executor before handling the results
+                submit_units()
+
+                for future in done:
+                    error = future.exception()
+                    yield (
+                        futures.pop(future),
+                        error if error else future.result(),
+                    )
+        finally:
+            # Remove the units that did not start yet from the executor
+            for future in pending:
+                future.cancel()
+
+    def run_unit(
+        self,
+        unit_index,
+        max_digits,
+        unit,
+        get_run,
+        simfile,
+        jobs,
+        ngspice_pool,
+    ):
+        """
+        Generate the netlists of the runs in a unit and simulate
+        them, either as a single run or as a batch of runs.
+        Returns the return code of the simulation, TIMED_OUT if
+        it was killed or None if the unit was skipped.
+        """
+
+        # Skip the unit if another unit has failed
+        if self.canceled or self.run_failed:
+            return None
+
+        unit = [get_run(run_index) for run_index in unit]
+
+        # Skip the runs that completed in the run that is resumed
+        if self.runtime_options['resume']:
+            remaining = []
+            for index, outpath, generate_args in unit:
+                if self.is_run_done(outpath, generate_args[1]):
+                    with self.resumed_lock:
+                        self.num_resumed += 1
+
+                    # Call the step cb for generating and simulating
+                    if self.step_cb:
+                        self.step_cb(self.param)
+                        self.step_cb(self.param)
+                else:
+                    remaining.append((index, outpath, generate_args))
+
+            if not remaining:
+                return 0
+
+            unit = remaining
+
+        for index, outpath, generate_args in unit:
+            if not self.generate_run(*generate_args):
+                self.persist_run(outpath)
+                return 1
+
+        outpaths = [outpath for index, outpath, generate_args in unit]
+
+        # Restore runs from the result cache,
+        # only the remaining runs are simulated
+        cache_keys = {}
+        existing_files = {}
+        if self.result_cache:
+            for outpath in list(outpaths):
+                key = self.result_cache.get_key(
+                    outpath, simfile, [self.dutpath]
+                )
+
+                if key and self.result_cache.restore(key, outpath):
+                    outpaths.remove(outpath)
+
+                    # Call the step cb -> advance progress bar
+                    if self.step_cb:
+                        self.step_cb(self.param)
+
+                elif key:
+                    cache_keys[outpath] = key
+                    existing_files[outpath] = list_files(outpath)
+
+            if not outpaths:
+                self.mark_runs_done(unit)
+                return 0
+
+        # The runs that are simulated
+        simulated = [
+            (index, generate_args[1])
+            for index, outpath, generate_args in unit
+            if outpath in outpaths
+        ]
+
+        timeout = self.get_job_timeout(
+            [condition_set for index, condition_set in simulated]
+        )
+
+        memory = self.get_job_memory()
+
+        if self.get_argument('batch') > 1:
+            batchpath = os.path.join(
+                self.work_dir, f'batch_{unit_index:0{max_digits}d}'
+            )
+            batchfile = self.write_batch(batchpath, outpaths, simfile)
+
+            new_sim_job = SimulationJob(
+                self.param,
+                batchpath,
+                batchfile,
+                self.jobs_sem,
+                jobs,
+                self.step_cb,
+                ngspice_pool,
+                len(outpaths),
+                timeout,
+                memory,
+            )
+        else:
+            new_sim_job = SimulationJob(
+                self.param,
+                outpaths[0],
+                simfile,
+                self.jobs_sem,
+                jobs,
+                self.step_cb,
+                ngspice_pool,
+                timeout=timeout,
+                memory=memory,
+            )
+
+        self.add_simulation_job(new_sim_job)
+
+        returncode = new_sim_job.run()
+
+        # Learn the memory of the simulations
+        if new_sim_job.peak_memory != None:
+            self.add_peak_memory(new_sim_job.peak_memory)
+
+            with self.peak_memory_lock:
+                self.simulation_memory = max(
+                    self.simulation_memory or 0, new_sim_job.peak_memory
+                )
+
+        if new_sim_job.timed_out and not self.canceled:
+            warn(
+                f'Parameter {self.param["name"]}: Killed the simulation of {", ".join(os.path.relpath(outpath, self.work_dir) for outpath in outpaths)} after {timeout:.1f} s.'
+            )
+            self.timed_out = True
+
+            # Keep the logs of the killed runs
+            if self.get_argument('batch') > 1:
+                self.persist_run(batchpath)
+
+            for outpath in outpaths:
+                self.persist_run(outpath)
+
+            return TIMED_OUT
+
+        # Store the files created by the simulation
+        if returncode == 0:
+            # The runs of a batch share the runtime of the job
+            with self.runtimes_lock:
+                for index, condition_set in simulated:
+                    self.runtimes[index] = max(
+                        self.runtimes.get(index, 0),
+                        new_sim_job.runtime / len(simulated),
+                    )
+
+            for outpath, key in cache_keys.items():
+                self.result_cache.store(
+                    key, outpath, list_files(outpath) - existing_files[outpath]
+                )
+
+            self.mark_runs_done(unit)
+
+        # Keep the logs of failed runs
+        elif not self.canceled:
+            if self.get_argument('batch') > 1:
+                self.persist_run(batchpath)
+
+            for outpath in outpaths:
+                self.persist_run(outpath)
+
+        return returncode
+
+    def get_runtime_key(self, condition_set):
+        """Identifies a condition set across runs"""
+
+        return json.dumps(
+            {
+                cond: condition_set.get(cond)
+                for cond in self.runtime_conditions
+            },
+            default=list,
+            sort_keys=True,
+        )
+
+    def load_history(self):
+        """
+        Get the runtime of the longest simulation of each condition
+        set and the peak memory of the parameter in the recorded runs
+        from the results database
+        """
+
+        path = self.runtime_options['results_db']
+
+        if not path or not os.path.isfile(path):
+            return
+
+        try:
+            with ResultsDatabase(path) as results_db:
+                runtimes = results_db.get_runtimes(
+                    self.datasheet['name'],
+                    self.param['name'],
+                    self.runtime_options['netlist_source'],
+                    WATCHDOG_HISTORY,
+                )
+                self.memory_history = results_db.get_peak_memory(
+                    self.datasheet['name'],
+                    self.param['name'],
+                    self.runtime_options['netlist_source'],
+                    WATCHDOG_HISTORY,
+                )
+        except sqlite3.Error as error:
+            warn(f'Could not read the recorded runs from {path}: {error}')
+            return
+
+        for conditions, runtime in runtimes:
+            key = self.get_runtime_key(conditions)
+            self.runtime_history[key] = max(
+                self.runtime_history.get(key, 0), runtime
+            )
+
+    def get_job_memory(self):
+        """
+        The expected peak memory of a simulation job in bytes. Until
+        it is known, a simulation reserves the whole memory budget.
+        """
+
+        if not self.jobs_sem.memory:
+            return 0
+
+        for memory in [
+            self.declared_memory,
+            self.simulation_memory,
+            self.memory_history,
+        ]:
+            if memory != None:
+                return memory
+
+        return self.jobs_sem.memory
+
+    def get_job_timeout(self, condition_sets):
+        """
+        The timeout of a job that simulates the runs of the given
+        condition sets. This is the timeout of ngspice or the limit
+        of the watchdog, if all condition sets have been recorded.
+        """
+
+        timeout = self.get_timeout('ngspice')
+
+        factor = self.runtime_options['watchdog']
+        if not factor or not self.runtime_history:
+            return timeout
+
+        runtimes = [
+            self.runtime_history.get(self.get_runtime_key(condition_set))
+            for condition_set in condition_sets
+        ]
+
+        if None in runtimes:
+            return timeout
+
+        limit = sum(
+            max(WATCHDOG_MIN_TIME, factor * runtime) for runtime in runtimes
+        )
+
+        return limit if timeout == None else min(timeout, limit)
+
+    def get_done_marker(self, condition_set):
+        """The content of the completion marker of a run"""
+
+        return {
+            cond: str(value)
+            for cond, value in condition_set.items()
+            if not cond in VOLATILE_RESERVED
+        }
+
+    def is_run_done(self, outpath, condition_set):
+        """
+        Check whether the run in outpath has completed under the same
+        conditions, e.g. in a run that was interrupted and is resumed
+        """
+
+        try:
+            with open(os.path.join(outpath, '.cace_done'), 'r') as ifile:
+                marker = json.load(ifile)
+        except (OSError, ValueError):
+            return False
+
+        if marker != self.get_done_marker(condition_set):
+            warn(
+                f'Run {os.path.relpath(outpath)} was completed under different conditions, simulating it again.'
+            )
+            return False
+
+        return True
+
+    def mark_runs_done(self, unit):
+        """
+        Write the completion markers for the runs of a unit. The marker is
+        renamed into place, so that it only exists if it is complete.
+        """
+
+        for index, outpath, generate_args in unit:
+            markerpath = os.path.join(outpath, '.cace_done')
+
+            with open(markerpath + '.tmp', 'w') as ofile:
+                json.dump(self.get_done_marker(generate_args[1]), ofile)
+
+            os.replace(markerpath + '.tmp', markerpath)
+
+    def use_stored_vectors(self, values, stored_values):
+        """
+        Replace the vectors in values by their stored
+        copies, single values are kept in memory
+        """
+
+        for variable in stored_values:
+            if variable in values and np.ndim(values[variable]) > 0:
+                values[variable] = stored_values[variable]
+
+    def collect_results(
+        self,
+        index,
+        condition_set,
+        outpaths,
+        template,
+        collate_variable,
+        collate_values,
+    ):
+        """
+        Read the result files of all runs of a condition set.
+        Returns the collated values of all variables or None on failure.
+        """
+
+        format = self.get_argument('format')
+        suffix = self.get_argument('suffix')
+        variables = self.get_argument('variables')
+
+        collated_values = {}
+
+        for variable in variables:
+            if variable != None:
+                collated_values[variable] = []
+
+        for outpath in outpaths:
+
+            result_file = os.path.join(
+                outpath,
+                os.path.splitext(template)[0] + f'_{index}' + suffix,
+            )
+
+            if not os.path.isfile(result_file):
+                err(f'No such result file {result_file}.')
+                self.persist_run(outpath)
+                return None
+
+            # Read the result file
+            if format == 'ascii':
+
+                columns = read_wrdata(result_file, variables)
+
+                if columns == None:
+                    return None
+
+                for variable in columns:
+                    collated_values[variable].append(columns[variable])
+
+            # Read the vectors from the binary rawfile
+            elif format == 'raw':
+
+                vectors = read_rawfile(
+                    result_file,
+                    [variable for variable in variables if variable != None],
+                )
+
+                if vectors == None:
+                    return None
+
+                for variable in vectors:
+                    collated_values[variable].append(vectors[variable])
+            else:
+                err(f'Unsupported format for the simulation result.')
+
+        # Join the vectors of all runs, a single
+        # vector stays a view of the memory map
+        for variable in collated_values:
+            vectors = collated_values[variable]
+            if len(vectors) == 1:
+                collated_values[variable] = vectors[0]
+            else:
+                collated_values[variable] = np.concatenate(vectors)
+
+        dbg(f'collated values: {collated_values}')
+
+        # Put back the collate condition for script and plotting
+        if collate_variable:
+            condition_set[collate_variable] = collate_values
+
+            dbg(f'collated condition: {condition_set[collate_variable]}')
+
+        return collated_values
+
+    def merge_script_values(self, collated_values, script_values):
+        """
+        Merge the values of the user-defined script into the collated
+        values. Returns the values for the results and the simulation
+        values for the summary and the plots, or None on failure.
+        """
+
+        variables = self.get_argument('variables')
+        script_variables = self.get_argument('script_variables')
+
+        # Values for the final result
+        result_values = {}
+
+        for variable in variables:
+            if variable != None:
+                result_values[variable] = collated_values[variable]
+
+        # Merge collated and script variables
+        collated_values.update(script_values)
+
+        for variable in script_variables:
+            if variable != None:
+                # Check for variable in results
+                if variable not in script_values:
+                    err(f'Variable "{variable}" not in script results.')
+                    return None
+
+                result_values[variable] = script_values[variable]
+
+        return (result_values, collated_values)
+
+    def get_script_functions(self, script_path):
+        """Returns the functions of the user-defined script or None"""
+
+        return self.get_script_result(
+            get_script_pool(self.max_jobs).submit(
+                get_script_functions, script_path
+            )
+        )
+
+    def get_script_arguments(self, collated_values):
+        """
+        The values passed to the user-defined script, the
+        values of ASCII result files are passed as lists
+        """
+
+        if self.get_argument('format') != 'ascii':
+            return collated_values
+
+        return {
+            variable: value.tolist()
+            if isinstance(value, np.ndarray)
+            else value
+            for variable, value in collated_values.items()
+        }
+
+    def submit_script(self, script_path, function, *args):
+        """Run a function of the user-defined script in the script pool"""
+
+        info(
+            f"Running user-defined script '[repr.filename][link=file://{script_path}]{os.path.relpath(script_path)}[/link][/repr.filename]'…"
+        )
+
+        return get_script_pool(self.max_jobs).submit(
+            run_script, script_path, function, *args
+        )
+
+    def get_script_result(self, future):
+        """
+        Log the output of a finished script and
+        return its result, or None on failure
+        """
+
+        try:
+            result, output, error = future.result()
+        except Exception:
+            err(f'Error in user script:')
+            traceback.print_exc()
+            return None
+
+        for line in output.splitlines():
+            if line.strip():
+                info(line.rstrip())
+
+        if error:
+            err(f'Error in user script:\n{error}')
+            return None
+
+        return result
+
+    def generate_run(
+        self,
+        outpath,
+        condition_set,
+        conditions,
+        template,
+        run_template_path,
+        template_netlist_path,
+    ):
+        """
+        Create the directory and the netlist of a single simulation run.
+        If template_netlist_path is given, the conditions are substituted
+        in this netlist, else xschem is run on the substituted schematic.
+        Returns True on success.
+        """
+
+        if self.canceled:
+            return False
+
+        # Acquire a job from the global jobs semaphore
+        self.jobs_sem.acquire()
+
+        try:
+            dbg(f"Creating directory: '{os.path.relpath(outpath)}'.")
+            mkdirp(outpath)
+
+            self.write_manifest(outpath, condition_set)
+
+            simfile = os.path.splitext(template)[0] + '.spice'
+
+            # The testbench has already been netlisted,
+            # substitute the conditions in the netlist
+            if template_netlist_path:
+                outfile = os.path.join(outpath, simfile)
+                dbg(f'Substituting with {condition_set} in {outfile}')
+
+                # Run the substitution
+                self.substitute(
+                    template_netlist_path,
+                    outfile,
+                    condition_set,
+                    conditions,
+                    reserved={},
+                    escape=False,
+                )
+
+            # Substitute the conditions in the schematic
+            # and run xschem to get the netlist
+            else:
+                outfile = os.path.join(outpath, template)
+                dbg(f'Substituting with {condition_set} in {outfile}')
+
+                # Run the substitution
+                self.substitute(
+                    run_template_path,
+                    outfile,
+                    condition_set,
+                    conditions,
+                    reserved={},
+                    escape=True,
+                )
+
+                # Link the primitive xschem symbol
+                primfilename = os.path.join(
+                    outpath, os.path.basename(self.primitive_symbol)
+                )
+                link_file(self.primitive_symbol, primfilename)
+
+                # Run xschem to convert the testbench schematic
+                # to a spice netlist
+                returncode = self.run_xschem(
+                    outfile, outpath, primfilename, simfile
+                )
+
+                """if returncode:
+                    return False"""
+
+            # Link the .spiceinit file into the simulation directory
+            if self.spiceinit:
+                link_file(self.spiceinit, os.path.join(outpath, '.spiceinit'))
+
+        finally:
+            # Free the job from the global jobs semaphore
+            self.jobs_sem.release()
+
+        # Call the step cb -> advance progress bar
+        if self.step_cb:
+            self.step_cb(self.param)
+
+        return True
+
+    def resolve_includes(self, template_path, run_template_path):
+        """
+        Copy a spice template and make the paths of its .include
+        and .lib statements absolute, relative to the template.
+        Paths containing substitutions are left as they are.
+        """
+
+        includerex = re.compile(
+            r'^(\s*\.(?:include|inc|lib)\s+)(["\']?)([^"\'\s]+)(\2.*)$',
+            re.IGNORECASE,
+        )
+
+        template_dir = os.path.dirname(os.path.abspath(template_path))
+
+        with open(template_path, 'r') as ifile:
+            lines = ifile.read().splitlines()
+
+        for index, line in enumerate(lines):
+            match = includerex.match(line)
+            if not match:
+                continue
+
+            path = match.group(3)
+
+            if 'CACE' in path or '{' in path or os.path.isabs(path):
+                continue
+
+            # A .lib without a section starts a section definition
+            if match.group(1).strip().lower() == '.lib' and not match.group(
+                4
+            ).strip(' \t"\''):
+                continue
+
+            path = os.path.expanduser(path)
+            if not os.path.isabs(path):
+                path = os.path.join(template_dir, path)
+
+            lines[index] = (
+                match.group(1) + match.group(2) + path + match.group(4)
+            )
+
+        with open(run_template_path, 'w') as ofile:
+            ofile.write('\n'.join(lines) + '\n')
+
+    def write_primitive_symbol(self, outpath):
+        """
+        Copy the xschem symbol of the DUT to outpath and convert it to
+        a primitive. Returns the path to the symbol or None on failure.
+        """
+
+        dname = self.datasheet['name']
+        xschemname = dname + '.sym'
+
+        schempath = self.paths['schematic']
+        symbolfilename = os.path.join(schempath, xschemname)
+        primfilename = os.path.join(outpath, xschemname)
+
+        if not os.path.isfile(symbolfilename):
+            err(f'Could not find xschem symbol {symbolfilename}.')
+            return None
+
+        with open(symbolfilename, 'r') as ifile:
+            symboldata = ifile.read()
+            primdata = symboldata.replace('type=subcircuit', 'type=primitive')
+
+        with open(primfilename, 'w') as ofile:
+            ofile.write(primdata)
+
+        return primfilename
+
+    def run_xschem(self, schematic, outpath, primfilename, netlist):
+        """
+        Run xschem to convert the testbench schematic to a spice netlist
+        """
+
+        # Add the path with the modififed DUT symbol to the search path.
+        # Note that testbenches use a version of the DUT symbol that is
+        # marked as "primitive" so that it does not get added to the netlist directly.
+        # The netlist must be included by a ".include" statement in the testbenches.
+        tcllist = ['append XSCHEM_LIBRARY_PATH :' + primfilename]
+
+        # Add the templates path to the search path
+        # It could be that there are symbols for stimuli generation etc.
+        tcllist.append(
+            'append XSCHEM_LIBRARY_PATH :'
+            + os.path.abspath(self.paths['templates'])
+        )
+
+        tclstr = ' ; '.join(tcllist)
+
+        # Xschem arguments:
+        # -n:  Generate a netlist
+        # -s:  Netlist type is SPICE
+        # -r:  Bypass readline (because stdin/stdout are piped)
+        # -x:  No X11 / No GUI window
+        # -q:  Quit after processing command line
+        # --tcl: Tcl commands
+        xschemargs = [
+            '-n',
+            '-s',
+            '-r',
+            '-x',
+            '-q',
+            '--tcl',
+            tclstr,
+        ]
+
+        pdk_root = get_pdk_root()
+        pdk = get_pdk()
+
+        # Use the PDK xschemrc file for xschem startup
+        xschemrcfile = os.path.join(
+            pdk_root, pdk, 'libs.tech', 'xschem', 'xschemrc'
+        )
+        if os.path.isfile(xschemrcfile):
+            xschemargs.extend(['--rcfile', xschemrcfile])
+        else:
+            err(f'No xschemrc file found in the {pdk} PDK.')
+
+        xschemargs.extend(['-o', outpath, '-N', netlist])
+        xschemargs.append(schematic)
+
+        return self.run_subprocess('xschem', xschemargs, cwd=outpath)
+
+    def write_manifest(self, outpath, condition_set):
+        """
+        Append the conditions of a run to the manifest of the parameter.
+        A run that is generated again, e.g. when resuming, is appended
+        again, the last entry of a run is valid.
+        """
+
+        entry = json.dumps(
+            {
+                'run': os.path.relpath(outpath, self.work_dir),
+                'conditions': condition_set,
+            },
+            default=list,
+        )
+
+        with self.manifest_lock:
+            with open(self.manifest_path, 'a') as ofile:
+                ofile.write(entry + '\n')
+
+    def write_spiceinit(self, outpath):
+        """
+        Copy the .spiceinit file to outpath.
+        Returns the path to the copy or None.
+        """
+
+        spiceinit_path = self.get_argument('spiceinit_path')
+
+        pdk_root = get_pdk_root()
+        pdk = get_pdk()
+
+        # Get the spiceinit file from the PDK
+        if spiceinit_path == None:
+            spiceinit_path = os.path.join(
+                pdk_root, pdk, 'libs.tech', 'ngspice', 'spiceinit'
+            )
+            if not os.path.isfile(spiceinit_path):
+                spiceinit_path = os.path.join(
+                    pdk_root,
+                    pdk,
+                    'libs.tech',
+                    'ngspice',
+                    '.spiceinit',
+                )
+                if not os.path.isfile(spiceinit_path):
+                    spiceinit_path = os.path.join(
+                        pdk_root,
+                        pdk,
+                        'libs.tech',
+                        'ngspice',
+                        'spinit',
+                    )
+
+        if os.path.isfile(spiceinit_path):
+            # Copy spiceinit file to run dir
+            shutil.copyfile(
+                spiceinit_path, os.path.join(outpath, '.spiceinit')
+            )
+            return os.path.join(outpath, '.spiceinit')
+        else:
+            warn(f'No "spiceinit" file found in the {pdk} PDK.')
+            return None
+
+    def write_batch(self, batchpath, outpaths, simfile):
+        """
+        Write a control script that sources the netlists of
+        multiple runs one after another in a single ngspice process.
+        Returns the name of the control script.
+        """
+
+        dbg(f"Creating directory: '{os.path.relpath(batchpath)}'.")
+        mkdirp(batchpath)
+
+        # Use the spiceinit of the runs
+        if self.spiceinit:
+            link_file(self.spiceinit, os.path.join(batchpath, '.spiceinit'))
+
+        batchfile = 'batch.spice'
+
+        with open(os.path.join(batchpath, batchfile), 'w') as ofile:
+            ofile.write(f'* CACE batch of {len(outpaths)} simulations\n')
+            ofile.write('.control\n')
+
+            for outpath in outpaths:
+                # The netlists must not end ngspice
+                remove_quit(os.path.join(outpath, simfile))
+
+                ofile.write(f'cd "{outpath}"\n')
+                ofile.write(f'source {simfile}\n')
+
+                # Remove the circuit and all vectors
+                ofile.write('remcirc\n')
+                ofile.write('destroy all\n')
+
+            ofile.write('.endc\n')
+            ofile.write('.end\n')
+
+        return batchfile
+
+    def get_conditions_in_summary(self, conditions):
+        """
+        Find all conditions with more than one value,
+        these change between simulations
+        """
+
+        conditions_in_summary = []
+        for condition in conditions.values():
+            if len(condition.values) > 1:
+                conditions_in_summary.append(condition.name)
+
+        return conditions_in_summary
+
+    def get_summary_header(self, conditions_in_summary, variables):
+        """
+        Get the header entries of the simulation summary
+        """
+
+        header_entries = []
+
+        # First entry is the simulation run
+        header_entries.append('run')
+
+        for cond in conditions_in_summary:
+            header_entries.append(str(cond))
+
+        # Get resulting variables (check for None)
+        for variable in variables:
+            if variable != None:
+                header_entries.append(str(variable))
+
+        return header_entries
+
+    def get_summary_markdown_header(self, header_entries):
+        """
+        Get the title and the table header of the Markdown summary
+        """
+
+        summary_table = f'# Simulation Summary for {self.param["display"]}\n\n'
+
+        # First entry is the simulation run
+        header_separators = [':--']
+
+        for entry in header_entries[1:]:
+            header_separators.append('-' * max(len(entry) - 1, 1) + ':')
+
+        # Add header and separators
+        summary_table += f'| {" | ".join(header_entries)} |\n'
+        summary_table += f'| {" | ".join(header_separators)} |\n'
+
+        return summary_table
+
+    def get_summary_row(
+        self,
+        index,
+        max_digits,
+        condition_set,
+        sim_values,
+        conditions_in_summary,
+        variables,
+    ):
+        """
+        Get the entries of a single simulation run for the summary
+        """
+
+        max_entries_list = 3
+
+        body_entries = []
+        body_entries.append(f'run_{index:0{max_digits}d}')
+
+        entries = [condition_set[cond] for cond in conditions_in_summary]
+        entries += [
+            sim_values[variable] if sim_values != None else 'timed out'
+            for variable in variables
+            if variable != None
+        ]
+
+        for entry in entries:
+            if isinstance(entry, (Sequence, np.ndarray)) and not isinstance(
+                entry, str
+            ):
+                if len(entry) == 1:
+                    body_entries.append(self.decimal2readable(entry[0]))
+                    continue
+
+                values = entry[0 : min(max_entries_list, len(entry))]
+                values = [self.decimal2readable(value) for value in values]
+                if len(entry) > max_entries_list:
+                    values.append('…')
+                body_entries.append(f'[{", ".join(values)}]')
+            else:
+                body_entries.append(self.decimal2readable(entry))
+
+        return body_entries
+
+    def create_simulation_summary_markdown(
+        self,
+        conditions,
+        condition_sets,
+        variables,
+        simulation_values,
+    ):
+        """
+        Create a summary for all simulation runs in Markdown
+        """
+
+        conditions_in_summary = self.get_conditions_in_summary(conditions)
+
+        # Print the header
+        summary_table = self.get_summary_markdown_header(
+            self.get_summary_header(conditions_in_summary, variables)
+        )
+
+        # Generate the entries
+        max_digits = len(str(len(condition_sets)))
+        for index, (condition_set, sim_values) in enumerate(
+            zip(condition_sets, simulation_values)
+        ):
+            body_entries = self.get_summary_row(
+                index,
+                max_digits,
+                condition_set,
+                sim_values,
+                conditions_in_summary,
+                variables,
+            )
+
+            summary_table += f'| {" | ".join(body_entries)} |\n'
 
         return summary_table
 
@@ -977,96 +2121,26 @@ class ParameterNgspice(Parameter):
         with open(csv_file, 'w', newline='') as csvfile:
             csvwriter = csv.writer(csvfile)
 
-            # Find all conditions with more than one value,
-            # these change between simulations
-            conditions_in_summary = []
-            for condition in conditions.values():
-                if len(condition.values) > 1:
-                    conditions_in_summary.append(condition.name)
-
-            # Print the header
-            header_entries = []
-
-            # First entry is the simulation run
-            header_entries.append('run')
-
-            for cond in conditions_in_summary:
-                header_entries.append(str(cond))
-
-            # Get resulting variables (check for None)
-            for variable in variables:
-                if variable != None:
-                    header_entries.append(str(variable))
+            conditions_in_summary = self.get_conditions_in_summary(conditions)
 
             # Write header
-            csvwriter.writerow(header_entries)
+            csvwriter.writerow(
+                self.get_summary_header(conditions_in_summary, variables)
+            )
 
             # Generate the entries
             max_digits = len(str(len(condition_sets)))
-            max_entries_list = 3
             for index, (condition_set, sim_values) in enumerate(
                 zip(condition_sets, simulation_values)
             ):
-                body_entries = []
-                body_entries.append(f'run_{index:0{max_digits}d}')
-
-                for cond in conditions_in_summary:
-                    if isinstance(condition_set[cond], list):
-                        if len(condition_set[cond]) == 1:
-                            body_entries.append(
-                                self.decimal2readable(condition_set[cond][0])
-                            )
-                            continue
-
-                        values = condition_set[cond][
-                            0 : min(max_entries_list, len(condition_set[cond]))
-                        ]
-                        values = [
-                            self.decimal2readable(value) for value in values
-                        ]
-                        if len(condition_set[cond]) > max_entries_list:
-                            values.append('…')
-                        body_entries.append(f'[{", ".join(values)}]')
-                    else:
-                        body_entries.append(
-                            self.decimal2readable(condition_set[cond])
-                        )
-
-                for variable in variables:
-                    if variable != None:
-                        if isinstance(
-                            simulation_values[index][variable], list
-                        ):
-                            if len(simulation_values[index][variable]) == 1:
-                                body_entries.append(
-                                    self.decimal2readable(
-                                        simulation_values[index][variable][0]
-                                    )
-                                )
-                                continue
-
-                            values = simulation_values[index][variable][
-                                0 : min(
-                                    max_entries_list,
-                                    len(simulation_values[index][variable]),
-                                )
-                            ]
-                            values = [
-                                self.decimal2readable(value)
-                                for value in values
-                            ]
-                            if (
-                                len(simulation_values[index][variable])
-                                > max_entries_list
-                            ):
-                                values.append('…')
-                            body_entries.append(f'[{", ".join(values)}]')
-                        else:
-                            body_entries.append(
-                                self.decimal2readable(
-                                    simulation_values[index][variable]
-                                )
-                            )
+                body_entries = self.get_summary_row(
+                    index,
+                    max_digits,
+                    condition_set,
+                    sim_values,
+                    conditions_in_summary,
+                    variables,
+                )
 
                 # Write row
                 csvwriter.writerow(body_entries)
@@ -1075,6 +2149,10 @@ class ParameterNgspice(Parameter):
         if isinstance(decimal, str):
             return decimal
 
+        # Complex values from AC analyses
+        if isinstance(decimal, complex):
+            return f'{decimal.real:.3e}{decimal.imag:+.3e}j'
+
         # Print zero as float
         if decimal == 0:
             return f'{decimal:.3f}'
@@ -1085,7 +2163,9 @@ class ParameterNgspice(Parameter):
             return f'{decimal:.3f}'
 
     def get_num_steps(self):
-        return self.num_sims
+        # Generating the netlist and simulating
+        # are separate steps for each run
+        return 2 * self.num_sims
 
 
 class SimulationJob(threading.Thread):
@@ -1102,6 +2182,10 @@ class SimulationJob(threading.Thread):
         jobs_sem,
         jobs,
         step_cb,
+        ngspice_pool=None,
+        num_steps=1,
+        timeout=None,
+        memory=0,
         *args,
         **kwargs,
     ):
@@ -1111,19 +2195,40 @@ class SimulationJob(threading.Thread):
         self.jobs_sem = jobs_sem
         self.jobs = jobs
         self.step_cb = step_cb
+        self.ngspice_pool = ngspice_pool
+        self.num_steps = num_steps
+        self.timeout = timeout
+
+        # Expected peak memory in bytes, reserved in the jobs semaphore
+        self.memory = memory
+
+        # Runtime of the simulation in seconds
+        self.runtime = None
+        self.timed_out = False
+
+        # Measured peak memory of ngspice in bytes or None
+        self.peak_memory = None
 
         self.canceled = False
         self.subproc_handle = None
+        self.worker = None
         self._return = None
 
         super().__init__(*args, **kwargs)
 
     def cancel(self, no_cb):
         self.canceled = True
+        self.kill()
+
+    def kill(self):
+        """Kill the running simulation"""
 
         if self.subproc_handle:
             self.subproc_handle.kill()
 
+        if self.worker:
+            self.worker.kill()
+
     def cancel_point(self):
         """If canceled, exit the thread"""
 
@@ -1148,72 +2253,91 @@ class SimulationJob(threading.Thread):
 
             self.subproc_handle = process
 
-            dbg(input)
-            stdout, stderr = process.communicate(input)
-            returncode = process.returncode
+            try:
+                dbg(input)
+                returncode, self.peak_memory = communicate(
+                    process, proc, input, cwd
+                )
+            finally:
+                self.subproc_handle = None
 
-            if returncode != 0:
-                err(f'Subprocess exited with error code {returncode}')
+        return returncode
 
-            # Print stderr
-            if stderr and returncode != 0:
-                err('Error output generated by subprocess:')
-                for line in stderr.splitlines():
-                    err(line.rstrip('\n'))
-            else:
-                dbg('Error output generated by subprocess:')
-                for line in stderr.splitlines():
-                    dbg(line.rstrip('\n'))
-
-            # Write stderr to file
-            if stderr:
-                with open(
-                    f'{os.path.join(cwd, proc)}_stderr.out', 'w'
-                ) as stderr_file:
-                    stderr_file.write(stderr)
-
-            # Print stdout
-            if stdout:
-                dbg(f'Output from subprocess {proc}:')
-                for line in stdout.splitlines():
-                    dbg(line.rstrip())
-
-            # Write stdout to file
-            if stdout:
-                with open(
-                    f'{os.path.join(cwd, proc)}_stdout.out', 'w'
-                ) as stdout_file:
-                    stdout_file.write(stdout)
+    def run_worker(self):
+        """Run the simulation in a worker of the ngspice pool"""
 
-        self.subproc_handle = None
+        dbg(
+            f"Sourcing {self.simfile} in ngspice worker at '[repr.filename][link=file://{os.path.abspath(self.outpath)}]{os.path.relpath(self.outpath)}[/link][/repr.filename]'…"
+        )
+
+        worker = self.worker = self.ngspice_pool.acquire(self.outpath)
+
+        try:
+            # Write stdout to file while the simulation is running
+            with OutputCapture(
+                os.path.join(self.outpath, 'ngspice_stdout.out')
+            ) as output:
+                returncode = worker.run(
+                    self.outpath, self.simfile, output.write
+                )
+
+            if returncode != 0:
+                err(f'ngspice worker failed with error code {returncode}')
+                for line in output.tail:
+                    err(line)
+
+            # The peak of the worker over all of its simulations
+            self.peak_memory = get_peak_memory(worker.process.pid)
+        except BaseException:
+            # The state of the worker is unknown, it is not reused
+            worker.kill()
+            self.ngspice_pool.remove(worker)
+            raise
+        else:
+            self.ngspice_pool.release(worker)
+        finally:
+            self.worker = None
 
         return returncode
 
     def run(self):
         self.cancel_point()
 
-        # Acquire job(s) from the global jobs semaphore
-        self.jobs_sem.acquire(self.jobs)
+        # Acquire job(s) and memory from the global jobs semaphore
+        self.jobs_sem.acquire(self.jobs, self.memory)
 
-        self.cancel_point()
+        try:
+            self.cancel_point()
 
-        # Run ngspice
-        returncode = self.run_subprocess(
-            'ngspice',
-            ['--batch', self.simfile],
-            cwd=self.outpath,
-        )
+            start = time.monotonic()
 
-        self.cancel_point()
+            # Run ngspice, a simulation that does not converge
+            # is killed by the watchdog
+            with Watchdog(self.timeout, self.kill) as watchdog:
+                if self.ngspice_pool:
+                    returncode = self.run_worker()
+                else:
+                    returncode = self.run_subprocess(
+                        'ngspice',
+                        ['--batch', self.simfile],
+                        cwd=self.outpath,
+                    )
 
-        self._return = returncode
+            self.runtime = time.monotonic() - start
+            self.timed_out = watchdog.expired
 
-        # Call the step cb -> advance progress bar
-        if self.step_cb:
-            self.step_cb(self.param)
+            self.cancel_point()
+
+            self._return = returncode
 
-        # Free job(s) from the global jobs semaphore
-        self.jobs_sem.release(self.jobs)
+            # Call the step cb -> advance progress bar
+            if self.step_cb:
+                for _ in range(self.num_steps):
+                    self.step_cb(self.param)
+        finally:
+            # Free job(s) and memory from the global jobs semaphore,
+            # also when canceled, since it is shared by all parameters
+            self.jobs_sem.release(self.jobs, self.memory)
 
         # For when the join function is called
         return self._return
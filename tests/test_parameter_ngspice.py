@@ -0,0 +1,52 @@
+import numpy as np
+
+from cace.parameter.parameter import Condition, ConditionSpace
+from cace.parameter.parameter_ngspice import ParameterNgspice
+
+
+def make_condition(name, spec):
+    condition = Condition()
+    condition.name = name
+    condition.spec = spec
+    condition.generate_values()
+    return condition
+
+
+def test_summary_row_collate_from_csv(tmp_path):
+    path = tmp_path / 'seeds.csv'
+    path.write_text('seed,corner\n1,tt\n2,ss\n3,ff\n4,tt\n')
+
+    temperature = make_condition('temperature', {'enumerate': [-40, 27]})
+    seed = make_condition(
+        'seed', {'enumerate': {'file': str(path), 'column': 'seed'}}
+    )
+
+    condition_sets = ConditionSpace(
+        {'temperature': temperature}, {'seed': list(seed.values)}
+    )
+
+    # The summary is only generated, no parameter is run
+    parameter = ParameterNgspice.__new__(ParameterNgspice)
+
+    row = parameter.get_summary_row(
+        1,
+        1,
+        condition_sets[1],
+        {'vout': np.array([1.5, 1.6, 1.7, 1.8])},
+        ['temperature', 'seed'],
+        ['vout', None],
+    )
+
+    assert row == [
+        'run_1',
+        '27',
+        '[1, 2, 3, …]',
+        '[1.500, 1.600, 1.700, …]',
+    ]
+
+    # The column itself is shown as a vector too
+    row = parameter.get_summary_row(
+        0, 1, {'seed': seed.values}, {}, ['seed'], []
+    )
+
+    assert row == ['run_0', '[1, 2, 3, …]']
@@ -0,0 +1,106 @@
+import numpy as np
+
+from cace.common.rawfile import RawFile, read_rawfile
+
+
+def write_plot(ofile, plotname, flags, names, data):
+    """Write a plot as ngspice writes it to a binary rawfile"""
+
+    header = [
+        'Title: test',
+        'Date: Thu Jan  1 00:00:00  2024',
+        f'Plotname: {plotname}',
+        f'Flags: {flags}',
+        f'No. Variables: {len(names)}',
+        f'No. Points: {len(data)}',
+        'Variables:',
+    ]
+    header += [
+        f'\t{index}\t{name}\tvoltage' for index, name in enumerate(names)
+    ]
+    header.append('Binary:\n')
+
+    ofile.write('\n'.join(header).encode('utf-8'))
+    ofile.write(np.ascontiguousarray(data).tobytes())
+
+
+def test_read_real_and_complex(tmp_path):
+    path = tmp_path / 'test.raw'
+
+    time = np.linspace(0, 1e-6, 5)
+    real = np.stack((time, np.sin(time * 1e6)), axis=1)
+
+    frequency = np.array([1e3, 1e4, 1e5], dtype=np.complex128)
+    ac = np.stack((frequency, [1 + 1j, 0.5 - 0.5j, 0.1j]), axis=1)
+
+    with open(path, 'wb') as ofile:
+        write_plot(
+            ofile, 'Transient Analysis', 'real', ['time', 'V(out)'], real
+        )
+        write_plot(ofile, 'AC Analysis', 'complex', ['frequency', 'v(ac)'], ac)
+
+    rawfile = RawFile(str(path))
+
+    assert [plot.plotname for plot in rawfile.plots] == [
+        'Transient Analysis',
+        'AC Analysis',
+    ]
+    assert rawfile.plots[0].names == ['time', 'v(out)']
+
+    # Names are not case sensitive
+    vectors = read_rawfile(str(path), ['time', 'v(OUT)', 'v(ac)'])
+
+    assert vectors['time'].dtype == np.float64
+    np.testing.assert_array_equal(vectors['time'], real[:, 0])
+    np.testing.assert_array_equal(vectors['v(OUT)'], real[:, 1])
+
+    assert vectors['v(ac)'].dtype == np.complex128
+    np.testing.assert_array_equal(vectors['v(ac)'], ac[:, 1])
+
+    assert read_rawfile(str(path), ['v(missing)']) == None
+
+
+def test_read_truncated(tmp_path):
+    path = tmp_path / 'test.raw'
+
+    data = np.arange(8, dtype=np.float64).reshape(4, 2)
+
+    with open(path, 'wb') as ofile:
+        write_plot(
+            ofile, 'Transient Analysis', 'real', ['time', 'v(out)'], data
+        )
+
+    # Only complete points are read from an interrupted simulation
+    with open(path, 'r+b') as ofile:
+        ofile.truncate(path.stat().st_size - 12)
+
+    vectors = read_rawfile(str(path), ['v(out)'])
+
+    np.testing.assert_array_equal(vectors['v(out)'], [1, 3, 5])
+
+
+def test_read_empty_plot(tmp_path):
+    path = tmp_path / 'test.raw'
+
+    with open(path, 'wb') as ofile:
+        write_plot(
+            ofile, 'Operating Point', 'real', ['v(out)'], np.empty((0, 1))
+        )
+
+    vectors = read_rawfile(str(path), ['v(out)'])
+
+    assert len(vectors['v(out)']) == 0
+
+
+def test_ascii_rawfile(tmp_path):
+    path = tmp_path / 'test.raw'
+
+    path.write_text(
+        'Title: test\nPlotname: Operating Point\nFlags: real\n'
+        'No. Variables: 1\nNo. Points: 1\nVariables:\n\t0\tv(out)\tvoltage\n'
+        'Values:\n 0\t1.8\n'
+    )
+
+    # Only binary rawfiles are supported
+    assert RawFile(str(path)).plots == []
+    assert read_rawfile(str(path), ['v(out)']) == None
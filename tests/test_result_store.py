@@ -0,0 +1,89 @@
+import os
+import json
+import numpy as np
+
+from cace.common.result_store import INDEX_FILE, ResultStore
+
+
+def test_append_finalize_get_values(tmp_path):
+    store = ResultStore(str(tmp_path / 'store'))
+
+    vout = [np.array([1.5, 1.6, 1.7]), np.array([2.5]), np.array([3.5, 3.6])]
+    iout = [np.array([1 + 2j]), np.array([3 - 4j, 5j]), np.array([], complex)]
+
+    # Condition sets complete in any order
+    for index in [2, 0, 1]:
+        views = store.append(
+            index,
+            {'vout': vout[index], 'iout': iout[index], 'corner': 'tt'},
+        )
+
+        np.testing.assert_array_equal(views['vout'], vout[index])
+        assert not 'corner' in views
+
+    # The views of the raw files stay valid
+    np.testing.assert_array_equal(views['vout'], vout[1])
+
+    condition_sets = [{'temperature': t} for t in [-40, 27, 85]]
+    store.finalize(condition_sets)
+
+    assert os.path.isfile(tmp_path / 'store' / INDEX_FILE)
+    assert not [
+        name
+        for name in os.listdir(tmp_path / 'store')
+        if name.endswith('.raw')
+    ]
+
+    # Read back by a new store, as by another process
+    store = ResultStore(str(tmp_path / 'store'))
+
+    for index in range(3):
+        values = store.get_values(index)
+
+        assert isinstance(values['vout'], np.memmap)
+        assert values['vout'].dtype == np.float64
+        assert values['iout'].dtype == np.complex128
+        np.testing.assert_array_equal(values['vout'], vout[index])
+        np.testing.assert_array_equal(values['iout'], iout[index])
+
+    # The columns are in the order of the condition sets
+    np.testing.assert_array_equal(
+        store.get_column('vout'), np.concatenate(vout)
+    )
+
+    with open(tmp_path / 'store' / INDEX_FILE, 'r') as ifile:
+        index = json.load(ifile)
+
+    assert [run['run'] for run in index['runs']] == ['run_0', 'run_1', 'run_2']
+    assert index['runs'][2]['conditions'] == {'temperature': 85}
+    assert index['runs'][2]['slices']['vout'] == [4, 6]
+
+
+def test_integers_and_empty_columns(tmp_path):
+    store = ResultStore(str(tmp_path / 'store'))
+
+    store.append(0, {'count': [1, 2], 'empty': []})
+
+    # Real values do not fit into an integer column
+    store.append(1, {'count': [0.5], 'empty': []})
+
+    store.finalize([{}, {}])
+
+    values = store.get_values(0)
+    assert values['count'].dtype == np.int64
+    np.testing.assert_array_equal(values['count'], [1, 2])
+    assert len(values['empty']) == 0
+
+    values = store.get_values(1)
+    assert not 'count' in values
+    assert len(values['empty']) == 0
+
+
+def test_clear(tmp_path):
+    store = ResultStore(str(tmp_path / 'store'))
+
+    store.append(0, {'vout': [1.0]})
+    store.finalize([{}])
+    store.clear()
+
+    assert not os.path.exists(tmp_path / 'store')
@@ -0,0 +1,108 @@
+import math
+import numpy as np
+import pytest
+
+from cace.common.result_values import QuantileSketch, ResultValues
+
+
+@pytest.mark.parametrize('keep', [True, False])
+def test_statistics_as_numpy(keep):
+    rng = np.random.default_rng(1)
+    values = rng.normal(1.8, 0.05, 1000)
+
+    result = ResultValues(keep=keep)
+
+    # Values arrive in chunks of any size
+    for chunk in np.array_split(values, [1, 10, 400, 401]):
+        result.extend(chunk)
+
+    assert len(result) == len(values)
+    assert result.has_statistics()
+    assert result.get_minimum() == values.min()
+    assert result.get_maximum() == values.max()
+    assert result.get_average() == pytest.approx(values.mean(), rel=1e-12)
+    assert result.get_std() == pytest.approx(values.std(ddof=1), rel=1e-9)
+
+    # Without the values, the sketch returns the nearest value
+    tolerance = None if keep else 0.01
+
+    assert result.get_median() == pytest.approx(
+        np.median(values), abs=tolerance
+    )
+    for percentile in [0, 1, 25, 75, 99, 100]:
+        assert result.get_percentile(percentile) == pytest.approx(
+            np.percentile(values, percentile), abs=tolerance
+        )
+
+
+def test_integer_values():
+    result = ResultValues([1, 2, 3])
+    result.append(6)
+
+    assert result.is_integer()
+    assert list(result) == [1, 2, 3, 6]
+    assert result[-1] == 6
+    assert result[1:3] == [2, 3]
+    assert result.get_average() == 3
+    assert isinstance(result.get_average(), int)
+    assert result.get_median() == 2.5
+
+    result.append(1)
+    assert result.get_average() == pytest.approx(2.6)
+    assert result.get_median() == 2
+
+    # Real values make the array real
+    result.append(0.5)
+    assert not result.is_integer()
+    assert list(result) == [1, 2, 3, 6, 1, 0.5]
+
+
+def test_values_not_kept():
+    result = ResultValues([3, 1, 2], keep=False)
+
+    assert len(result) == 3
+    assert result.get_median() == 2
+
+    with pytest.raises(IndexError):
+        result[0]
+
+    with pytest.raises(IndexError):
+        list(result)
+
+
+def test_other_values():
+    result = ResultValues([1.0, 2.0])
+    result.append('fail')
+
+    assert list(result) == [1.0, 2.0, 'fail']
+    assert not result.has_statistics()
+
+    result = ResultValues([1 + 1j, 2j])
+
+    assert list(result) == [1 + 1j, 2j]
+    assert not result.has_statistics()
+
+
+def test_cpk():
+    result = ResultValues([1.0, 2.0, 3.0])
+
+    assert result.get_cpk() == None
+    assert result.get_cpk(lower=0.0) == pytest.approx(2 / 3)
+    assert result.get_cpk(lower=0.0, upper=2.5) == pytest.approx(1 / 6)
+    assert ResultValues([1.0, 1.0]).get_cpk(upper=2.0) == math.inf
+
+
+def test_sketch_rank_error():
+    rng = np.random.default_rng(2)
+    values = rng.uniform(0, 1, 100000)
+
+    sketch = QuantileSketch(1024)
+    for chunk in np.array_split(values, 100):
+        sketch.update(chunk)
+
+    assert not sketch.is_exact()
+
+    # The rank of each quantile is off by about 1 / capacity
+    for q in [0.01, 0.1, 0.5, 0.9, 0.99]:
+        rank = np.mean(values <= sketch.quantile(q))
+        assert rank == pytest.approx(q, abs=0.01)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from cace.common.spiceunits import spice_unit_convert, spice_unit_unconvert
+
+
+# Values converted by the former implementation, which
+# parsed the units again for every value
+@pytest.mark.parametrize(
+    'units, converted, unconverted',
+    [
+        ('', '1.5', [1.5, 2.0]),
+        ('V', '1.5', [1.5, 2.0]),
+        ('mV', '0.0015', [1500.0, 2000.0]),
+        ('µA', '1.5e-06', [1500000.0, 2000000.0]),
+        ('nA', '1.5000000000000002e-09', [1500000000.0, 1999999999.9999998]),
+        ('kΩ', '1500.0', [0.0015, 0.002]),
+        ('MHz', '1500000.0', [1.5e-06, 2e-06]),
+        ('pF', '1.5e-12', [1500000000000.0, 2000000000000.0]),
+        ('%', '0.015', [150.0, 200.0]),
+        ('%V', '0.015', [150.0, 200.0]),
+        ('dB', '1.5', [1.5, 2.0]),
+        ('V/µs', '1500000.0', [1.5e-06, 2e-06]),
+        ('mV/V', '0.0015', [1500.0, 2000.0]),
+        ('nA⋅V', '1.5000000000000002e-09', [1500000000.0, 1999999999.9999998]),
+        ('mV²', '1.5e-06', [1500000.0, 2000000.0]),
+        ('°C', '1.5', [1.5, 2.0]),
+        ('xyz', '1.5', [1.5, 2.0]),
+    ],
+)
+def test_convert_as_before(units, converted, unconverted):
+    assert spice_unit_convert([units, '1.5']) == converted
+    assert spice_unit_unconvert([units, [1.5, 2.0]]) == unconverted
+    assert spice_unit_unconvert([units, 1.5]) == unconverted[0]
+
+
+@pytest.mark.parametrize('units', ['V', 'mV', 'kΩ', '%', 'V/µs', 'mV²'])
+def test_unconvert_array(units):
+    values = np.array([1.5, 2.0, -0.03])
+
+    result = spice_unit_unconvert([units, values])
+
+    assert isinstance(result, np.ndarray)
+    np.testing.assert_array_equal(
+        result, spice_unit_unconvert([units, list(values)])
+    )
+
+
+def test_restrict():
+    assert spice_unit_convert(['ms', '2'], 'time') == '0.002'
+    assert spice_unit_convert(['ms', '2'], 'Time') == '0.002'
+    assert spice_unit_unconvert(['ms', 0.002], 'time') == 2.0
+
+    with pytest.raises(ValueError):
+        spice_unit_convert(['mV', '2'], 'time')
+
+    with pytest.raises(ValueError):
+        spice_unit_unconvert(['mV/V', 2.0], 'time')
@@ -0,0 +1,77 @@
+import pytest
+
+from cace.common.template import CompiledTemplate, compile_template
+
+
+class Sweep:
+    def __init__(self, spec):
+        self.spec = spec
+
+
+conditions = {'vdd': Sweep({'minimum': 1.6, 'maximum': 2.0})}
+
+
+# Templates rendered by the former Parameter.substitute
+@pytest.mark.parametrize(
+    'text, conditions_set, expected',
+    [
+        ('V1 a 0 CACE{vdd}\n', {'vdd': 1.8}, 'V1 a 0 1.8\n'),
+        ('V1 a 0 CACE[CACE{vdd}*2]\n', {'vdd': 1.8}, 'V1 a 0 3.6\n'),
+        ('V1 a 0 CACE[CACE{vdd}*2]\n', {'vdd': '1.8'}, 'V1 a 0 3.6\n'),
+        ('x CACE[1-CACE{x}]\n', {'x': '-3'}, 'x 4\n'),
+        ('x CACE[CACE{x}/CACE{y}]\n', {'x': '1', 'y': '0'}, 'x CACE[1/0]\n'),
+        ('x CACE[CACE{x}]\n', {'x': '4'}, 'x CACE[4]\n'),
+        ('x v[CACE{x}]\n', {'x': '4'}, 'x v[4]\n'),
+        ('x CACE[CACE{m}*2]\n', {'m': 'abc'}, 'x CACE[abc*2]\n'),
+        ('x CACE[CACE{vdd|maximum}+1]\n', {}, 'x 3.0\n'),
+        ('b CACE{b[2]} CACE{b[1]} CACE{b[0]}\n', {'b': 5}, 'b 1 0 1\n'),
+        ('x CACE{t=27} CACE[2+2] CACE[3]\n', {'t': 85}, 'x 85 4 CACE[3]\n'),
+        ('x CACE{missing}\n', {}, 'x CACE{missing}\n'),
+        ('x CACE[CACE{x}e3]\n', {'x': '2'}, 'x 2000.0\n'),
+        ('x CACE[1CACE{x}]\n', {'x': '2'}, 'x CACE[12]\n'),
+        ('x CACE[sqrt(CACE{x})]\n', {'x': '16'}, 'x 4.0\n'),
+        ('x CACE[CACE{x}*1e-3]\n', {'x': '1.5e2'}, 'x 0.15\n'),
+        ('line\n+ cont CACE{x}\n', {'x': 1}, 'line  cont 1\n'),
+    ],
+)
+def test_render_as_substitute(text, conditions_set, expected):
+    template = CompiledTemplate(text)
+
+    assert template.render(conditions_set, conditions) == expected
+
+
+def test_render_bit_slice():
+    template = CompiledTemplate('b CACE{b[2:1]} CACE{b[3:0]}\n')
+
+    # substitute returned empty strings for bit slices
+    assert template.render({'b': 5}, conditions) == 'b 10 0101\n'
+
+
+def test_render_negative_value():
+    template = CompiledTemplate('x CACE[CACE{x}**2]\n')
+
+    # The value is a number, not text spliced into the expression
+    assert template.render({'x': '-3'}, conditions) == 'x 9\n'
+    assert template.render({'x': '3'}, conditions) == 'x 9\n'
+
+
+def test_render_legacy_and_escaped():
+    template = CompiledTemplate('V1 a 0 {vdd} [{vdd}*2]\n', legacy=True)
+    assert template.render({'vdd': 1.5}, conditions) == 'V1 a 0 1.5 3.0\n'
+
+    template = CompiledTemplate('V1 a 0 CACE\\{vdd\\}\n', escape=True)
+    assert template.render({'vdd': 1.5}, conditions) == 'V1 a 0 1.5\n'
+
+
+def test_template_names():
+    template = CompiledTemplate(
+        'CACE{a} CACE{b=1} CACE{c[3:0]} CACE{vdd|maximum}\n'
+    )
+
+    assert template.names == {'a': None, 'b': '1', 'c': None, 'vdd': None}
+
+
+def test_compile_template_cached():
+    text = 'V1 a 0 CACE{vdd}\n'
+
+    assert compile_template(text) is compile_template(text)
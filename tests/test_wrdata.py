@@ -0,0 +1,66 @@
+import numpy as np
+
+from cace.common.wrdata import read_wrdata
+
+
+def test_read_wrdata(tmp_path):
+    path = tmp_path / 'test.data'
+
+    # wrdata puts the scale in front of each vector and ends rows with a space
+    path.write_text(
+        ' 0.000000e+00  1.800000e+00  0.000000e+00  1.000000e-03 \n'
+        ' 1.000000e-09  1.790000e+00  1.000000e-09  2.000000e-03 \n'
+    )
+
+    columns = read_wrdata(str(path), ['time', 'vout', None, 'iout'])
+
+    assert list(columns) == ['time', 'vout', 'iout']
+    assert columns['vout'].dtype == np.float64
+    np.testing.assert_array_equal(columns['time'], [0, 1e-9])
+    np.testing.assert_array_equal(columns['vout'], [1.8, 1.79])
+    np.testing.assert_array_equal(columns['iout'], [1e-3, 2e-3])
+
+
+def test_read_single_row(tmp_path):
+    path = tmp_path / 'test.data'
+    path.write_text('1.8 2e-3 \n')
+
+    columns = read_wrdata(str(path), ['vout', 'iout', 'unused'])
+
+    np.testing.assert_array_equal(columns['vout'], [1.8])
+    np.testing.assert_array_equal(columns['iout'], [2e-3])
+
+    # Variables without a column stay empty
+    assert len(columns['unused']) == 0
+
+
+def test_read_empty(tmp_path):
+    path = tmp_path / 'test.data'
+    path.write_text('')
+
+    columns = read_wrdata(str(path), ['vout', None])
+
+    assert list(columns) == ['vout']
+    assert len(columns['vout']) == 0
+
+
+def test_read_irregular(tmp_path):
+    path = tmp_path / 'test.data'
+
+    # Rows of different lengths are read row by row
+    path.write_text('1.0 2.0 \n3.0\n')
+
+    columns = read_wrdata(str(path), ['a', 'b'])
+
+    np.testing.assert_array_equal(columns['a'], [1.0, 3.0])
+    np.testing.assert_array_equal(columns['b'], [2.0])
+
+
+def test_read_invalid(tmp_path):
+    path = tmp_path / 'test.data'
+
+    path.write_text('1.0 2.0 3.0\n')
+    assert read_wrdata(str(path), ['a', 'b']) == None
+
+    path.write_text('1.0 fail\n')
+    assert read_wrdata(str(path), ['a', 'b']) == None